@@ -0,0 +1,145 @@
+from collections import OrderedDict
+import threading
+import numpy as np
+
+
+class AngularBasis:
+    """
+    Класс для расчёта и кэширования углового базиса Pii/Tay
+
+    Базис не зависит от материалов линзы: только от числа порядков и сетки
+    углов наблюдения. Поэтому он считается один раз на процесс и делится
+    между всеми запросами и линзами. Для каждой сетки хранится базис с
+    наибольшим запрошенным числом порядков, меньшие берутся его срезом.
+    Кэш ограничен числом сеток MAX_CACHED и суммарным объёмом MAX_BYTES,
+    при превышении вытесняются давно не использованные; базис больше
+    MAX_BYTES не кэшируется.
+
+    Pii = lpmv(1, n, cos) / |sin| = -pi_n и Tay = (lpmv(2, n, cos) -
+    n(n+1) * lpmv(0, n, cos)) / 2 = -tau_n, где pi_n и tau_n считаются
+    рекуррентно:
+        pi_n = ((2n-1) * cos * pi_{n-1} - n * pi_{n-2}) / (n-1)
+        tau_n = n * cos * pi_n - (n+1) * pi_{n-1}
+
+    Атрибуты
+    --------
+    Teta : np.ndarray
+        Углы наблюдения в радианах, (angles,).
+    Pii : np.ndarray
+        Коэффициенты Pii, (orders, angles), только для чтения.
+    Tay : np.ndarray
+        Коэффициенты Tay, (orders, angles), только для чтения.
+    """
+    MAX_CACHED: int = 32
+    MAX_BYTES: int = 128 * 1024 * 1024
+    __cache: "OrderedDict[bytes, AngularBasis]" = OrderedDict()
+    __bytes: int = 0
+    __lock = threading.Lock()
+    __hits: int = 0
+    __misses: int = 0
+
+    def __init__(self, orders: int, teta: np.ndarray):
+        """
+        Расчёт базиса по рекуррентным формулам
+
+        :param orders: Число порядков n = 1..orders
+        :param teta: Углы наблюдения в радианах
+        """
+        self.Teta: np.ndarray = np.array(teta, dtype=float)
+        self.Pii: np.ndarray = np.empty((orders, self.Teta.size))
+        self.Tay: np.ndarray = np.empty((orders, self.Teta.size))
+        for start, pii, tay in self.chunks(orders, self.Teta, orders):
+            self.Pii[start:start + len(pii)] = pii
+            self.Tay[start:start + len(tay)] = tay
+
+        self.Teta.setflags(write=False)
+        self.Pii.setflags(write=False)
+        self.Tay.setflags(write=False)
+
+    @staticmethod
+    def chunks(orders: int, teta: np.ndarray, chunk_size: int):
+        """
+        Базис Pii/Tay блоками по chunk_size порядков без хранения целиком
+
+        Память - O(chunk_size * angles) независимо от числа порядков. Блоки
+        записываются в одни и те же буферы, поэтому каждый блок нужно
+        использовать до получения следующего.
+
+        :param orders: Число порядков n = 1..orders
+        :param teta: Углы наблюдения в радианах
+        :param chunk_size: Число порядков в блоке
+        :return: Генератор (номер первого порядка блока с нуля, Pii, Tay)
+        """
+        x = np.cos(np.asarray(teta, dtype=float))
+        pii = np.empty((min(chunk_size, orders), x.size))
+        tay = np.empty_like(pii)
+
+        pi_prev = np.zeros_like(x)
+        pi_curr = np.ones_like(x)
+        for start in range(0, orders, chunk_size):
+            count = min(chunk_size, orders - start)
+            for k in range(count):
+                n = start + k + 1
+                if n > 1:
+                    pi_prev, pi_curr = pi_curr, ((2*n - 1) * x * pi_curr - n * pi_prev) / (n - 1)
+                np.negative(pi_curr, out=pii[k])
+                tay[k] = (n + 1) * pi_prev - n * x * pi_curr
+            yield start, pii[:count], tay[:count]
+
+    @property
+    def Orders(self) -> int:
+        return self.Pii.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.Teta.nbytes + self.Pii.nbytes + self.Tay.nbytes
+
+    @classmethod
+    def get(cls, orders: int, teta: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Базис Pii/Tay из кэша процесса, при промахе - с расчётом
+
+        :param orders: Число порядков n = 1..orders
+        :param teta: Углы наблюдения в радианах
+        :return: Pii и Tay размером (orders, angles), только для чтения
+        """
+        teta = np.ascontiguousarray(teta, dtype=float)
+        key = teta.tobytes()
+        with cls.__lock:
+            basis = cls.__cache.get(key)
+            if basis is not None and basis.Orders >= orders:
+                cls.__cache.move_to_end(key)
+                cls.__hits += 1
+                return basis.Pii[:orders], basis.Tay[:orders]
+            cls.__misses += 1
+
+        basis = cls(orders, teta)
+        if basis.nbytes > cls.MAX_BYTES:
+            return basis.Pii, basis.Tay
+        with cls.__lock:
+            cached = cls.__cache.get(key)
+            if cached is None or cached.Orders < orders:
+                if cached is not None:
+                    cls.__bytes -= cached.nbytes
+                cls.__cache[key] = basis
+                cls.__bytes += basis.nbytes
+            cls.__cache.move_to_end(key)
+            while len(cls.__cache) > cls.MAX_CACHED or cls.__bytes > cls.MAX_BYTES:
+                _, evicted = cls.__cache.popitem(last=False)
+                cls.__bytes -= evicted.nbytes
+        return basis.Pii, basis.Tay
+
+    @classmethod
+    def cache_info(cls) -> dict[str, int]:
+        """Статистика кэша: попадания, промахи, число сеток и их объём в байтах"""
+        with cls.__lock:
+            return {"hits": cls.__hits, "misses": cls.__misses, "size": len(cls.__cache), "bytes": cls.__bytes}
+
+    @classmethod
+    def cache_clear(cls) -> None:
+        """Очистка кэша и статистики"""
+        with cls.__lock:
+            cls.__cache.clear()
+            cls.__bytes = 0
+            cls.__hits = 0
+            cls.__misses = 0
@@ -0,0 +1,140 @@
+import math
+import numpy as np
+from typing import Sequence
+from .Constants import TETA_START, TETA_STOP, STEP_DEGREES, MAX_ANGLES
+
+
+class AngularGrid:
+    """
+    Класс для представления сетки углов наблюдения
+
+    Стоимость расчёта диаграммы пропорциональна числу углов сетки, поэтому
+    для главного лепестка или грубого предпросмотра достаточно задать
+    сектор или крупный шаг вместо полной окружности.
+
+    Атрибуты
+    --------
+    Teta : np.ndarray
+        Углы наблюдения в радианах по возрастанию, только для чтения.
+    """
+    def __init__(self, angles: Sequence[float]):
+        """
+        Сетка из явного списка углов
+
+        :param angles: Углы наблюдения в градусах
+        """
+        teta = np.unique(np.asarray(angles, dtype=float)) * (math.pi/180)
+        self.__init_radians(teta)
+
+    def __init_radians(self, teta: np.ndarray) -> None:
+        self._validate(teta)
+        self.Teta: np.ndarray = teta
+        self.Teta.setflags(write=False)
+
+    @staticmethod
+    def _validate(teta: np.ndarray) -> None:
+        """Валидация углов сетки"""
+        if teta.ndim != 1 or teta.size == 0:
+            raise ValueError("Сетка углов должна содержать хотя бы один угол")
+
+        if teta.size > MAX_ANGLES:
+            raise ValueError(f"Сетка углов не может содержать больше {MAX_ANGLES} углов")
+
+        if not np.all(np.isfinite(teta)):
+            raise ValueError("Углы сетки должны быть конечными числами")
+
+        if teta[0] < 0 or teta[-1] > 2*math.pi + 1e-9:
+            raise ValueError("Углы сетки должны быть в диапазоне [0, 360] градусов")
+
+    @classmethod
+    def __from_radians(cls, teta: np.ndarray) -> "AngularGrid":
+        grid = cls.__new__(cls)
+        grid.__init_radians(teta)
+        return grid
+
+    @classmethod
+    def uniform(cls, start: float, stop: float, step: float) -> "AngularGrid":
+        """
+        Равномерная сетка start, start + step, ... (stop не включается)
+
+        :param start: Начальный угол в градусах
+        :param stop: Конечный угол в градусах
+        :param step: Шаг в градусах
+        """
+        if step <= 0:
+            raise ValueError("Шаг сетки углов должен быть положительным")
+
+        if stop <= start:
+            raise ValueError("Конечный угол сетки должен быть больше начального")
+
+        count = int((stop - start) / step)
+        if count > MAX_ANGLES:
+            raise ValueError(f"Сетка углов не может содержать больше {MAX_ANGLES} углов")
+
+        # Накопление шага повторяет исходную сетку Constants бит в бит
+        steps = np.full(max(count, 1), step * (math.pi/180))
+        steps[0] = start * (math.pi/180)
+        return cls.__from_radians(np.cumsum(steps))
+
+    @classmethod
+    def main_lobe(
+        cls,
+        half_width: float,
+        step: float,
+        coarse_step: float | None = None,
+        center: float = 180,
+        start: float = TETA_START,
+        stop: float = TETA_STOP
+    ) -> "AngularGrid":
+        """
+        Неравномерная сетка, сгущенная в главном лепестке
+
+        :param half_width: Полуширина сектора главного лепестка в градусах
+        :param step: Шаг внутри сектора в градусах
+        :param coarse_step: Шаг вне сектора в градусах, None - только сектор
+        :param center: Направление главного лепестка в градусах
+        :param start: Начальный угол грубой сетки в градусах
+        :param stop: Конечный угол грубой сетки в градусах
+        """
+        if half_width <= 0:
+            raise ValueError("Полуширина главного лепестка должна быть положительной")
+
+        lo = max(center - half_width, 0)
+        hi = min(center + half_width, 360)
+        fine = cls.uniform(lo, hi + step / 2, step).Teta
+        if coarse_step is None:
+            return cls.__from_radians(fine)
+
+        coarse = cls.uniform(start, stop, coarse_step).Teta
+        coarse = coarse[(coarse < fine[0]) | (coarse > fine[-1])]
+        return cls.__from_radians(np.sort(np.concatenate((coarse, fine))))
+
+    @classmethod
+    def default(cls) -> "AngularGrid":
+        """Исходная сетка Constants: 0.01..360 градусов с шагом 1 градус"""
+        return cls.uniform(TETA_START, TETA_STOP, STEP_DEGREES)
+
+    def thinned(self, max_angles: int) -> "AngularGrid":
+        """
+        Прореженная сетка для грубого предпросмотра: каждый k-й угол
+
+        Крайние углы сохраняются, поэтому Tetay прореженной сетки совпадает
+        с Tetay исходной в общих углах.
+
+        :param max_angles: Наибольшее число углов, не меньше 2
+        :return: Сетка не больше чем из max_angles углов, или эта же сетка, если она не больше
+        """
+        if len(self) <= max_angles:
+            return self
+        stride = math.ceil((len(self) - 1) / (max_angles - 1))
+        teta = self.Teta[::stride]
+        if teta[-1] != self.Teta[-1]:
+            teta = np.append(teta[:-1] if teta.size == max_angles else teta, self.Teta[-1])
+        return self.__from_radians(np.array(teta))
+
+    def __len__(self) -> int:
+        return self.Teta.size
+
+    def __str__(self) -> str:
+        degrees = self.Teta * (180/math.pi)
+        return f"AngularGrid: {len(self)} angles, {degrees[0]:.2f}..{degrees[-1]:.2f} deg"
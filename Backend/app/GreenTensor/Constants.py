@@ -3,5 +3,21 @@ import math
 
 TETA_START: Final[float] = 0.01
 TETA_STOP: Final[int] = 360
-STEP: Final[float] = math.pi/180
-STEPS: Final[int] = int(((abs(TETA_STOP) - abs(TETA_START))*(math.pi/180)) / STEP)
\ No newline at end of file
+STEP_DEGREES: Final[float] = 1
+STEP: Final[float] = STEP_DEGREES*math.pi/180
+STEPS: Final[int] = int(((abs(TETA_STOP) - abs(TETA_START))*(math.pi/180)) / STEP)
+MAX_ANGLES: Final[int] = 100_000
+
+# Угловой базис Pii/Tay хранится целиком и кэшируется, пока Accuracy * angles
+# не больше BASIS_MAX_ELEMENTS; иначе суммирование идёт блоками по
+# SUMMATION_CHUNK порядков без хранения базиса
+BASIS_MAX_ELEMENTS: Final[int] = 4_000_000
+SUMMATION_CHUNK: Final[int] = 64
+
+# Пакетный расчёт набора линз разбивается на части, таблица Риккати-Бесселя
+# каждой из которых содержит не больше BATCH_TABLE_ELEMENTS значений на массив
+BATCH_TABLE_ELEMENTS: Final[int] = 1_000_000
+
+# Ближнее поле считается по частям сетки, временные массивы каждой из
+# которых занимают не больше FIELD_TILE_BYTES байт
+FIELD_TILE_BYTES: Final[int] = 64 * 2**20
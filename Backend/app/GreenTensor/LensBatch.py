@@ -0,0 +1,158 @@
+import math
+import numpy as np
+from typing import Sequence
+from .Lens import Lens
+
+
+class LensBatch:
+    """
+    Класс для представления набора линз с одинаковым числом слоев
+
+    Параметры хранятся массивами с ведущей осью линз, что позволяет
+    рассчитывать весь набор одним пакетом (см. LensBatchCalculator).
+    Ограничения на параметры те же, что у Lens.
+
+    Атрибуты
+    --------
+    Size : int
+        Число линз в наборе
+    Layers_count : int
+        Число слоев каждой линзы (последний слой - воздух)
+    Radius : np.ndarray
+        Радиусы линз, (Size,)
+    Accuracy : np.ndarray
+        Точность расчетов каждой линзы, (Size,)
+    Norm_radii : np.ndarray
+        Нормированные радиусы слоев, (Size, Layers_count)
+    Dielectric_constants : np.ndarray
+        Диэлектрическая проницаемость материала слоев, (Size, Layers_count)
+    Magnetic_permeabilities : np.ndarray
+        Магнитная проницаемость материала слоев, (Size, Layers_count)
+    """
+    def __init__(
+        self,
+        radius_ratios: Sequence[int],
+        layers_count: int,
+        norm_radii: Sequence[Sequence[float]],
+        dielectric_constants: Sequence[Sequence[float]],
+        magnetic_permeabilities: Sequence[Sequence[float]]
+    ):
+        """
+        Инициализация набора с валидацией параметров
+
+        :param radius_ratios: Радиусы линз (коэффициенты умножения pi)
+        :param layers_count: Число слоев каждой линзы (последний слой - воздух)
+        :param norm_radii: Нормированные радиусы слоев, по строке на линзу
+        :param dielectric_constants: Диэлектрическая проницаемость материала слоев, по строке на линзу
+        :param magnetic_permeabilities: Магнитная проницаемость материала слоев, по строке на линзу
+        """
+        ratios = np.asarray(radius_ratios)
+        norm_radii = np.asarray(norm_radii)
+        dielectric_constants = np.asarray(dielectric_constants)
+        magnetic_permeabilities = np.asarray(magnetic_permeabilities)
+        self._validate_inputs(ratios, layers_count, norm_radii, dielectric_constants, magnetic_permeabilities)
+
+        self.Size: int = ratios.size
+        self.Layers_count: int = layers_count
+        self.Radius: np.ndarray = ratios.astype(int) * math.pi
+        self.Accuracy: np.ndarray = np.ceil(self.Radius*2).astype(int)
+        self.Norm_radii: np.ndarray = norm_radii.astype(float)
+        self.Dielectric_constants: np.ndarray = dielectric_constants.astype(float)
+        self.Magnetic_permeabilities: np.ndarray = magnetic_permeabilities.astype(float)
+
+    @classmethod
+    def from_lenses(cls, lenses: Sequence[Lens]) -> "LensBatch":
+        """
+        Набор из уже созданных линз
+
+        :param lenses: Линзы с одинаковым числом слоев
+        """
+        if not lenses:
+            raise ValueError("Набор должен содержать хотя бы одну линзу")
+
+        layers_count = lenses[0].Layers_count
+        if any(lens.Layers_count != layers_count for lens in lenses):
+            raise ValueError("Все линзы набора должны иметь одинаковое число слоев")
+
+        return cls(
+            [round(lens.Radius / math.pi) for lens in lenses],
+            layers_count,
+            [lens.Norm_radii for lens in lenses],
+            [lens.Dielectric_constants for lens in lenses],
+            [lens.Magnetic_permeabilities for lens in lenses]
+        )
+
+    @staticmethod
+    def _validate_inputs(
+        ratios: np.ndarray,
+        layers_count: int,
+        norm_radii: np.ndarray,
+        dielectric_constants: np.ndarray,
+        magnetic_permeabilities: np.ndarray
+    ) -> None:
+        """Валидация всех входных параметров"""
+
+        # Проверка типов данных
+        if ratios.ndim != 1 or ratios.size == 0:
+            raise ValueError("radius_ratios должен содержать хотя бы одну линзу")
+
+        if not np.issubdtype(ratios.dtype, np.integer):
+            raise TypeError("radius должен быть целым числом")
+
+        if not isinstance(layers_count, int):
+            raise TypeError("layers_count должен быть целым числом")
+
+        for name, values in (("norm_radii", norm_radii),
+                             ("dielectric_constants", dielectric_constants),
+                             ("magnetic_permeabilities", magnetic_permeabilities)):
+            if not (np.issubdtype(values.dtype, np.integer) or np.issubdtype(values.dtype, np.floating)):
+                raise TypeError(f"{name} должен содержать только числа")
+
+            if values.ndim != 2 or values.shape[0] != ratios.size:
+                raise ValueError(f"{name} должен содержать по строке на каждую линзу")
+
+        if np.any(ratios <= 0):
+            raise ValueError("radius должен быть положительным числом")
+
+        if layers_count <= 0:
+            raise ValueError("layers_count должен быть положительным числом")
+
+        if norm_radii.shape[1] != layers_count:
+            raise ValueError("Количество norm_radii должно соответствовать layers_count")
+
+        if dielectric_constants.shape[1] != layers_count:
+            raise ValueError("Количество dielectric_constants должно соответствовать layers_count")
+
+        if magnetic_permeabilities.shape[1] != layers_count:
+            raise ValueError("Количество magnetic_permeabilities должно соответствовать layers_count")
+
+        if not np.all((norm_radii > 0) & (norm_radii <= 1)):
+            raise ValueError("Нормированные радиусы должны быть в диапазоне (0, 1]")
+
+        if np.any(dielectric_constants <= 0):
+            raise ValueError("Диэлектрическая проницаемость должна быть положительной")
+
+        if np.any(magnetic_permeabilities <= 0):
+            raise ValueError("Магнитная проницаемость должна быть положительной")
+
+        if np.any(norm_radii[:, -1] != 1):
+            raise ValueError("Последний слой (воздух) должен иметь радиус 1")
+
+    def lens(self, index: int) -> Lens:
+        """Линза набора с номером index"""
+        return Lens(
+            int(round(self.Radius[index] / math.pi)),
+            self.Layers_count,
+            self.Norm_radii[index].tolist(),
+            self.Dielectric_constants[index].tolist(),
+            self.Magnetic_permeabilities[index].tolist()
+        )
+
+    def __len__(self) -> int:
+        return self.Size
+
+    def __str__(self) -> str:
+        return (
+            f"Lens Batch: {self.Size} lenses, {self.Layers_count} layers, "
+            f"Radius {self.Radius.min():.2f}..{self.Radius.max():.2f}"
+        )
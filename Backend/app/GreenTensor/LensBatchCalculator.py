@@ -0,0 +1,167 @@
+from .LensBatch import LensBatch
+from .LensCalculator import LensCalculator
+from .RiccatiBessel import RiccatiBesselTable
+from .AngularBasis import AngularBasis
+from .AngularGrid import AngularGrid
+from .Constants import STEPS, BASIS_MAX_ELEMENTS, SUMMATION_CHUNK, BATCH_TABLE_ELEMENTS
+import numpy as np
+import math
+
+
+class LensBatchCalculator:
+    """
+    Пакетный расчёт диаграмм направленности набора линз
+
+    Коэффициенты Mn/Nn и диаграммы всех линз набора считаются векторно
+    по ведущей оси линз: рекурсия импедансов - одна операция над массивом
+    (порядки, линзы) на слой, суммирование ряда - одно матричное
+    произведение (2*Size, Accuracy) @ (Accuracy, углы) с общим угловым
+    базисом. Таблица Риккати-Бесселя общая для линз пакета, поэтому линзы
+    одного радиуса делят столбцы внешней границы (функции Ханкеля),
+    а одинаковые аргументы слоев считаются один раз.
+
+    Линзы сортируются по Accuracy и разбиваются на пакеты так, чтобы
+    таблица содержала не больше BATCH_TABLE_ELEMENTS значений на массив.
+    Порядки сверх Accuracy линзы в её коэффициентах нулевые, поэтому
+    результат совпадает с LensCalculator для каждой линзы отдельно.
+
+    Атрибуты
+    --------
+    Teta : np.ndarray
+        Углы наблюдения в радианах, общие для всех линз.
+    Tetay : np.ndarray
+        Углы наблюдения, нормализованные относительно количества шагов расчета.
+    Mn : np.ndarray
+        Коэффициенты Mn ряда, (Size, max Accuracy).
+    Nn : np.ndarray
+        Коэффициенты Nn ряда, (Size, max Accuracy).
+    P_teta : np.ndarray
+        Поляризационное поле, (Size, углы).
+    P_teta_max : np.ndarray
+        Максимальное значение поляризационного поля каждой линзы, (Size,).
+    DN_NORM : np.ndarray
+        Нормированные диаграммы направленности, (Size, углы).
+    """
+    def __init__(self, batch: LensBatch, grid: AngularGrid | None = None):
+        """
+        Выполнение расчётов для набора линз
+
+        :param batch: Набор линз
+        :param grid: Сетка углов наблюдения, по умолчанию исходная сетка Constants
+        """
+        self.Batch = batch
+        self.Grid = grid if grid is not None else AngularGrid.default()
+        self.Teta: np.ndarray = self.Grid.Teta
+
+        orders = int(batch.Accuracy.max())
+        self.Mn: np.ndarray = np.zeros((batch.Size, orders), dtype=complex)
+        self.Nn: np.ndarray = np.zeros((batch.Size, orders), dtype=complex)
+        for members in self.__groups(batch):
+            mn, nn = self.__get_Mn_Nn(batch, members)
+            self.Mn[members, :mn.shape[1]] = mn
+            self.Nn[members, :nn.shape[1]] = nn
+
+        self.P_teta: np.ndarray = self.__get_P_teta()
+        self.Tetay: np.ndarray = (self.Teta[0] + self.Teta[-1] - self.Teta) * (STEPS / math.pi)
+        self.P_teta_max: np.ndarray = np.maximum(self.P_teta.max(axis=1), 0)
+        self.DN_NORM: np.ndarray = 20 * np.log10(self.P_teta / self.P_teta_max[:, np.newaxis])
+
+    @staticmethod
+    def __groups(batch: LensBatch) -> list[np.ndarray]:
+        """Номера линз пакетов, по возрастанию Accuracy"""
+        order = np.argsort(batch.Accuracy, kind="stable")
+        columns = 2 * batch.Layers_count
+        groups = []
+        start = 0
+        while start < order.size:
+            # Таблица пакета не больше (Accuracy последней линзы) x (2*Layers_count на линзу)
+            end = start + 1
+            while end < order.size and \
+                    batch.Accuracy[order[end]] * columns * (end - start + 1) <= BATCH_TABLE_ELEMENTS:
+                end += 1
+            groups.append(order[start:end])
+            start = end
+        return groups
+
+    @staticmethod
+    def __get_eps(batch: LensBatch, members: np.ndarray) -> np.ndarray:
+        """Комплексные проницаемости слоев линз пакета, (линзы, Layers_count + 1)"""
+        dc = batch.Dielectric_constants[members]
+        layers = batch.Layers_count
+        # Как и в LensCalculator, внешняя среда добавляется с проницаемостью
+        # Layers_count, если проницаемость последнего слоя не Layers_count - 1;
+        # иначе одиночный расчёт этой линзы невозможен
+        if np.any(dc[:, -1] == layers - 1):
+            raise ValueError(
+                f"Проницаемость последнего слоя не может быть равна {layers - 1}")
+        alpha = np.arctan(dc.imag / dc.real)
+        eps = np.exp(alpha * 1j) * np.abs(dc)
+        return np.concatenate((eps, np.full((len(members), 1), float(layers))), axis=1)
+
+    def __get_Mn_Nn(self, batch: LensBatch, members: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        accuracy = batch.Accuracy[members]
+        orders = int(accuracy.max())
+        radius = batch.Radius[members]
+        radii = radius[:, np.newaxis] * batch.Norm_radii[members]
+        etta = np.sqrt(np.fabs(batch.Dielectric_constants[members]) * np.fabs(batch.Magnetic_permeabilities[members]))
+        # Диагональ и наддиагональ матриц K линз пакета
+        inner_k = radii * etta
+        outer_k = radii[:, :-1] * etta[:, 1:]
+
+        rb = RiccatiBesselTable(orders, np.concatenate((inner_k.ravel(), outer_k.ravel(), radius)))
+        inner = rb.columns(inner_k).T
+        outer = rb.columns(outer_k).T
+        eps = self.__get_eps(batch, members).T
+
+        # Последний порядок каждой линзы, как и в LensCalculator, нулевой
+        n = np.arange(orders)[:, np.newaxis]
+        valid = n < (accuracy - 1)
+        layers = batch.Layers_count
+        z = np.zeros((orders, len(members)), dtype=complex)
+        y = np.zeros((orders, len(members)), dtype=complex)
+        for h in range(layers):
+            z_ratio = np.sqrt(eps[h+1] / eps[h])
+            y_ratio = np.sqrt(eps[h] / eps[h+1])
+            if h == 0:
+                core = rb.Psi_logder[:, inner[0]]
+                z = np.where(valid, z_ratio * core, 0)
+                y = np.where(valid, y_ratio * core, 0)
+                continue
+
+            c, cder, s, sder = rb.scaled_cs(inner[h], outer[h-1], orders)
+            z = np.where(valid, z_ratio * (cder + z * sder) / (c + z * s), 0)
+            y = np.where(valid, y_ratio * (cder + y * sder) / (c + y * s), 0)
+            if h == layers - 1:
+                z /= 2
+                y *= 2
+
+        psi_xi, dpsi, dxi = rb.hankel_ratios(rb.columns(radius))
+        used = n < accuracy
+        mn = np.where(used, np.conj(psi_xi * (z - dpsi) / (z - dxi)), 0)
+        nn = np.where(used, np.conj(psi_xi * (y - dpsi) / (y - dxi)), 0)
+        return mn.T, nn.T
+
+    def __get_P_teta(self) -> np.ndarray:
+        size, orders = self.Mn.shape
+        weight = LensCalculator.order_weights(orders)
+        mn, nn = weight * self.Mn, -weight * self.Nn
+        # Действительные части коэффициентов всех линз, затем мнимые:
+        # сумма по блоку порядков - два произведения (2*Size, block) @ (block, angles)
+        coef_tay = np.concatenate((mn.real, mn.imag))
+        coef_pii = np.concatenate((nn.real, nn.imag))
+
+        if orders * self.Teta.size <= BASIS_MAX_ELEMENTS:
+            blocks = [(0, *AngularBasis.get(orders, self.Teta))]
+        else:
+            blocks = AngularBasis.chunks(orders, self.Teta, SUMMATION_CHUNK)
+
+        total = np.zeros((2 * size, self.Teta.size))
+        part = np.empty_like(total)
+        for start, pii, tay in blocks:
+            end = start + len(pii)
+            total += np.matmul(coef_tay[:, start:end], tay, out=part)
+            total += np.matmul(coef_pii[:, start:end], pii, out=part)
+        return np.hypot(total[:size], total[size:])
+
+    def __len__(self) -> int:
+        return self.Batch.Size
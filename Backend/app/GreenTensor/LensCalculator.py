@@ -1,380 +1,610 @@
 from .Lens import Lens
-import cmath
-import scipy
+from .RiccatiBessel import RiccatiBesselTable
+from .AngularBasis import AngularBasis
+import numpy as np
 import math
-from .Constants import STEPS, STEP
+import time
+from .AngularGrid import AngularGrid
+from .Constants import STEPS, BASIS_MAX_ELEMENTS, SUMMATION_CHUNK
+from typing import Any, Callable
+
+
+class _Stage:
+    """
+    Ленивая стадия расчёта калькулятора
+
+    Значение считается при первом обращении к любому из выходных атрибутов
+    и кэшируется в калькуляторе. depends - атрибуты других стадий,
+    inputs - параметры линзы и сетки, от которых стадия зависит напрямую.
+    Диагностические стадии не нужны для диаграммы и считаются только по
+    явному обращению.
+    """
+    def __init__(self, func: Callable, names: tuple[str, ...], depends: tuple[str, ...], inputs: tuple[str, ...],
+                 diagnostic: bool = False):
+        self.func = func
+        self.diagnostic = diagnostic
+        self.name = "/".join(names)
+        self.single = len(names) == 1
+        self.depends = depends
+        self.inputs = frozenset(inputs)
+        self.__all_inputs: frozenset[str] | None = None
+
+    def all_inputs(self, owner: type) -> frozenset[str]:
+        """Все входные параметры стадии с учётом зависимостей"""
+        if self.__all_inputs is None:
+            result = set(self.inputs)
+            for name in self.depends:
+                result |= owner.__dict__[name].stage.all_inputs(owner)
+            self.__all_inputs = frozenset(result)
+        return self.__all_inputs
+
+
+class _Output:
+    """Атрибут калькулятора - выход стадии с номером index"""
+    def __init__(self, stage: _Stage, index: int):
+        self.stage = stage
+        self.index = index
+
+    def __get__(self, calc: Any, owner: type) -> Any:
+        if calc is None:
+            return self
+        value = calc._LensCalculator__stage_value(self.stage)
+        return value if self.stage.single else value[self.index]
+
+
+def _stage(func: Callable, *names: str, depends: tuple[str, ...] = (), inputs: tuple[str, ...] = (),
+           diagnostic: bool = False):
+    stage = _Stage(func, names, depends, inputs, diagnostic)
+    outputs = tuple(_Output(stage, i) for i in range(len(names)))
+    return outputs[0] if stage.single else outputs
+
 
 class LensCalculator:
     """
     Класс для представления калькулятора линзы
 
+    Все промежуточные величины хранятся в виде массивов numpy: по строкам
+    откладываются порядки n = 1..Accuracy, по столбцам - слои или углы
+    наблюдения. Результаты совпадают с прежней реализацией на списках
+    (скалярные вызовы scipy.special в циклах) с точностью до ошибок
+    округления: для DN_NORM абсолютное расхождение не превышает 1e-7 дБ,
+    для Teta и Tetay относительное - 1e-12. Основной вклад в расхождение дает Pii у оси
+    (teta = 0.01°), где рекуррентный базис точнее scipy.special.lpmv.
+
+    Расчёт организован как граф ленивых стадий: каждый атрибут считается
+    при первом обращении вместе со стадиями, от которых зависит, и
+    кэшируется. Калькулятор для изменённой линзы, полученный через
+    derive(), берёт у исходного все стадии, на входы которых изменение не
+    влияет. Таблица Риккати-Бесселя досчитывается только для новых
+    аргументов, а импедансы Z/Y - только начиная с первого затронутого
+    слоя. Какие стадии были посчитаны, а какие взяты готовыми, показывает
+    stage_report().
+
+    Диаграмма P_teta суммируется по порядкам сразу в один вектор углов без
+    матрицы вкладов (Accuracy, angles). Для больших Accuracy * angles
+    (больше BASIS_MAX_ELEMENTS) и угловой базис не хранится целиком, а
+    строится блоками по SUMMATION_CHUNK порядков, так что память расчёта
+    ограничена O(SUMMATION_CHUNK * angles). Вклады порядков E_teta - только
+    для диагностики: они считаются лишь при явном обращении к атрибуту.
+    Диаграммы в плоскостях E (P_teta) и H (P_phi) и кроссполяризация
+    (P_cross) получаются в одном проходе по блокам базиса: обе плоскости
+    - разные сочетания одних и тех же произведений Mn, Nn на Pii, Tay.
+    Если задан progress, сумма идёт блоками по SUMMATION_CHUNK порядков и
+    после каждого блока вызывается progress(просуммировано порядков, Orders).
+    Перед расчётом каждой стадии progress вызывается с последними
+    значениями (до суммирования - 0 из Accuracy), поэтому исключение из
+    progress прерывает расчёт и между стадиями; сама стадия, кроме
+    суммирования, не прерывается.
+
+    Импедансы Z/Y и коэффициенты Mn/Nn зависят только от отношений функций
+    Риккати-Бесселя и считаются через логарифмические производные и
+    ln|chi/psi| (см. RiccatiBesselTable), а не через сами функции, которые
+    при больших порядках переполняются. Поэтому диаграмма остаётся конечной
+    и для электрически больших линз. Атрибуты J..Sder и MJ..MHder - значения
+    самих функций, для диаграммы они не используются. С допуском tolerance
+    ряд усекается по убыванию коэффициентов Mn/Nn (см. Orders).
+
     Атрибуты
     --------
-    Alfa : list[float]
-        Углы отклонения для диэлектрических постоянных линзы.
-    Beta : list[float]
-        Углы отклонения для магнитных проницаемостей линзы.
-    Etta : list[float]
-        Волновые сопротивления для каждого слоя линзы.
-    K : list[list[float]]
-        Матрица коэффициентов среды k.
-    J : list[list[float]]
-        Значения функции Бесселя первого рода.
-    Jder : list[list[float]]
-        Производные функции Бесселя первого рода.
-    N : list[list[float]]
-        Значения функции Неймана.
-    Nder : list[list[float]]
-        Производные функции Неймана.
-    C : list[list[float]]
-        ***
-    Cder : list[list[float]]
-        Производные ***
-    S : list[list[float]]
-        ***
-    Sder : list[list[float]]
-        Производные ***
-    Z : list[list[float]]
-        Импедансы.
-    Y : list[list[float]]
-        Адмитансы.
-    MJ : list[float]
-        Значения функции Бесселя для радиуса линзы.
-    MJder : list[float]
-        Производные функции Бесселя для радиуса линзы.
-    MH : list[float]
-        Значения функции Ханкеля первого рода для радиуса линзы.
-    MHder : list[float]
-        Производные функции Ханкеля первого рода для радиуса линзы.
-    Mn : list[float]
-        ***
-    Nn : list[float]
-        ***
-    Teta : list[float]
-        Углы наблюдения в радианах.
-    Cos_Teta : list[float]
-        Косинусы углов наблюдения Teta.
-    Pii : list[list[float]]
-        Коэффициенты Pii, используемые в расчетах поляризационных характеристик.
-    Tay : list[list[float]]
-        Коэффициенты Tay, используемые в расчетах поляризационных характеристик.
-    E_teta : list[list[float]]
-        Электрическое поле на углах Teta.
-    P_teta : list[list[float]]
-        Поляризационное поле на углах Teta.
-    Tetay : list[float]
+    Alfa : np.ndarray
+        Углы отклонения для диэлектрических постоянных линзы, (Layers_count,).
+    Beta : np.ndarray
+        Углы отклонения для магнитных проницаемостей линзы, (Layers_count,).
+    Etta : np.ndarray
+        Волновые сопротивления для каждого слоя линзы, (Layers_count,).
+    K : np.ndarray
+        Матрица коэффициентов среды k, (Layers_count, Layers_count).
+    Riccati : RiccatiBesselTable
+        Функции Риккати-Бесселя для всех порядков и различных значений K и радиуса.
+    J : np.ndarray
+        Значения функции Бесселя первого рода, (Accuracy,).
+    Jder : np.ndarray
+        Производные функции Бесселя первого рода, (Accuracy,).
+    N : np.ndarray
+        Значения функции Неймана, (Accuracy,).
+    Nder : np.ndarray
+        Производные функции Неймана, (Accuracy,).
+    C : np.ndarray
+        ***, (Accuracy, Layers_count - 1).
+    Cder : np.ndarray
+        Производные ***, (Accuracy, Layers_count - 1).
+    S : np.ndarray
+        ***, (Accuracy, Layers_count - 1).
+    Sder : np.ndarray
+        Производные ***, (Accuracy, Layers_count - 1).
+    Z : np.ndarray
+        Импедансы, (Accuracy, Layers_count).
+    Y : np.ndarray
+        Адмитансы, (Accuracy, Layers_count).
+    MJ : np.ndarray
+        Значения функции Бесселя для радиуса линзы, (Accuracy,).
+    MJder : np.ndarray
+        Производные функции Бесселя для радиуса линзы, (Accuracy,).
+    MH : np.ndarray
+        Значения функции Ханкеля первого рода для радиуса линзы, (Accuracy,).
+    MHder : np.ndarray
+        Производные функции Ханкеля первого рода для радиуса линзы, (Accuracy,).
+    Mn : np.ndarray
+        ***, (Accuracy,).
+    Nn : np.ndarray
+        ***, (Accuracy,).
+    Grid : AngularGrid
+        Сетка углов наблюдения.
+    Teta : np.ndarray
+        Углы наблюдения в радианах, (angles,).
+    Cos_Teta : np.ndarray
+        Косинусы углов наблюдения Teta, (angles,).
+    Pii : np.ndarray
+        Коэффициенты Pii, используемые в расчетах поляризационных характеристик, (Accuracy, angles).
+        Общие для всех линз с тем же Accuracy (см. AngularBasis), только для чтения.
+    Tay : np.ndarray
+        Коэффициенты Tay, используемые в расчетах поляризационных характеристик, (Accuracy, angles).
+        Общие для всех линз с тем же Accuracy (см. AngularBasis), только для чтения.
+    Tolerance : float | None
+        Допуск адаптивного усечения ряда.
+    Progress : Callable[[int, int], None] | None
+        Обработчик хода суммирования ряда.
+    Orders : int
+        Число порядков, фактически использованных в сумме P_teta. Без допуска
+        равно Accuracy, иначе - последний порядок, оценка вклада которого
+        (2n+1)/2 * (|Mn| + |Nn|) больше Tolerance от наибольшей.
+    E_teta : np.ndarray
+        Вклады порядков в электрическое поле на углах Teta, (Accuracy, angles).
+        Диагностическая стадия, не считается при расчёте диаграммы.
+    P_teta : np.ndarray
+        Поляризационное поле на углах Teta в плоскости E, (angles,).
+    P_phi : np.ndarray
+        Поле в плоскости H, (angles,). Считается в том же проходе по
+        порядкам, что и P_teta, из тех же Mn/Nn и Pii/Tay.
+    P_cross : np.ndarray
+        Кроссполяризационное поле в диагональной плоскости, (angles,).
+    Tetay : np.ndarray
         Углы наблюдения, нормализованные относительно количества шагов расчета.
     P_teta_max : float
         Максимальное значение поляризационного поля P_teta.
-    DN_NORM : list[float]
+    DN_NORM : np.ndarray
         Нормированное значение диаграммы направленности.
+    DN_NORM_H : np.ndarray
+        Диаграмма в плоскости H, нормированная на P_teta_max.
+    DN_NORM_CROSS : np.ndarray
+        Диаграмма кроссполяризации, нормированная на P_teta_max.
     """
-    def __init__(self, lens: Lens):
+    def __init__(
+        self,
+        lens: Lens,
+        grid: AngularGrid | None = None,
+        tolerance: float | None = None,
+        progress: Callable[[int, int], None] | None = None
+    ):
         """
-        Инициализация калькулятора со всеми подсчётами для заданной линзы
+        Инициализация калькулятора для заданной линзы
+
+        Стадии считаются при первом обращении к атрибутам, см. compute_all().
 
         :param lens: Рассматриваемая линза
+        :param grid: Сетка углов наблюдения, по умолчанию - AngularGrid.default()
+        :param tolerance: Допуск адаптивного усечения ряда (см. Orders),
+            по умолчанию суммируются все Accuracy порядков
+        :param progress: Вызывается как progress(done, Orders) по мере суммирования ряда
+            и перед расчётом каждой стадии
         """
-        self.Alfa: list[float] = self.__get_Alpha(lens)
-        self.Beta: list[float] = self.__get_Beta(lens)
-        self.Etta: list[float] = self.__get_Etta(lens)
-        self.K: list[list[float]] = self.__get_K(lens)
-        self.J: list[list[float]] = self.__get_J(lens)
-        self.Jder: list[list[float]] = self.__get_Jder(lens)
-        self.N: list[list[float]] = self.__get_N(lens)
-        self.Nder: list[list[float]] = self.__get_Nder(lens)
-        self.C: list[list[float]] = self.__get_C(lens)
-        self.Cder: list[list[float]] = self.__get_Cder(lens)
-        self.S: list[list[float]] = self.__get_S(lens)
-        self.Sder: list[list[float]] = self.__get_Sder(lens)
-        self.Z: list[list[float]]
-        self.Y: list[list[float]]
-        self.Z, self.Y = self.__get_ZY(lens)
-        self.MJ: list[float]
-        self.MJder: list[float]
-        self.MH: list[float]
-        self.MHder: list[float]
-        self.MJ, self.MJder, self.MH, self.MHder = self.__get_mLists(lens)
-        self.Mn: list[float]
-        self.Nn: list[float]
-        self.Mn, self.Nn = self.__get_Mn_Nn(lens)
-        self.Teta: list[float] = self.__get_Teta(lens)
-        self.Cos_Teta: list[float] = self.__get_Cos_Teta(lens)
-        self.Pii: list[list[float]]
-        self.Tay: list[list[float]]
-        self.Pii, self.Tay = self.__get_Pii_Tay(lens)
-        self.E_teta: list[list[float]]
-        self.P_teta: list[list[float]]
-        self.E_teta, self.P_teta = self.__get_EP_teta(lens)
-        self.Tetay: list[float] = self.__get_Tetay(lens)
-        self.P_teta_max: float = self.__get_P_teta_max()
-        self.DN_NORM: list[float] = self.__get_DN_NORM(lens)
-
-
-    def __get_Alpha(self, lens: Lens) -> list[float]:
-        return [math.atan(dc.imag / dc.real) for dc in lens.Dielectric_constants]
-
-    def __get_Beta(self, lens: Lens) -> list[float]:
-        return [math.atan(mp.imag / mp.real) for mp in lens.Magnetic_permeabilities]
-    
-    def __get_Etta(self, lens: Lens) -> list[float]:
-        return [math.sqrt(
-            math.fabs(lens.Dielectric_constants[i]) * math.fabs(lens.Magnetic_permeabilities[i]))
-            for i in range(lens.Layers_count)]
-
-    def __get_K(self, lens: Lens) -> list[list[float]]:
-        result = [[0] * lens.Layers_count for i in range(lens.Layers_count)]
-        j = 0
-        for i in range (lens.Layers_count):
-            result[i][j] = lens.Radius * lens.Norm_radii[i] * self.Etta[j]
-            if j < lens.Layers_count - 1:
-                j = j + 1
-                result[i][j] = lens.Radius * lens.Norm_radii[i] * self.Etta[j]
-        return result
+        self.Grid: AngularGrid = grid if grid is not None else AngularGrid.default()
+        self.Tolerance: float | None = tolerance
+        self.Progress: Callable[[int, int], None] | None = progress
+        # Последний отчёт о ходе суммирования: (done, total)
+        self.__progress: tuple[int, int] = (0, lens.Accuracy)
+        self.__lens: Lens = lens
+        self.__inputs: dict[str, Any] = self.__snapshot(lens, self.Grid, tolerance)
+        self.__values: dict[str, Any] = {}
+        self.__report: dict[str, str] = {}
+        self.__partial: set[str] = set()
+        self.__timings: dict[str, float] = {}
+        # Время вложенных стадий, вычитаемое из времени объемлющей
+        self.__nested: list[float] = []
+        # Значения стадий калькулятора-предшественника для частичного пересчёта
+        self.__base_values: dict[str, Any] = {}
+        self.__base_inputs: dict[str, Any] = {}
 
-    def __jfunc(self, i: int, j1: int, j2: int) -> float:
-        nu = i + 1
-        return (scipy.special.jv(nu + 0.5, self.K[j1][j2])) * (math.sqrt(self.K[j1][j2] * math.pi/2))
+    @staticmethod
+    def __snapshot(lens: Lens, grid: AngularGrid, tolerance: float | None) -> dict[str, Any]:
+        """Входные параметры, от которых зависят стадии"""
+        return {
+            "radius": lens.Radius,
+            "accuracy": lens.Accuracy,
+            "layers_count": lens.Layers_count,
+            "norm_radii": tuple(lens.Norm_radii),
+            "dielectric_constants": tuple(lens.Dielectric_constants),
+            "magnetic_permeabilities": tuple(lens.Magnetic_permeabilities),
+            "grid": grid.Teta.tobytes(),
+            "tolerance": tolerance
+        }
 
-    def __get_J(self, lens: Lens) -> list[float]:
-        result = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        for i in range(lens.Accuracy):
-            result[i] = self.__jfunc(i, 0, 0)
-        return result
+    def __stage_value(self, stage: _Stage) -> Any:
+        if stage.name not in self.__values:
+            if self.Progress is not None:
+                self.Progress(*self.__progress)
+            started = time.perf_counter()
+            self.__nested.append(0.0)
+            try:
+                self.__values[stage.name] = stage.func(self, self.__lens)
+            finally:
+                elapsed = time.perf_counter() - started
+                inner = self.__nested.pop()
+                if self.__nested:
+                    self.__nested[-1] += elapsed
+            self.__timings[stage.name] = elapsed - inner
+            self.__report[stage.name] = "partial" if stage.name in self.__partial else "computed"
+        return self.__values[stage.name]
 
-    def __jderfunc(self, i: int, j1: int, j2: int, tie: bool) -> float:
-        nu = i + 1
-        if not tie:
-            jder = ((nu / (2 * nu + 1)) *  (scipy.special.jv(nu - 0.5, self.K[j1][j2]) * math.sqrt(self.K[j1][j2] * math.pi/2)) - \
-            ((nu + 1) / (2 * nu + 1)) *  (scipy.special.jv(nu + 1.5, self.K[j1][j2]) * math.sqrt(self.K[j1][j2] * math.pi/2)) + \
-            (self.J[i] / self.K[j1][j2]))
-        else:
-            jder = ((nu / (2 * nu + 1)) * ((scipy.special.jv(nu - 0.5,self.K[j1][j2]) * (math.sqrt(self.K[j1][j2] * math.pi/2))) / self.K[j1][j2])) * self.K[j1][j2] - \
-            (((nu + 1) / (2 * nu + 1)) * ((scipy.special.jv(nu + 1.5,self.K[j1][j2])) * (math.sqrt(self.K[j1][j2] * math.pi/2))) / self.K[j1][j2]) * self.K[j1][j2] + \
-            ((scipy.special.jv(nu + 0.5,self.K[j1][j2])) * (math.sqrt(self.K[j1][j2] * math.pi/2))) / self.K[j1][j2]
-        return jder
-    
-    def __get_Jder(self, lens: Lens) -> list[float]:
-        result = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        for i in range(lens.Accuracy):
-            result[i] = self.__jderfunc(i, 0, 0, False)
-        return result
-    
-    def __nfunc(self, i: int, j1: int, j2: int) -> float:
-        return scipy.special.yv((i+1) + 0.5, self.K[j1][j2]) * math.sqrt(self.K[j1][j2]* math.pi/2)
-    
-    def __get_N(self, lens: Lens) -> list[float]:
-        result = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        for i in range(lens.Accuracy):
-            result[i] = self.__nfunc(i, 0, 0)
-        return result
-    
-    def __nderfunc(self, i: int, j1: int, j2: int, tie: bool) -> float:
-        nu = i + 1
-        if not tie:
-            nder = ((nu / (2 * nu + 1)) *  (scipy.special.yv(nu - 0.5, self.K[j1][j2]) * math.sqrt(self.K[j1][j2] * math.pi/2)) - \
-            ((nu + 1) / (2 * nu + 1)) *  (scipy.special.yv(nu + 1.5, self.K[j1][j2]) * math.sqrt(self.K[j1][j2] * math.pi/2)) + \
-            (self.__nfunc(i, j1, j2) / self.K[j1][j2]))
-        else:
-            nder = (((nu/(2 * nu + 1)) * (((scipy.special.yv(nu - 0.5, self.K[j1][j2])) * (math.sqrt(self.K[j1][j2] * math.pi/2))) / self.K[j1][j2])) * self.K[j1][j2] - \
-            (((nu + 1) / (2 * nu + 1)) * ((scipy.special.yv(nu + 1.5, self.K[j1][j2])) * (math.sqrt(self.K[j1][j2] * math.pi/2))) / self.K[j1][j2]) * self.K[j1][j2] + \
-            (self.__nfunc(i, j1, j2)) / self.K[j1][j2])
-        return nder
-
-    def __get_Nder(self, lens: Lens) -> list[float]:
-        result = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        for i in range(lens.Accuracy):
-            result[i] = self.__nderfunc(i, 0, 0, False)
-        return result
-            
-    def __get_C(self, lens: Lens) -> list[list[float]]:
-        result = [[0] * (len(self.Etta)-1) for i in range(lens.Accuracy)]
-        for i in range(lens.Accuracy - 1):
-            for j in range(len(self.Etta) - 1):
-                result[i][j] = (self.__jfunc(i, (j+1), (j+1)) * self.__nderfunc(i, j, (j+1), True)) \
-                    - (self.__nfunc(i, (j+1), (j+1)) * self.__jderfunc(i, j, (j+1), True))
-        return result
-    
-    def __get_Cder(self, lens: Lens) -> list[list[float]]:
-        result = [[0] * (len(self.Etta)-1) for i in range(lens.Accuracy)]
-        for i in range(lens.Accuracy - 1):
-            for j in range(len(self.Etta) - 1):
-                result[i][j] = self.__jderfunc(i, (j+1), (j+1), True) * self.__nderfunc(i, j, (j+1), True) \
-                    - self.__nderfunc(i, (j+1), (j+1), True) * self.__jderfunc(i, j, (j+1), True)
-        return result
-    
-    def __get_S(self, lens: Lens) -> list[list[float]]:
-        result = [[0] * (len(self.Etta)-1) for i in range(lens.Accuracy)]
-        for i in range(lens.Accuracy - 1):
-            for j in range(len(self.Etta) - 1):
-                result[i][j] = self.__nfunc(i,(j+1),(j+1)) * self.__jfunc(i,j,(j+1)) \
-                    - self.__jfunc(i,(j+1),(j+1)) * self.__nfunc(i,j,(j+1))
-        return result
-    
-    def __get_Sder(self, lens: Lens) -> list[list[float]]:
-        result = [[0] * (len(self.Etta)-1) for i in range(lens.Accuracy)]
-        for i in range(lens.Accuracy - 1):
-            for j in range(len(self.Etta) - 1):
-                result[i][j] = self.__nderfunc(i,(j+1),(j+1), True) * self.__jfunc(i, j, (j+1)) \
-                    - self.__jderfunc(i,(j+1),(j+1), True) * self.__nfunc(i, j, (j+1))
+    def derive(self, lens: Lens | None = None, grid: AngularGrid | None = None) -> "LensCalculator":
+        """
+        Калькулятор для изменённой линзы или сетки с переиспользованием стадий
+
+        Стадии, уже посчитанные этим калькулятором и не зависящие от
+        изменённых параметров, переходят в новый калькулятор как есть.
+        Допуск усечения ряда и обработчик progress сохраняются.
+
+        :param lens: Новая линза, по умолчанию - текущая
+        :param grid: Новая сетка углов, по умолчанию - текущая
+        """
+        derived = LensCalculator(
+            lens if lens is not None else self.__lens, grid if grid is not None else self.Grid, self.Tolerance,
+            self.Progress)
+        changed = {name for name, value in derived.__inputs.items() if value != self.__inputs[name]}
+        for name, value in self.__values.items():
+            stage = self.__stages()[name]
+            if not stage.all_inputs(LensCalculator) & changed:
+                derived.__values[name] = value
+                derived.__report[name] = "reused"
+        derived.__base_values = dict(self.__values)
+        derived.__base_inputs = self.__inputs
+        return derived
+
+    @classmethod
+    def __stages(cls) -> dict[str, _Stage]:
+        return {attr.stage.name: attr.stage for attr in cls.__dict__.values() if isinstance(attr, _Output)}
+
+    def stage_report(self) -> dict[str, str]:
+        """
+        Состояние стадий в порядке завершения
+
+        :return: Имя стадии -> "computed" (посчитана заново), "partial"
+            (досчитана с использованием предшественника) или "reused"
+            (взята у предшественника)
+        """
+        return dict(self.__report)
+
+    def stage_timings(self) -> dict[str, float]:
+        """
+        Собственное время посчитанных этим калькулятором стадий, секунды
+
+        Время стадий, от которых стадия зависит, в её время не входит.
+        """
+        return dict(self.__timings)
+
+    def recomputed(self) -> list[str]:
+        """Стадии, посчитанные этим калькулятором полностью или частично"""
+        return [name for name, state in self.__report.items() if state != "reused"]
+
+    def compute_all(self, diagnostics: bool = False) -> "LensCalculator":
+        """
+        Расчёт всех стадий сразу, как при прежней энергичной инициализации
+
+        :param diagnostics: Считать также диагностические стадии (E_teta)
+        """
+        for stage in self.__stages().values():
+            if diagnostics or not stage.diagnostic:
+                self.__stage_value(stage)
+        return self
+
+
+    def __get_Alpha(self, lens: Lens) -> np.ndarray:
+        dc = np.asarray(lens.Dielectric_constants)
+        return np.arctan(dc.imag / dc.real)
+
+    def __get_Beta(self, lens: Lens) -> np.ndarray:
+        mp = np.asarray(lens.Magnetic_permeabilities)
+        return np.arctan(mp.imag / mp.real)
+
+    def __get_Etta(self, lens: Lens) -> np.ndarray:
+        return np.sqrt(
+            np.fabs(lens.Dielectric_constants) * np.fabs(lens.Magnetic_permeabilities))
+
+    def __get_K(self, lens: Lens) -> np.ndarray:
+        # На диагонали - слой i в собственной среде, над диагональю - граница
+        # слоя i со средой следующего слоя
+        radii = lens.Radius * np.asarray(lens.Norm_radii, dtype=float)
+        result = np.diag(radii * self.Etta)
+        idx = np.arange(lens.Layers_count - 1)
+        result[idx, idx + 1] = radii[:-1] * self.Etta[1:]
         return result
-    
-    def __get_ZY(self, lens: Lens) \
-            -> tuple[list[list[float]], list[list[float]]]:
-        dc = lens.Dielectric_constants.copy()
-        alpha = self.Alfa.copy()
+
+    @staticmethod
+    def __orders(count: int) -> np.ndarray:
+        """Порядки n = 1..count в виде столбца для broadcasting"""
+        return np.arange(1, count + 1, dtype=float)[:, np.newaxis]
+
+    def __get_Riccati(self, lens: Lens) -> RiccatiBesselTable:
+        # Все различные аргументы: диагональ и наддиагональ K, радиус линзы
+        idx = np.arange(lens.Layers_count - 1)
+        args = np.concatenate((np.diag(self.K), self.K[idx, idx + 1], [lens.Radius]))
+        base = self.__base_values.get("Riccati")
+        if base is not None and base.Orders == lens.Accuracy:
+            self.__partial.add("Riccati")
+            return RiccatiBesselTable(lens.Accuracy, args, reuse=base)
+        return RiccatiBesselTable(lens.Accuracy, args)
+
+    def __get_J(self, lens: Lens) -> np.ndarray:
+        return self.Riccati.Psi[:, self.Riccati.columns(self.K[0, 0])]
+
+    def __get_Jder(self, lens: Lens) -> np.ndarray:
+        return self.Riccati.Psi_der[:, self.Riccati.columns(self.K[0, 0])]
+
+    def __get_N(self, lens: Lens) -> np.ndarray:
+        return self.Riccati.Chi[:, self.Riccati.columns(self.K[0, 0])]
+
+    def __get_Nder(self, lens: Lens) -> np.ndarray:
+        return self.Riccati.Chi_der[:, self.Riccati.columns(self.K[0, 0])]
+
+    def __get_boundary_args(self, lens: Lens) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Столбцы таблицы Риккати-Бесселя на границах слоев j и j+1
+
+        :return: столбцы (K[j+1][j+1], K[j][j+1]) для j = 0..Layers_count-2
+        """
+        idx = np.arange(lens.Layers_count - 1)
+        return self.Riccati.columns(self.K[idx + 1, idx + 1]), self.Riccati.columns(self.K[idx, idx + 1])
+
+    @staticmethod
+    def __drop_last_order(values: np.ndarray) -> np.ndarray:
+        """Последний порядок, как и в исходной реализации, остается нулевым"""
+        values[-1] = 0
+        return values
+
+    def __get_C(self, lens: Lens) -> np.ndarray:
+        inner, outer = self.__get_boundary_args(lens)
+        rb = self.Riccati
+        return self.__drop_last_order(
+            rb.Psi[:, inner] * rb.Chi_der[:, outer] - rb.Chi[:, inner] * rb.Psi_der[:, outer])
+
+    def __get_Cder(self, lens: Lens) -> np.ndarray:
+        inner, outer = self.__get_boundary_args(lens)
+        rb = self.Riccati
+        return self.__drop_last_order(
+            rb.Psi_der[:, inner] * rb.Chi_der[:, outer] - rb.Chi_der[:, inner] * rb.Psi_der[:, outer])
+
+    def __get_S(self, lens: Lens) -> np.ndarray:
+        inner, outer = self.__get_boundary_args(lens)
+        rb = self.Riccati
+        return self.__drop_last_order(
+            rb.Chi[:, inner] * rb.Psi[:, outer] - rb.Psi[:, inner] * rb.Chi[:, outer])
+
+    def __get_Sder(self, lens: Lens) -> np.ndarray:
+        inner, outer = self.__get_boundary_args(lens)
+        rb = self.Riccati
+        return self.__drop_last_order(
+            rb.Chi_der[:, inner] * rb.Psi[:, outer] - rb.Psi_der[:, inner] * rb.Chi[:, outer])
+
+    @staticmethod
+    def __get_eps(dielectric_constants: tuple[float, ...], alfa: np.ndarray) -> np.ndarray:
+        """Комплексные проницаемости слоев; отношение соседних - под корнем"""
+        dc = list(dielectric_constants)
+        alpha = list(alfa)
         if dc[len(dc)-1] != (len(dc)-1):
             alpha.append(0)
             dc.append(len(dc))
+        return np.exp(np.asarray(alpha) * 1j) * np.abs(dc)
 
-        z = [[0] * (len(lens.Norm_radii)) for i in range(lens.Accuracy)]
-        y = [[0] * (len(lens.Norm_radii)) for i in range(lens.Accuracy)]
-
-        for i in range(lens.Accuracy - 1):
-            for h in range(len(lens.Norm_radii)):
-                if h == 0:
-                    z[i][h] = (cmath.sqrt((cmath.exp(alpha[1] * 1j) * abs(dc[1])) / ((cmath.exp(alpha[0] * 1j) * abs(dc[0]))))) * ((self.Jder[i])/(self.J[i]))
-                    y[i][h] = (cmath.sqrt((cmath.exp(alpha[0] * 1j) * abs(dc[0])) / ((cmath.exp(alpha[1] * 1j) * abs(dc[1]))))) * ((self.Jder[i])/(self.J[i]))
-                else:
-                    if h == (len(lens.Norm_radii) - 1):
-                        z[i][h] = (cmath.sqrt((cmath.exp(alpha[h+1] * 1j) * abs(dc[h+1])) / ((cmath.exp(alpha[h] * 1j) * abs(dc[h]))))) * \
-                                (self.Cder[i][h-1] + z[i][h-1] * self.Sder[i][h-1]) / (self.C[i][h-1] + z[i][h-1] * self.S[i][h-1]) / 2
-                        y[i][h] = (cmath.sqrt((cmath.exp(alpha[h] * 1j) * abs(dc[h])) / ((cmath.exp(alpha[h+1] * 1j) * abs(dc[h+1]))))) * \
-                                (self.Cder[i][h-1] + y[i][h-1] * self.Sder[i][h-1]) / (self.C[i][h-1] + y[i][h-1] * self.S[i][h-1]) * 2
-                    else:
-                        z[i][h] = (cmath.sqrt((cmath.exp(alpha[h+1] * 1j) * abs(dc[h+1])) / ((cmath.exp(alpha[h] * 1j) * abs(dc[h]))))) * \
-                                (self.Cder[i][h-1] + z[i][h-1] * self.Sder[i][h-1]) / (self.C[i][h-1] + z[i][h-1] * self.S[i][h-1])
-                        y[i][h] = (cmath.sqrt((cmath.exp(alpha[h] * 1j) * abs(dc[h])) / ((cmath.exp(alpha[h+1] * 1j) * abs(dc[h+1]))))) * \
-                                (self.Cder[i][h-1] + y[i][h-1] * self.Sder[i][h-1]) / (self.C[i][h-1] + y[i][h-1] * self.S[i][h-1])   
-        return z, y
-        
-    def __hfunc(self, i: int, rad: float) -> float:
-        nu = i + 1
-        return (scipy.special.hankel1(nu + 0.5, rad)) * (math.sqrt(rad * math.pi/2))
+    @staticmethod
+    def __zy_signature(eps: np.ndarray, k: np.ndarray) -> np.ndarray:
+        """
+        Величины, от которых зависит столбец h импедансов (не считая h-1):
+        eps[h], eps[h+1] и аргументы K на границе слоев h-1 и h
+        """
+        layers = k.shape[0]
+        idx = np.arange(layers)
+        inner = k[idx, idx]
+        outer = np.concatenate(([k[0, 0]], k[idx[:-1], idx[1:]]))
+        return np.stack((eps[:layers], eps[1:layers+1], inner, outer), axis=1)
 
-    def __hderfunc(self, i: int, rad: float) -> float:
-        nu = i + 1
-        return ((nu / (2 * nu + 1)) * (((scipy.special.hankel1(nu - 0.5, rad) * (cmath.sqrt(rad * math.pi/2))) / rad)) * rad - \
-        (((nu + 1) / (2 * nu + 1)) * ((scipy.special.hankel1(nu + 1.5, rad)) * (cmath.sqrt(rad * math.pi/2))) / rad) * rad + \
-        ((scipy.special.hankel1(nu + 0.5, rad)) * (cmath.sqrt(rad * math.pi/2))) / rad)
+    def __first_changed_layer(self, lens: Lens, eps: np.ndarray) -> int:
+        """Первый столбец Z/Y, который нельзя взять у предшественника"""
+        if "Z/Y" not in self.__base_values or "K" not in self.__base_values \
+                or "Alfa" not in self.__base_values \
+                or self.__base_inputs["accuracy"] != lens.Accuracy \
+                or self.__base_inputs["layers_count"] != lens.Layers_count:
+            return 0
+        base_eps = self.__get_eps(self.__base_inputs["dielectric_constants"], self.__base_values["Alfa"])
+        if base_eps.shape != eps.shape:
+            return 0
+        changed = np.any(
+            self.__zy_signature(eps, self.K) != self.__zy_signature(base_eps, self.__base_values["K"]), axis=1)
+        return int(np.argmax(changed)) if changed.any() else lens.Layers_count
 
-    def __get_mLists(self, lens: Lens) \
-            -> tuple[list[float], list[float], list[float], list[float]]:        
-        mJ = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        mJder = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        mH = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        mHder = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        
-        original_k00 = self.K[0][0]
-        self.K[0][0] = lens.Radius
-        for i in range(lens.Accuracy):
-            mJ[i] = self.__jfunc(i, 0, 0)
-            mJder[i] = self.__jderfunc(i, 0, 0, True)
-            mH[i] = self.__hfunc(i, lens.Radius)
-            mHder[i] = self.__hderfunc(i, lens.Radius)
-        self.K[0][0] = original_k00
+    def __get_ZY(self, lens: Lens) -> tuple[np.ndarray, np.ndarray]:
+        eps = self.__get_eps(lens.Dielectric_constants, self.Alfa)
 
+        layers = len(lens.Norm_radii)
+        orders = lens.Accuracy - 1
+        z = np.zeros((lens.Accuracy, layers), dtype=complex)
+        y = np.zeros((lens.Accuracy, layers), dtype=complex)
+
+        # Импедансы считаются от слоя 0 наружу: внутренние неизменённые
+        # слои берутся у предшественника
+        first = self.__first_changed_layer(lens, eps)
+        if first > 0:
+            self.__partial.add("Z/Y")
+            base_z, base_y = self.__base_values["Z/Y"]
+            z[:, :first] = base_z[:, :first]
+            y[:, :first] = base_y[:, :first]
+
+        rb = self.Riccati
+        inner, outer = self.__get_boundary_args(lens)
+        core = rb.columns(self.K[0, 0])
+        for h in range(first, layers):
+            z_ratio = np.sqrt(eps[h+1] / eps[h])
+            y_ratio = np.sqrt(eps[h] / eps[h+1])
+            if h == 0:
+                z[:orders, h] = z_ratio * rb.Psi_logder[:orders, core]
+                y[:orders, h] = y_ratio * rb.Psi_logder[:orders, core]
+                continue
+
+            c, cder, s, sder = rb.scaled_cs(inner[h-1], outer[h-1], orders)
+            z[:orders, h] = z_ratio * (cder + z[:orders, h-1] * sder) / (c + z[:orders, h-1] * s)
+            y[:orders, h] = y_ratio * (cder + y[:orders, h-1] * sder) / (c + y[:orders, h-1] * s)
+            if h == layers - 1:
+                z[:orders, h] /= 2
+                y[:orders, h] *= 2
+        return z, y
+
+    def __get_mLists(self, lens: Lens) \
+            -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        col = self.Riccati.columns(lens.Radius)
+        mJ = self.Riccati.Psi[:, col]
+        mJder = self.Riccati.Psi_der[:, col]
+        mH = self.Riccati.Xi[:, col]
+        mHder = self.Riccati.Xi_der[:, col]
         return mJ, mJder, mH, mHder
-    
-    def __get_Mn_Nn(self, lens: Lens) -> tuple[list[float], list[float]]:
-        mn = [0 * lens.Layers_count for i in range(lens.Accuracy)]
-        nn = [0 * lens.Layers_count for i in range(lens.Accuracy)]
+
+    def __get_Mn_Nn(self, lens: Lens) -> tuple[np.ndarray, np.ndarray]:
+        # (z*psi - psi') / (z*xi - xi') = psi/xi * (z - D_psi) / (z - D_xi),
+        # где psi/xi и D_xi = xi'/xi выражаются через chi/psi без переполнения
         h = len(lens.Norm_radii) - 1
-        for i in range(lens.Accuracy):
-            mn[i] = (self.Z[i][h] * self.MJ[i] - self.MJder[i]) / (self.Z[i][h] * self.MH[i] - self.MHder[i])
-            mn[i] = mn[i].real - mn[i].imag * 1j
-            nn[i] = (self.Y[i][h] * self.MJ[i] - self.MJder[i]) / (self.Y[i][h] * self.MH[i] - self.MHder[i])
-            nn[i] = nn[i].real - nn[i].imag * 1j
+        z, y = self.Z[:, h], self.Y[:, h]
+        psi_xi, dpsi, dxi = self.Riccati.hankel_ratios(self.Riccati.columns(lens.Radius))
+        mn = np.conj(psi_xi * (z - dpsi) / (z - dxi))
+        nn = np.conj(psi_xi * (y - dpsi) / (y - dxi))
         return mn, nn
-    
-    def __get_Teta(self, lens: Lens) -> list[float]:
-        teta_start = 0.01
-        teta = [0 * lens.Layers_count for i in range(STEPS)]
-        for i in range(STEPS):
-            if i == 0:
-                teta[i] = (teta_start)*(math.pi/180)
-            else:
-                teta[i] = teta[i-1] + STEP
-        return teta
-    
-    def __get_Cos_Teta(self, lens: Lens) -> list[float]:
-        cos_teta = [0 * lens.Layers_count for i in range(STEPS)]
-        for i in range(STEPS):
-            cos_teta[i] = math.cos(self.Teta[i])
-        return cos_teta
-    
-    def __get_Pii_Tay(self, lens: Lens) -> tuple[list[list[float]], list[list[float]]]:
-        M = [0 * lens.Layers_count for i in range(STEPS)]
-        Lm0=[0 * lens.Layers_count for i in range(STEPS)]
-        Lm1=[0 * lens.Layers_count for i in range(STEPS)]
-        Lm2=[0 * lens.Layers_count for i in range(STEPS)]
-        pii = [[0] * ((2*STEPS+1)) for i in range(STEPS+1)]
-        tay = [[0] * ((2*STEPS+1)) for i in range(STEPS+1)]
-        counter=0
-
-        for i in range(lens.Accuracy):
-            counter = counter + 1
-            M = scipy.special.lpmv(0, counter, self.Cos_Teta)
-            Lm0 = M
-            M = scipy.special.lpmv(1, counter, self.Cos_Teta)
-            Lm1 = M
-
-            if counter<2:
-                Lm2 = 0
-            else:
-                M = scipy.special.lpmv(2, counter, self.Cos_Teta)
-                Lm2 = M
-
-            for z in range(len(self.Teta)):
-                if (self.Teta[z] > 0) & (self.Teta[z] < math.pi):
-                    pii[i][z] = ((1)*Lm1[z])/(math.sin(self.Teta[z]))
-                else:
-                    if (self.Teta[z] > math.pi) & (self.Teta[z] < 2*math.pi):
-                        pii[i][z] = ((-1)*Lm1[z])/(math.sin(self.Teta[z]))
-
-            for z in range(len(self.Teta)):
-                if counter<2:
-                    tay[i][z] = (1/2)*(-counter*(counter+1)*Lm0[z])
-                else:
-                    tay[i][z] = (1/2)*(Lm2[z]-counter*(counter+1)*Lm0[z])
-                    
-        return pii, tay
-    
-    def __get_EP_teta(self, lens: Lens) -> tuple[list[list[float]], list[list[float]]]:
-        E_teta= [[0] * (len(self.Teta)) for i in range(lens.Accuracy)]
-        P_teta= [[0] * (len(self.Teta)) for i in range(lens.Accuracy)]
-        y=0
-
-        for z in range(len(self.Teta)):
-            for p in range(lens.Accuracy):
-                y=p+1
-                E_teta[p][z]=((((2*y+1)/(y*(y+1)))*((-1)**y))*(self.Tay[p][z]*self.Mn[p]-self.Pii[p][z]*self.Nn[p]))
-
-            for p in range(lens.Accuracy):
-                y=p+1
-                P_teta[0][z]=(P_teta[0][z]+E_teta[p][z])
-                
-            for p in range(lens.Accuracy):
-                P_teta[0][z]=abs(P_teta[0][z])
-            
-        return E_teta, P_teta
-    
-    def __get_Tetay(self, lens: Lens) -> list[float]:
-        tetay = [0 * lens.Layers_count for i in range(STEPS)]
-        for i in range(len(self.Teta)):
-            tetay[i] = self.Teta[i]*(STEPS/math.pi) 
-        tetay.reverse()
-        return tetay
-    
-    def __get_P_teta_max(self) -> float:
-        P_teta_max = 0
-        for i in range(len(self.Teta)):
-            if self.P_teta[0][i] > P_teta_max:
-                P_teta_max = self.P_teta[0][i]
-        return P_teta_max
-    
-    def __get_DN_NORM(self, lens: Lens) -> list[float]:
-        dn_norm = [0 * lens.Layers_count for i in range(len(self.Teta))]
-        for i in range(len(self.Teta)):
-            dn_norm[i] = 20*math.log10(self.P_teta[0][i]/self.P_teta_max)
-        return dn_norm
\ No newline at end of file
+
+    def __get_Teta(self, lens: Lens) -> np.ndarray:
+        return self.Grid.Teta
+
+    def __get_Cos_Teta(self, lens: Lens) -> np.ndarray:
+        return np.cos(self.Teta)
+
+    def __get_Pii_Tay(self, lens: Lens) -> tuple[np.ndarray, np.ndarray]:
+        return AngularBasis.get(lens.Accuracy, self.Teta)
+
+    @staticmethod
+    def order_weights(count: int) -> np.ndarray:
+        """Множители порядков (2n+1) / (n(n+1)) * (-1)^n, (count,)"""
+        y = np.arange(1, count + 1, dtype=float)
+        return ((2*y + 1) / (y*(y + 1))) * (-1)**y
+
+    def __get_E_teta(self, lens: Lens) -> np.ndarray:
+        weight = self.order_weights(lens.Accuracy)[:, np.newaxis]
+        return weight * (self.Tay * self.Mn[:, np.newaxis] - self.Pii * self.Nn[:, np.newaxis])
+
+    def __get_Orders(self, lens: Lens) -> int:
+        if self.Tolerance is None:
+            return lens.Accuracy
+        # |pi_n|, |tau_n| <= n(n+1)/2, поэтому вклад порядка n в поле
+        # не больше (2n+1)/2 * (|Mn| + |Nn|)
+        y = np.arange(1, lens.Accuracy + 1)
+        bound = (2*y + 1) / 2 * (np.abs(self.Mn) + np.abs(self.Nn))
+        significant = np.flatnonzero(bound > self.Tolerance * np.nanmax(bound))
+        return int(significant[-1]) + 1 if significant.size else lens.Accuracy
+
+    def __get_P_planes(self, lens: Lens) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        orders = self.Orders
+        weight = self.order_weights(orders)
+        mn, nn = weight * self.Mn[:orders], -weight * self.Nn[:orders]
+        # Действительные и мнимые части Mn и -Nn строками: сумма по блоку
+        # порядков - два произведения (4, block) @ (block, angles). Плоскость E -
+        # Tay*Mn - Pii*Nn, плоскость H - Pii*Mn - Tay*Nn, поэтому обе
+        # собираются из одних и тех же произведений
+        coef = np.ascontiguousarray([mn.real, mn.imag, nn.real, nn.imag])
+
+        if orders * self.Teta.size > BASIS_MAX_ELEMENTS:
+            blocks = AngularBasis.chunks(orders, self.Teta, SUMMATION_CHUNK)
+        elif self.Progress is None:
+            blocks = [(0, *AngularBasis.get(orders, self.Teta))]
+        else:
+            pii, tay = AngularBasis.get(orders, self.Teta)
+            blocks = [(start, pii[start:start + SUMMATION_CHUNK], tay[start:start + SUMMATION_CHUNK])
+                      for start in range(0, orders, SUMMATION_CHUNK)]
+
+        total_tay = np.zeros((4, self.Teta.size))
+        total_pii = np.zeros_like(total_tay)
+        part = np.empty_like(total_tay)
+        for start, pii, tay in blocks:
+            end = start + len(pii)
+            total_tay += np.matmul(coef[:, start:end], tay, out=part)
+            total_pii += np.matmul(coef[:, start:end], pii, out=part)
+            if self.Progress is not None:
+                self.__progress = (end, orders)
+                self.Progress(end, orders)
+        e_plane = (total_tay[0] + total_pii[2]) + 1j * (total_tay[1] + total_pii[3])
+        h_plane = (total_pii[0] + total_tay[2]) + 1j * (total_pii[1] + total_tay[3])
+        # Кроссполяризация (третье определение Людвига) максимальна в
+        # диагональной плоскости phi = 45°: |S2 - S1| / 2
+        return np.abs(e_plane), np.abs(h_plane), np.abs(e_plane + h_plane) / 2
+
+    def __get_Tetay(self, lens: Lens) -> np.ndarray:
+        # Зеркальное отражение сетки в масштабе STEPS/pi исходной реализации
+        return (self.Teta[0] + self.Teta[-1] - self.Teta) * (STEPS / math.pi)
+
+    def __get_P_teta_max(self, lens: Lens) -> float:
+        return float(max(self.P_teta.max(), 0))
+
+    def __get_DN_NORM(self, lens: Lens) -> np.ndarray:
+        return 20 * np.log10(self.P_teta / self.P_teta_max)
+
+    def __get_DN_NORM_H(self, lens: Lens) -> np.ndarray:
+        return 20 * np.log10(self.P_phi / self.P_teta_max)
+
+    def __get_DN_NORM_CROSS(self, lens: Lens) -> np.ndarray:
+        with np.errstate(divide="ignore"):
+            return 20 * np.log10(self.P_cross / self.P_teta_max)
+
+    Alfa = _stage(__get_Alpha, "Alfa", inputs=("dielectric_constants",))
+    Beta = _stage(__get_Beta, "Beta", inputs=("magnetic_permeabilities",))
+    Etta = _stage(__get_Etta, "Etta", inputs=("dielectric_constants", "magnetic_permeabilities"))
+    K = _stage(__get_K, "K", depends=("Etta",), inputs=("radius", "norm_radii", "layers_count"))
+    Riccati = _stage(__get_Riccati, "Riccati", depends=("K",), inputs=("radius", "accuracy"))
+    J = _stage(__get_J, "J", depends=("Riccati", "K"))
+    Jder = _stage(__get_Jder, "Jder", depends=("Riccati", "K"))
+    N = _stage(__get_N, "N", depends=("Riccati", "K"))
+    Nder = _stage(__get_Nder, "Nder", depends=("Riccati", "K"))
+    C = _stage(__get_C, "C", depends=("Riccati", "K"))
+    Cder = _stage(__get_Cder, "Cder", depends=("Riccati", "K"))
+    S = _stage(__get_S, "S", depends=("Riccati", "K"))
+    Sder = _stage(__get_Sder, "Sder", depends=("Riccati", "K"))
+    Z, Y = _stage(__get_ZY, "Z", "Y",
+                  depends=("Alfa", "K", "Riccati"),
+                  inputs=("dielectric_constants", "accuracy", "layers_count"))
+    MJ, MJder, MH, MHder = _stage(__get_mLists, "MJ", "MJder", "MH", "MHder",
+                                  depends=("Riccati",), inputs=("radius",))
+    Mn, Nn = _stage(__get_Mn_Nn, "Mn", "Nn", depends=("Z", "Riccati"), inputs=("radius", "layers_count"))
+    Teta = _stage(__get_Teta, "Teta", inputs=("grid",))
+    Cos_Teta = _stage(__get_Cos_Teta, "Cos_Teta", depends=("Teta",))
+    Pii, Tay = _stage(__get_Pii_Tay, "Pii", "Tay", depends=("Teta",), inputs=("accuracy",))
+    E_teta = _stage(__get_E_teta, "E_teta", depends=("Pii", "Mn"), inputs=("accuracy",), diagnostic=True)
+    Orders = _stage(__get_Orders, "Orders", depends=("Mn",), inputs=("accuracy", "tolerance"))
+    P_teta, P_phi, P_cross = _stage(__get_P_planes, "P_teta", "P_phi", "P_cross",
+                                    depends=("Teta", "Mn", "Orders"), inputs=("accuracy",))
+    Tetay = _stage(__get_Tetay, "Tetay", depends=("Teta",))
+    P_teta_max = _stage(__get_P_teta_max, "P_teta_max", depends=("P_teta",))
+    DN_NORM = _stage(__get_DN_NORM, "DN_NORM", depends=("P_teta", "P_teta_max"))
+    DN_NORM_H = _stage(__get_DN_NORM_H, "DN_NORM_H", depends=("P_phi", "P_teta_max"))
+    DN_NORM_CROSS = _stage(__get_DN_NORM_CROSS, "DN_NORM_CROSS", depends=("P_cross", "P_teta_max"))
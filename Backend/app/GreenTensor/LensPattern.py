@@ -0,0 +1,86 @@
+import numpy as np
+from .LensCalculator import LensCalculator
+from .PatternMetrics import PatternMetrics
+
+
+class LensPattern:
+    """
+    Класс для представления рассчитанной диаграммы направленности
+
+    Хранит только итоговые массивы калькулятора, поэтому его можно держать
+    в кэше и строить по нему графики без повторного расчёта. Массивы
+    доступны только для чтения. С copy=False массивы, уже доступные только
+    для чтения (например, отображённые в память из хранилища результатов),
+    принимаются без копирования.
+
+    Атрибуты
+    --------
+    Teta : np.ndarray
+        Углы наблюдения в радианах.
+    Tetay : np.ndarray
+        Углы наблюдения, нормализованные относительно количества шагов расчета.
+    DN_NORM : np.ndarray
+        Нормированное значение диаграммы направленности (плоскость E).
+    DN_NORM_H : np.ndarray
+        Диаграмма в плоскости H, нормированная на P_teta_max.
+    DN_NORM_CROSS : np.ndarray
+        Диаграмма кроссполяризации, нормированная на P_teta_max.
+    Mn : np.ndarray
+        Коэффициенты Mn ряда, (Accuracy,).
+    Nn : np.ndarray
+        Коэффициенты Nn ряда, (Accuracy,).
+    P_teta_max : float
+        Максимальное значение поляризационного поля.
+    Orders : int
+        Число порядков ряда, использованных в диаграмме.
+    """
+    def __init__(
+        self,
+        teta: np.ndarray,
+        tetay: np.ndarray,
+        dn_norm: np.ndarray,
+        dn_norm_h: np.ndarray,
+        dn_norm_cross: np.ndarray,
+        mn: np.ndarray,
+        nn: np.ndarray,
+        p_teta_max: float,
+        orders: int | None = None,
+        copy: bool = True
+    ):
+        self.Teta: np.ndarray = self.__frozen(teta, copy)
+        self.Tetay: np.ndarray = self.__frozen(tetay, copy)
+        self.DN_NORM: np.ndarray = self.__frozen(dn_norm, copy)
+        self.DN_NORM_H: np.ndarray = self.__frozen(dn_norm_h, copy)
+        self.DN_NORM_CROSS: np.ndarray = self.__frozen(dn_norm_cross, copy)
+        self.Mn: np.ndarray = self.__frozen(mn, copy)
+        self.Nn: np.ndarray = self.__frozen(nn, copy)
+        self.P_teta_max: float = float(p_teta_max)
+        self.Orders: int = int(orders) if orders is not None else self.Mn.size
+
+    @staticmethod
+    def __frozen(values: np.ndarray, copy: bool) -> np.ndarray:
+        values = np.asarray(values)
+        if copy or values.flags.writeable:
+            values = values.copy()
+        values.setflags(write=False)
+        return values
+
+    @classmethod
+    def from_calculator(cls, lensCalc: LensCalculator) -> "LensPattern":
+        """
+        Извлечение диаграммы из калькулятора с выполненными расчётами
+
+        :param lensCalc: Калькулятор линзы
+        """
+        return cls(lensCalc.Teta, lensCalc.Tetay, lensCalc.DN_NORM, lensCalc.DN_NORM_H, lensCalc.DN_NORM_CROSS,
+                   lensCalc.Mn, lensCalc.Nn, lensCalc.P_teta_max, lensCalc.Orders)
+
+    @property
+    def nbytes(self) -> int:
+        """Объём памяти, занимаемый массивами"""
+        return sum(a.nbytes for a in (self.Teta, self.Tetay, self.DN_NORM, self.DN_NORM_H, self.DN_NORM_CROSS,
+                                      self.Mn, self.Nn))
+
+    def metrics(self) -> PatternMetrics:
+        """Характеристики диаграммы: максимум, ширина лепестка, боковые лепестки"""
+        return PatternMetrics(self.Teta, self.DN_NORM, self.P_teta_max)
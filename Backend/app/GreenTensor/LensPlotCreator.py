@@ -1,25 +1,272 @@
-import matplotlib.pyplot as plt
+from io import BytesIO
 import math
-from typing import Optional
+import threading
+import numpy as np
+from typing import TYPE_CHECKING, Optional, Sequence
 from .LensCalculator import LensCalculator
+from .LensPattern import LensPattern
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
 class LensPlotCreator:
-    """Класс для создания графиков"""
+    """
+    Класс для создания графиков
+
+    Используется объектный API matplotlib (Figure + холст Agg) без
+    глобального состояния pyplot, поэтому графики можно строить
+    одновременно из нескольких потоков. Для рендеринга графиков размера по
+    умолчанию у каждого потока есть свои заготовки фигур: при повторном
+    вызове обновляются только данные линии, оси и легенда не создаются заново.
+
+    matplotlib импортируется при построении первой фигуры, а не при импорте
+    модуля: процессу API он не нужен, а воркеры загружают его заранее (см.
+    pipeline.warm_up).
+
+    Графики выдаются в PNG, WebP или SVG (FORMATS). Для векторного вывода
+    кривую можно проредить до max_points точек (см. decimate()). С planes
+    на графики накладываются диаграммы в плоскостях E и H и
+    кроссполяризация (PLANES), ограниченные снизу уровнем PLANES_FLOOR.
+    """
+    LINE_SIZE: tuple[float, float] = (6.4, 4.8)
+    POLAR_SIZE: tuple[float, float] = (4, 4)
+    DPI: int = 100
+    # Формат -> (расширение файла, MIME-тип)
+    FORMATS: dict[str, tuple[str, str]] = {
+        "png": ("png", "image/png"),
+        "webp": ("webp", "image/webp"),
+        "svg": ("svg", "image/svg+xml"),
+    }
+    # Накладываемые диаграммы: атрибут диаграммы, подпись, цвет и стиль линии
+    PLANES: tuple[tuple[str, str, str, str], ...] = (
+        ("DN_NORM", "E-plane", "blue", "-"),
+        ("DN_NORM_H", "H-plane", "red", "--"),
+        ("DN_NORM_CROSS", "Cross-pol", "green", ":"),
+    )
+    PLANES_FLOOR: float = -60
+    __templates = threading.local()
+
+    @staticmethod
+    def __figure(size: tuple[float, float]) -> "Figure":
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(figsize=size)
+        FigureCanvasAgg(fig)
+        return fig
+
+    @staticmethod
+    def __line_figure(size: tuple[float, float], planes: bool = False) -> "Figure":
+        fig_line = LensPlotCreator.__figure(size)
+        ax = fig_line.add_subplot()
+        if planes:
+            for _, label, color, style in LensPlotCreator.PLANES:
+                ax.plot([], [], color=color, linestyle=style, linewidth=1.5, label=label)
+        else:
+            ax.plot([], [], color='blue', linestyle='-', linewidth=2, label='Green_tensor')
+        ax.grid(True)
+        ax.legend()
+        return fig_line
+
+    @staticmethod
+    def __polar_figure(size: tuple[float, float], planes: bool = False) -> "Figure":
+        fig_polar = LensPlotCreator.__figure(size)
+        ax = fig_polar.add_subplot(projection='polar')
+        if planes:
+            for _, label, color, style in LensPlotCreator.PLANES:
+                ax.plot([], [], color=color, linestyle=style, linewidth=1, label=label)
+        else:
+            ax.plot([], [], color='blue', linestyle='-', linewidth=1, label='Green_tensor')
+        ax.legend(loc='upper right')
+        return fig_polar
+
+    @staticmethod
+    def __set_data(fig: "Figure", *curves: tuple[np.ndarray, np.ndarray]) -> "Figure":
+        ax = fig.axes[0]
+        for line, (x, y) in zip(ax.lines, curves):
+            line.set_data(x, y)
+        ax.relim()
+        ax.autoscale_view()
+        return fig
+
+    @staticmethod
+    def __curves(lensCalc: LensCalculator | LensPattern, kind: str, planes: bool) \
+            -> list[tuple[np.ndarray, np.ndarray]]:
+        """Кривые графика kind: одна диаграмма DN_NORM или, с planes, все PLANES"""
+        x = lensCalc.Tetay if kind == "line" else np.asarray(lensCalc.Teta) - math.pi
+        if not planes:
+            return [(x, lensCalc.DN_NORM)]
+        return [(x, np.maximum(getattr(lensCalc, name), LensPlotCreator.PLANES_FLOOR))
+                for name, _, _, _ in LensPlotCreator.PLANES]
 
     @staticmethod
-    def create_plots(lensCalc: LensCalculator) -> tuple[plt.Figure, Optional[plt.Figure]]:
+    def create_plots(
+        lensCalc: LensCalculator | LensPattern,
+        plot_type: str = "both"
+    ) -> tuple[Optional["Figure"], Optional["Figure"]]:
         """
         Создание графиков для заданных расчётов
-        
-        :param lensCalc: Rалькулятор линзы с выполненными расчётами
-        """
-        fig_line = plt.figure()
-        plt.plot(lensCalc.Tetay, lensCalc.DN_NORM, color='blue', linestyle='-', linewidth=2, label='Green_tensor')
-        plt.grid(True)
-        plt.legend()
-        
-        fig_polar, ax = plt.subplots(figsize=(4, 4), subplot_kw={'projection': 'polar'})
-        teta_corrected = [angle - math.pi for angle in lensCalc.Teta]
-        ax.plot(teta_corrected, lensCalc.DN_NORM, color='blue', linestyle='-', linewidth=1, label='Green_tensor')
-        ax.legend(loc='upper right')
-        return fig_line, fig_polar
\ No newline at end of file
+
+        :param lensCalc: Калькулятор линзы с выполненными расчётами или готовая диаграмма
+        :param plot_type: Какие графики строить - "line", "polar" или "both"
+        :return: Линейный и полярный графики, None для не запрошенных
+        """
+        fig_line = fig_polar = None
+        if plot_type in ["line", "both"]:
+            fig_line = LensPlotCreator.__set_data(
+                LensPlotCreator.__line_figure(LensPlotCreator.LINE_SIZE),
+                *LensPlotCreator.__curves(lensCalc, "line", False))
+        if plot_type in ["polar", "both"]:
+            fig_polar = LensPlotCreator.__set_data(
+                LensPlotCreator.__polar_figure(LensPlotCreator.POLAR_SIZE),
+                *LensPlotCreator.__curves(lensCalc, "polar", False))
+        return fig_line, fig_polar
+
+    @staticmethod
+    def __template(kind: str, size: tuple[float, float], planes: bool = False) -> "Figure":
+        """
+        Заготовка фигуры текущего потока
+
+        Заготовки хранятся только для размеров по умолчанию (LINE_SIZE,
+        POLAR_SIZE), иначе каждый новый размер из запроса оставлял бы в
+        воркере ещё одну фигуру. Для других размеров строится новая фигура.
+        """
+        create = LensPlotCreator.__line_figure if kind == "line" else LensPlotCreator.__polar_figure
+        if tuple(size) not in (LensPlotCreator.LINE_SIZE, LensPlotCreator.POLAR_SIZE):
+            return create(size, planes)
+        templates = getattr(LensPlotCreator.__templates, "figures", None)
+        if templates is None:
+            templates = LensPlotCreator.__templates.figures = {}
+        key = (kind, tuple(size), planes)
+        if key not in templates:
+            templates[key] = create(size, planes)
+        return templates[key]
+
+    @staticmethod
+    def decimate(x: np.ndarray, y: np.ndarray, max_points: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Прореживание кривой до max_points точек с сохранением экстремумов
+
+        Кривая делится на max_points // 2 равных участков, из каждого
+        остаются точки минимума и максимума y в исходном порядке, поэтому
+        главный лепесток и глубокие нули диаграммы не теряются. Первое
+        неконечное значение участка (нулевое поле) сохраняется как разрыв линии.
+
+        :return: Прореженные x и y; кривая не длиннее max_points - без изменений
+        """
+        x = np.asarray(x)
+        y = np.asarray(y)
+        if y.size <= max_points:
+            return x, y
+        edges = np.linspace(0, y.size, max(max_points // 2, 1) + 1).astype(int)
+        keep = []
+        for start, stop in zip(edges[:-1], edges[1:]):
+            part = y[start:stop]
+            finite = np.isfinite(part)
+            if not finite.all():
+                keep.append(start + int(np.argmin(finite)))
+            if finite.any():
+                values = np.where(finite, part, np.nan)
+                keep += [start + int(np.nanargmin(values)), start + int(np.nanargmax(values))]
+        keep = np.unique(keep)
+        return x[keep], y[keep]
+
+    @staticmethod
+    def render(
+        lensCalc: LensCalculator | LensPattern,
+        plot_type: str = "both",
+        size: Optional[tuple[float, float]] = None,
+        dpi: Optional[int] = None,
+        image_format: str = "png",
+        max_points: Optional[int] = None,
+        planes: bool = False
+    ) -> dict[str, bytes]:
+        """
+        Рендеринг запрошенных графиков на заготовках фигур
+
+        :param lensCalc: Калькулятор линзы с выполненными расчётами или готовая диаграмма
+        :param plot_type: Какие графики строить - "line", "polar" или "both"
+        :param size: Размер фигуры в дюймах, по умолчанию LINE_SIZE / POLAR_SIZE
+        :param dpi: Разрешение, по умолчанию DPI
+        :param image_format: Формат из FORMATS
+        :param max_points: Прореживание кривой до этого числа точек, None - все точки
+        :param planes: Наложить диаграммы в плоскостях E, H и кроссполяризацию
+        :return: Изображения по видам графиков ("line", "polar")
+        """
+        if image_format not in LensPlotCreator.FORMATS:
+            raise ValueError(f"Неизвестный формат изображения: {image_format}")
+        kinds = [kind for kind in ("line", "polar") if plot_type in (kind, "both")]
+
+        images = {}
+        for kind in kinds:
+            curves = LensPlotCreator.__curves(lensCalc, kind, planes)
+            if max_points is not None:
+                curves = [LensPlotCreator.decimate(x, y, max_points) for x, y in curves]
+            default_size = LensPlotCreator.LINE_SIZE if kind == "line" else LensPlotCreator.POLAR_SIZE
+            fig = LensPlotCreator.__template(kind, size or default_size, planes)
+            LensPlotCreator.__set_data(fig, *curves)
+            images[kind] = LensPlotCreator.__save(fig, dpi, image_format)
+        return images
+
+    @staticmethod
+    def __save(fig: "Figure", dpi: Optional[int], image_format: str) -> bytes:
+        buffer = BytesIO()
+        fig.savefig(buffer, format=image_format, dpi=dpi or LensPlotCreator.DPI, bbox_inches='tight')
+        return buffer.getvalue()
+
+    @staticmethod
+    def create_sweep_plot(tetay: np.ndarray, dn_norm: np.ndarray, labels: Sequence[str]) -> "Figure":
+        """
+        Наложение диаграмм вариантов параметрического расчёта
+
+        :param tetay: Общая ось углов Tetay
+        :param dn_norm: Диаграммы вариантов, (variants, angles)
+        :param labels: Подписи вариантов
+        """
+        fig_line = LensPlotCreator.__figure(LensPlotCreator.LINE_SIZE)
+        ax = fig_line.add_subplot()
+        for curve, label in zip(dn_norm, labels):
+            ax.plot(tetay, curve, linestyle='-', linewidth=1, label=label)
+        ax.grid(True)
+        # Легенда для сотен кривых нечитаема
+        if len(labels) <= 10:
+            ax.legend()
+        return fig_line
+
+    @staticmethod
+    def render_field(
+        field: np.ndarray,
+        kind: str,
+        extent: float,
+        bounds: Sequence[float],
+        dpi: Optional[int] = None,
+        image_format: str = "png"
+    ) -> bytes:
+        """
+        Тепловая карта модуля ближнего поля
+
+        :param field: |E| на сетке NearField.grid(kind, extent, size), (size, size)
+        :param kind: Вид сетки, "cartesian" или "polar"
+        :param extent: Размер области в радиусах линзы
+        :param bounds: Нормированные радиусы слоев, рисуются контурами
+        :param dpi: Разрешение, по умолчанию DPI
+        :param image_format: Формат из FORMATS
+        """
+        if image_format not in LensPlotCreator.FORMATS:
+            raise ValueError(f"Неизвестный формат изображения: {image_format}")
+        fig = LensPlotCreator.__figure(LensPlotCreator.LINE_SIZE)
+        ax = fig.add_subplot()
+        if kind == "cartesian":
+            image = ax.imshow(field, origin="lower", extent=(-extent, extent, -extent, extent), cmap="inferno")
+            angles = np.linspace(0, 2 * math.pi, 361)
+            for radius in bounds:
+                ax.plot(radius * np.sin(angles), radius * np.cos(angles), color="white", linewidth=0.5)
+            ax.set_xlabel("x / R")
+            ax.set_ylabel("z / R")
+        else:
+            image = ax.imshow(field, origin="lower", extent=(0, 180, 0, extent), aspect="auto", cmap="inferno")
+            for radius in bounds:
+                ax.axhline(radius, color="white", linewidth=0.5)
+            ax.set_xlabel("teta, °")
+            ax.set_ylabel("r / R")
+        fig.colorbar(image, ax=ax, label="|E|")
+        return LensPlotCreator.__save(fig, dpi, image_format)
@@ -0,0 +1,214 @@
+from .LensCalculator import LensCalculator
+from .RiccatiBessel import RiccatiBesselTable
+from .AngularBasis import AngularBasis
+from .Constants import FIELD_TILE_BYTES
+import numpy as np
+import math
+
+
+class NearField:
+    """
+    Класс для расчёта ближнего поля линзы в плоскости E
+
+    Поле считается по тем же коэффициентам, что и диаграмма: Mn/Nn снаружи
+    линзы и импедансы Z/Y на границах слоев внутри неё. Mn соответствует
+    потенциалу TM (a_n = conj(Mn)), Nn - потенциалу TE (b_n = conj(Nn)),
+    так что на большом расстоянии |E_teta| * k*r рассеянного поля
+    совпадает с P_teta(pi - teta) калькулятора.
+
+    Радиальная функция слоя h - решение с u'/u = Z[:, h-1] (Y[:, h-1]) на
+    внутренней границе b, то есть комбинация psi и chi, для которой C, Cder,
+    S, Sder задают значения на внешней границе:
+        u_h(k) = A_h * (psi(k) (chi'(b) - z chi(b)) - chi(k) (psi'(b) - z psi(b))),
+    в ядре u_0 = A_0 * psi(k), снаружи u = psi - c * xi. Амплитуды A_h
+    подбираются из непрерывности u на границах слоев. Все функции
+    хранятся логарифмами (см. RiccatiBesselTable.log_psi), поэтому высокие
+    порядки у центра линзы и у её поверхности не переполняются.
+
+    Поле снаружи линзы - падающая плоская волна точно плюс ряд рассеянного
+    поля; внутри - ряд полного поля. Ряд усекается на Accuracy порядков
+    линзы, так что точность внутри падает для слоев с Etta > 2.
+
+    Точки задаются расстоянием rho от центра в радиусах линзы и углом teta
+    от направления падения. Расчёт идёт по частям (см. rows_per_tile):
+    таблица Риккати-Бесселя и угловой базис строятся на точки части, и
+    память одной части не больше FIELD_TILE_BYTES. Объект небольшой и
+    сериализуется, поэтому части можно считать в разных процессах.
+
+    Атрибуты
+    --------
+    Radius : float
+        Радиус линзы в единицах 1/k.
+    Orders : int
+        Число порядков ряда (Accuracy линзы).
+    Bounds : np.ndarray
+        Нормированные внешние радиусы слоев, (Layers_count,).
+    Etta : np.ndarray
+        Волновые сопротивления слоев, (Layers_count,).
+    Coefficients : np.ndarray
+        Коэффициенты рассеяния a_n и b_n, (2, Orders).
+    """
+    # Оценка памяти временных массивов на пару (порядок, точка), байт
+    BYTES_PER_VALUE: int = 512
+    # Ближе к центру точки сдвигаются на это расстояние, в радиусах линзы
+    MIN_RHO: float = 1e-6
+
+    def __init__(self, lensCalc: LensCalculator):
+        """
+        Подготовка коэффициентов поля по посчитанному калькулятору
+
+        :param lensCalc: Калькулятор линзы
+        """
+        k = lensCalc.K
+        layers = k.shape[0]
+        self.Etta: np.ndarray = np.array(lensCalc.Etta, dtype=float)
+        self.Radius: float = float(k[-1, -1] / self.Etta[-1])
+        self.Bounds: np.ndarray = np.diag(k) / self.Etta / self.Radius
+        self.Orders: int = lensCalc.Z.shape[0]
+        self.Coefficients: np.ndarray = np.stack((np.conj(lensCalc.Mn), np.conj(lensCalc.Nn)))
+
+        # Данные внутренних границ слоев 1..Layers_count-1 (аргумент K[h-1, h])
+        rb = lensCalc.Riccati
+        idx = np.arange(layers - 1)
+        inner = rb.columns(k[idx, idx + 1])
+        self.__impedances = np.stack((lensCalc.Z, lensCalc.Y))[:, :, :-1]
+        self.__dpsi = rb.Psi_logder[:, inner]
+        self.__dchi = rb.Chi_logder[:, inner]
+        self.__log_ratio = self.__complex_log_ratio(rb, inner)
+        self.__log_chi = self.__log_ratio + rb.log_psi(inner)
+
+        # ln u_h на внешней границе каждого слоя при единичной амплитуде
+        # и ln u снаружи на поверхности линзы
+        log_outer = np.empty((2, self.Orders, layers), dtype=complex)
+        log_outer[:, :, 0] = rb.log_psi(rb.columns(k[0, 0]))
+        for h in range(1, layers):
+            log_outer[:, :, h] = self.__layer(h, rb, rb.columns(k[h:h+1, h]))[0][:, :, 0]
+        log_surface = self.__outside(rb, rb.columns([self.Radius]), 1.0)[0][:, :, 0]
+        # ln A_h = ln u(Radius) - сумма ln u_j(внешняя граница) по слоям j >= h
+        tail = np.cumsum(log_outer[:, :, ::-1], axis=2)[:, :, ::-1]
+        self.__log_amplitudes = log_surface[:, :, np.newaxis] - tail
+
+    @staticmethod
+    def __complex_log_ratio(rb: RiccatiBesselTable, cols) -> np.ndarray:
+        """ln(chi/psi) с учётом знака, (Orders, len(cols))"""
+        return rb.Log_ratio[:, cols] + 1j * math.pi * (rb.Ratio_sign[:, cols] < 0)
+
+    def __layer(self, h: int, rb: RiccatiBesselTable, cols: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """ln u_h и u_h'/u_h слоя h при единичной амплитуде, (2, Orders, len(cols))"""
+        log_psi = rb.log_psi(cols)
+        dpsi = rb.Psi_logder[:, cols]
+        if h == 0:
+            return np.broadcast_to(log_psi, (2, *log_psi.shape)), np.broadcast_to(dpsi, (2, *dpsi.shape))
+
+        # u_h = psi(k) chi(b) * ((D_chi(b) - z) - q (D_psi(b) - z)), q = (chi/psi)(k) / (chi/psi)(b);
+        # множители делятся на max(1, |q|), как в RiccatiBesselTable.scaled_cs
+        z = self.__impedances[:, :, h-1, np.newaxis]
+        log_q = self.__complex_log_ratio(rb, cols) - self.__log_ratio[:, h-1, np.newaxis]
+        scale = np.maximum(log_q.real, 0)
+        w0 = np.exp(-scale)
+        w1 = np.exp(log_q - scale)
+        p = self.__dchi[:, h-1, np.newaxis] - z
+        q = self.__dpsi[:, h-1, np.newaxis] - z
+        value = w0 * p - w1 * q
+        derivative = w0 * dpsi * p - w1 * rb.Chi_logder[:, cols] * q
+        with np.errstate(divide="ignore"):
+            log_u = log_psi + self.__log_chi[:, h-1, np.newaxis] + scale + np.log(value)
+        return log_u, derivative / value
+
+    def __outside(self, rb: RiccatiBesselTable, cols: np.ndarray, incident: float) \
+            -> tuple[np.ndarray, np.ndarray]:
+        """ln u и u'/u снаружи линзы, u = incident*psi - c*xi, (2, Orders, len(cols))"""
+        # u = psi * ((incident - c) - i c r), r = chi/psi, с делением на max(1, |r|)
+        c = self.Coefficients[:, :, np.newaxis]
+        log_r = self.__complex_log_ratio(rb, cols)
+        scale = np.maximum(log_r.real, 0)
+        w0 = np.exp(-scale)
+        w1 = np.exp(log_r - scale)
+        value = (incident - c) * w0 - 1j * c * w1
+        derivative = (incident - c) * w0 * rb.Psi_logder[:, cols] - 1j * c * w1 * rb.Chi_logder[:, cols]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_u = rb.log_psi(cols) + scale + np.log(value)
+            return log_u, np.nan_to_num(derivative / value)
+
+    def evaluate(self, rho: np.ndarray, teta: np.ndarray) -> np.ndarray:
+        """
+        Модуль электрического поля |E| в точках плоскости E
+
+        Поле нормировано на амплитуду падающей волны. Размер памяти
+        расчёта пропорционален Orders * rho.size, см. rows_per_tile.
+
+        :param rho: Расстояния от центра линзы в радиусах линзы
+        :param teta: Углы от направления падения волны в радианах
+        :return: |E| той же формы, что rho
+        """
+        rho = np.asarray(rho, dtype=float)
+        shape = rho.shape
+        rho = np.maximum(rho.ravel(), self.MIN_RHO)
+        teta = np.broadcast_to(np.asarray(teta, dtype=float), shape).ravel()
+        x = rho * self.Radius
+
+        # Слой каждой точки; Layers_count - снаружи линзы
+        layers = self.Bounds.size
+        region = np.minimum(np.searchsorted(self.Bounds, rho), layers)
+        index = np.append(self.Etta, 1.0)[region]
+        args = x * index
+        rb = RiccatiBesselTable(self.Orders, args)
+        cols = rb.columns(args)
+
+        u = np.empty((2, self.Orders, rho.size), dtype=complex)
+        du = np.empty((self.Orders, rho.size), dtype=complex)
+        for h in np.unique(region):
+            points = np.flatnonzero(region == h)
+            if h == layers:
+                log_u, dlog = self.__outside(rb, cols[points], 0.0)
+            else:
+                log_u, dlog = self.__layer(h, rb, cols[points])
+                log_u = log_u + self.__log_amplitudes[:, :, h, np.newaxis]
+            u[:, :, points] = np.exp(log_u)
+            du[:, points] = dlog[0] * u[0][:, points]
+
+        # E_teta = sum E_n (pi_n u_b - i tau_n u_a' / m) / x, E_r = -i sum E_n n(n+1) sin pi_n u_a / (m x)^2,
+        # E_n = i^n (2n+1) / (n(n+1)), pi_n = -Pii, tau_n = -Tay, m = Etta слоя; при таком
+        # масштабе правило импедансов Z даёт непрерывные E_teta и eps*E_r на границах слоев
+        du /= index
+        n = np.arange(1, self.Orders + 1)
+        weight = (1j ** (n % 4) * (2*n + 1) / (n * (n + 1)))[:, np.newaxis]
+        pii, tay = next(AngularBasis.chunks(self.Orders, teta, self.Orders))[1:]
+        e_teta = -np.sum(weight * (pii * u[1] - 1j * tay * du), axis=0) / x
+        e_r = 1j * np.sin(teta) * np.sum((weight * n[:, np.newaxis] * (n[:, np.newaxis] + 1)) * pii * u[0], axis=0) / (x * index)**2
+
+        outside = region == layers
+        wave = np.exp(1j * x[outside] * np.cos(teta[outside]))
+        e_teta[outside] += np.cos(teta[outside]) * wave
+        e_r[outside] += np.sin(teta[outside]) * wave
+        return np.hypot(np.abs(e_teta), np.abs(e_r)).reshape(shape)
+
+    def rows_per_tile(self, columns: int) -> int:
+        """Число строк сетки шириной columns в одной части расчёта"""
+        return max(1, FIELD_TILE_BYTES // (self.BYTES_PER_VALUE * self.Orders * columns))
+
+    @staticmethod
+    def grid(kind: str, extent: float, size: int, start: int = 0, stop: int | None = None) \
+            -> tuple[np.ndarray, np.ndarray]:
+        """
+        Точки сетки плоскости E, строки start..stop
+
+        "cartesian" - квадрат x, z от -extent до extent, строки - z по
+        возрастанию, столбцы - x; "polar" - строки rho от 0 до extent,
+        столбцы teta от 0 до pi.
+
+        :param kind: Вид сетки, "cartesian" или "polar"
+        :param extent: Размер области в радиусах линзы
+        :param size: Число точек по каждой оси
+        :return: rho и teta, (stop - start, size)
+        """
+        stop = size if stop is None else stop
+        axis = np.linspace(-extent, extent, size) if kind == "cartesian" else np.linspace(0, extent, size)
+        rows = axis[start:stop, np.newaxis]
+        if kind == "cartesian":
+            # Поле симметрично относительно оси z: в плоскости E cos(phi) = +-1
+            # меняет только знак компонент
+            return np.hypot(axis, rows), np.arctan2(np.abs(axis), rows)
+        if kind == "polar":
+            return np.repeat(rows, size, axis=1), np.broadcast_to(np.linspace(0, math.pi, size), (stop - start, size))
+        raise ValueError(f"Неизвестный вид сетки: {kind}")
@@ -0,0 +1,73 @@
+import math
+import numpy as np
+from typing import Optional
+
+
+class PatternMetrics:
+    """
+    Класс для расчёта характеристик диаграммы направленности
+
+    Атрибуты
+    --------
+    Peak_angle : float
+        Направление максимума диаграммы, градусы.
+    Peak_level : float
+        Уровень максимума 20*lg(P_teta_max), дБ.
+    Beamwidth : float
+        Ширина главного лепестка по уровню -3 дБ, градусы. Если уровень -3 дБ
+        не достигается в пределах сетки, ширина считается до её края.
+    Sidelobe_level : Optional[float]
+        Уровень первого бокового лепестка относительно максимума, дБ
+        (наибольший из левого и правого), None если лепестков на сетке нет.
+    """
+    def __init__(self, teta: np.ndarray, dn_norm: np.ndarray, p_teta_max: float):
+        """
+        Расчёт характеристик
+
+        :param teta: Углы наблюдения в радианах по возрастанию
+        :param dn_norm: Нормированная диаграмма направленности, дБ
+        :param p_teta_max: Максимальное значение поляризационного поля
+        """
+        degrees = np.asarray(teta) * (180/math.pi)
+        dn = np.nan_to_num(np.asarray(dn_norm, dtype=float), nan=-np.inf)
+        peak = int(np.argmax(dn))
+
+        self.Peak_angle: float = float(degrees[peak])
+        self.Peak_level: float = 20*math.log10(p_teta_max) if p_teta_max > 0 else -math.inf
+        self.Beamwidth: float = self.__crossing(degrees[peak:], dn[peak:]) \
+            - self.__crossing(degrees[peak::-1], dn[peak::-1])
+        sidelobes = [level for level in (self.__first_sidelobe(dn[peak:]), self.__first_sidelobe(dn[peak::-1]))
+                     if level is not None]
+        self.Sidelobe_level: Optional[float] = max(sidelobes) if sidelobes else None
+
+    @staticmethod
+    def __crossing(degrees: np.ndarray, dn: np.ndarray, level: float = -3) -> float:
+        """Угол первого пересечения уровня level при удалении от максимума"""
+        below = np.flatnonzero(dn < level)
+        if below.size == 0:
+            return float(degrees[-1])
+        k = below[0]
+        # Линейная интерполяция между соседними точками сетки
+        t = (dn[k-1] - level) / (dn[k-1] - dn[k]) if np.isfinite(dn[k]) else 1.0
+        return float(degrees[k-1] + t * (degrees[k] - degrees[k-1]))
+
+    @staticmethod
+    def __first_sidelobe(dn: np.ndarray) -> Optional[float]:
+        """Уровень первого локального максимума после первого нуля"""
+        diff = np.diff(dn)
+        rising = np.flatnonzero(diff > 0)
+        if rising.size == 0:
+            return None
+        null = rising[0]
+        falling = np.flatnonzero(diff[null:] < 0)
+        if falling.size == 0:
+            return None
+        return float(dn[null + falling[0]])
+
+    def to_dict(self) -> dict[str, Optional[float]]:
+        return {
+            "peak_angle": self.Peak_angle,
+            "peak_level": self.Peak_level,
+            "beamwidth": self.Beamwidth,
+            "sidelobe_level": self.Sidelobe_level
+        }
@@ -0,0 +1,281 @@
+import math
+import numpy as np
+from typing import Optional
+
+
+class RiccatiBesselTable:
+    """
+    Таблица функций Риккати-Бесселя для всех порядков и аргументов сразу
+
+    Функции psi_n(k) = sqrt(pi*k/2) * J_{n+1/2}(k) и
+    chi_n(k) = sqrt(pi*k/2) * Y_{n+1/2}(k) считаются рекурсиями по n сразу
+    для порядков 0..Orders+1 и всех различных аргументов (см. __values),
+    поэтому стоимость таблицы растёт с числом столбцов лишь как
+    векторная операция numpy и таблица может быть общей для набора линз.
+    Производные получаются из соседних порядков без повторных вызовов
+    специальных функций, xi_n = psi_n + i*chi_n.
+
+    При n, заметно больших аргумента, chi_n переполняется, а psi_n уходит в
+    ноль, поэтому для расчётов, где нужны только отношения функций, таблица
+    хранит и масштабно-независимые величины: логарифмические производные
+    psi_n'/psi_n (обратная рекурсия, устойчива при любых n) и chi_n'/chi_n
+    (прямая рекурсия для chi_n/chi_{n-1}), а также логарифм модуля и знак
+    отношения chi_n/psi_n. Они конечны там, где сами функции уже выходят за
+    пределы float64.
+
+    Атрибуты
+    --------
+    Orders : int
+        Число порядков n = 1..Orders.
+    Args : np.ndarray
+        Различные аргументы k в порядке возрастания, (M,).
+    Psi : np.ndarray
+        Значения psi_n(k), (Orders, M).
+    Psi_der : np.ndarray
+        Производные psi_n(k), (Orders, M).
+    Chi : np.ndarray
+        Значения chi_n(k), (Orders, M).
+    Chi_der : np.ndarray
+        Производные chi_n(k), (Orders, M).
+    Psi_logder : np.ndarray
+        Логарифмические производные psi_n'(k) / psi_n(k), (Orders, M).
+    Chi_logder : np.ndarray
+        Логарифмические производные chi_n'(k) / chi_n(k), (Orders, M).
+    Log_ratio : np.ndarray
+        ln|chi_n(k) / psi_n(k)|, (Orders, M).
+    Ratio_sign : np.ndarray
+        Знак chi_n(k) / psi_n(k), (Orders, M).
+    """
+    ARRAYS: tuple[str, ...] = ("Psi", "Psi_der", "Chi", "Chi_der", "Psi_logder", "Chi_logder", "Log_ratio", "Ratio_sign")
+
+    def __init__(self, orders: int, args: np.ndarray, reuse: Optional["RiccatiBesselTable"] = None):
+        """
+        Расчёт таблицы
+
+        :param orders: Число порядков n = 1..orders
+        :param args: Аргументы k, повторяющиеся значения считаются один раз
+        :param reuse: Таблица с тем же числом порядков, столбцы которой
+            берутся готовыми для совпадающих аргументов
+        """
+        self.Orders: int = orders
+        self.Args: np.ndarray = np.unique(np.asarray(args, dtype=float))
+        self.Psi: np.ndarray = np.empty((orders, self.Args.size))
+        self.Psi_der: np.ndarray = np.empty((orders, self.Args.size))
+        self.Chi: np.ndarray = np.empty((orders, self.Args.size))
+        self.Chi_der: np.ndarray = np.empty((orders, self.Args.size))
+        self.Psi_logder: np.ndarray = np.empty((orders, self.Args.size))
+        self.Chi_logder: np.ndarray = np.empty((orders, self.Args.size))
+        self.Log_ratio: np.ndarray = np.empty((orders, self.Args.size))
+        self.Ratio_sign: np.ndarray = np.empty((orders, self.Args.size))
+
+        known = np.zeros(self.Args.size, dtype=bool)
+        if reuse is not None and reuse.Orders == orders:
+            known = np.isin(self.Args, reuse.Args)
+            cols = reuse.columns(self.Args[known])
+            for name in self.ARRAYS:
+                getattr(self, name)[:, known] = getattr(reuse, name)[:, cols]
+
+        if not known.all():
+            self.__compute(~known)
+
+    def __compute(self, mask: np.ndarray) -> None:
+        """Расчёт столбцов таблицы для аргументов Args[mask]"""
+        args = self.Args[mask]
+        # Порядки 0..orders+1 нужны для производных крайних порядков
+        nu = np.arange(0, self.Orders + 2, dtype=float)[:, np.newaxis]
+        with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+            psi_logder = self.__psi_logder(self.Orders + 1, args)
+            psi, chi = self.__values(nu, args, psi_logder)
+
+            self.Psi[:, mask] = psi[1:-1]
+            self.Psi_der[:, mask] = self.__derivative(psi, nu, args)
+            self.Chi[:, mask] = chi[1:-1]
+            self.Chi_der[:, mask] = self.__derivative(chi, nu, args)
+
+            scaled = self.__scaled(self.Orders, args, psi, chi, psi_logder[:-1], self.Chi_der[:, mask])
+        self.Psi_logder[:, mask], self.Chi_logder[:, mask], self.Log_ratio[:, mask], self.Ratio_sign[:, mask] = scaled
+
+    @staticmethod
+    def __psi_logder(orders: int, args: np.ndarray) -> np.ndarray:
+        """
+        psi_n'/psi_n для n = 1..orders обратной рекурсией
+
+            D_{n-1} = n/k - 1 / (D_n + n/k)
+
+        от n >> k с D = 0, она устойчива при любых n. Начальный порядок
+        берётся за точкой поворота n = k с запасом ~k^(1/3), иначе при
+        k > orders рекурсия начинается в области колебаний и не сходится
+        """
+        top = float(args.max())
+        start = int(math.ceil(max(orders, top + 10 * top ** (1/3)))) + 16
+        d = np.zeros_like(args)
+        result = np.empty((orders, args.size))
+        for n in range(start, 0, -1):
+            if n <= orders:
+                result[n - 1] = d
+            d = n / args - 1 / (d + n / args)
+        return result
+
+    @staticmethod
+    def __values(nu: np.ndarray, args: np.ndarray, psi_logder: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Значения psi_n и chi_n для порядков nu рекурсиями по n
+
+        chi_n считается прямой рекурсией
+            chi_n = (2n-1)/k * chi_{n-1} - chi_{n-2},  chi_0 = -cos k,  chi_1 = -cos k / k - sin k,
+        устойчивой при любых n. psi_n - той же прямой рекурсией от
+        psi_0 = sin k, psi_1 = sin k / k - cos k, пока n <= k; при n > k она
+        теряет точность, и значения продолжаются через обратную рекурсию
+        логарифмической производной: psi_n = psi_{n-1} / (D_n + n/k). psi_n
+        при этом плавно уходит в ноль, а chi_n - в бесконечность.
+
+        Рекурсии векторны по аргументам и заменяют поэлементные вызовы
+        scipy.special.jv/yv, которые занимали почти всё время расчёта таблицы.
+        """
+        psi = np.empty((nu.size, args.size))
+        chi = np.empty((nu.size, args.size))
+        sin, cos = np.sin(args), np.cos(args)
+        psi[0], chi[0] = sin, -cos
+        psi[1] = np.where(args >= 1, sin / args - cos, sin / (psi_logder[0] + 1 / args))
+        chi[1] = -cos / args - sin
+        for n in range(2, nu.size):
+            chi[n] = (2*n - 1) / args * chi[n - 1] - chi[n - 2]
+            psi[n] = np.where(
+                n <= args, (2*n - 1) / args * psi[n - 1] - psi[n - 2], psi[n - 1] / (psi_logder[n - 1] + n / args))
+        return psi, chi
+
+    @staticmethod
+    def __scaled(
+        orders: int,
+        args: np.ndarray,
+        psi: np.ndarray,
+        chi: np.ndarray,
+        psi_logder: np.ndarray,
+        chi_der: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Логарифмические производные и отношение chi_n/psi_n
+
+        Пока chi_n и psi_n представимы в float64, chi_n'/chi_n и chi_n/psi_n
+        берутся из значений функций. Дальше (n > k, где нулей у функций нет)
+        отношение продолжается через t_n = chi_n / chi_{n-1} и
+        psi_{n-1}/psi_n = D_n + n/k, используя f_{n-1} / f_n = f_n'/f_n + n/k.
+
+        :param psi: Значения psi для порядков 0..orders+1
+        :param chi: Значения chi для порядков 0..orders+1
+        :param psi_logder: psi_n'/psi_n для порядков 1..orders
+        :param chi_der: Производные chi для порядков 1..orders
+        """
+        psi_n, chi_n = psi[1:-1], chi[1:-1]
+        safe = np.isfinite(chi_n) & np.isfinite(chi_der) & (np.abs(chi_n) < 1e250) & (np.abs(psi_n) > 1e-250)
+
+        chi_logder = np.where(safe, chi_der / chi_n, 0)
+        log_ratio = np.where(safe, np.log(np.abs(chi_n)) - np.log(np.abs(psi_n)), 0)
+        ratio_sign = np.where(safe, np.sign(chi_n) * np.sign(psi_n), 0)
+        t = chi[1] / chi[0]
+        for n in range(2, orders + 1):
+            row = n - 1
+            t = np.where(safe[row], chi[n] / chi[n - 1], (2*n - 1) / args - 1 / t)
+            tail = ~safe[row]
+            if not tail.any():
+                continue
+            psi_step = psi_logder[row] + n / args
+            chi_logder[row] = np.where(tail, 1 / t - n / args, chi_logder[row])
+            log_ratio[row] = np.where(
+                tail, log_ratio[row - 1] + np.log(np.abs(t)) + np.log(np.abs(psi_step)), log_ratio[row])
+            ratio_sign[row] = np.where(tail, ratio_sign[row - 1] * np.sign(t) * np.sign(psi_step), ratio_sign[row])
+        return psi_logder.copy(), chi_logder, log_ratio, ratio_sign
+
+    @staticmethod
+    def __derivative(values: np.ndarray, nu: np.ndarray, args: np.ndarray) -> np.ndarray:
+        """Производная по аргументу из значений порядков n-1, n и n+1"""
+        n = nu[1:-1]
+        return (n / (2 * n + 1)) * values[:-2] - \
+            ((n + 1) / (2 * n + 1)) * values[2:] + \
+            values[1:-1] / args
+
+    def scaled_cs(self, a, b, orders: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        C, Cder, S, Sder на границе слоёв с общим множителем, без переполнения
+
+            C = psi(a) chi'(b) - chi(a) psi'(b),  Cder = psi'(a) chi'(b) - chi'(a) psi'(b),
+            S = chi(a) psi(b) - psi(a) chi(b),    Sder = chi'(a) psi(b) - psi'(a) chi(b)
+
+        Рекурсия импедансов зависит только от отношений C, Cder, S и Sder,
+        поэтому все четыре делятся на psi(a)*chi(b) и выражаются через
+        логарифмические производные и q = (chi/psi)(a) / (chi/psi)(b).
+        Дополнительно они делятся на max(1, |q|), чтобы q не переполнялось.
+
+        :param a: Столбец (или массив столбцов) аргумента внутри слоя
+        :param b: Столбец (или массив столбцов) аргумента на границе с предыдущим слоем
+        :param orders: Число первых порядков
+        :return: Четыре массива (orders,) или (orders, len(a))
+        """
+        dpsi_a, dchi_a = self.Psi_logder[:orders, a], self.Chi_logder[:orders, a]
+        dpsi_b, dchi_b = self.Psi_logder[:orders, b], self.Chi_logder[:orders, b]
+        log_q = self.Log_ratio[:orders, a] - self.Log_ratio[:orders, b]
+        scale = np.maximum(log_q, 0)
+        w0 = np.exp(-scale)
+        w1 = self.Ratio_sign[:orders, a] * self.Ratio_sign[:orders, b] * np.exp(log_q - scale)
+        c = w0 * dchi_b - w1 * dpsi_b
+        cder = w0 * dpsi_a * dchi_b - w1 * dchi_a * dpsi_b
+        s = w1 - w0
+        sder = w1 * dchi_a - w0 * dpsi_a
+        return c, cder, s, sder
+
+    def hankel_ratios(self, col) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        psi_n/xi_n, psi_n'/psi_n и xi_n'/xi_n без переполнения
+
+        Через r = chi/psi: psi/xi = 1 / (1 + i*r), xi'/xi = (D_psi + i*r*D_chi) / (1 + i*r);
+        числитель и знаменатель делятся на max(1, |r|).
+
+        :param col: Столбец (или массив столбцов) аргумента
+        :return: Три массива (Orders,) или (Orders, len(col))
+        """
+        dpsi, dchi = self.Psi_logder[:, col], self.Chi_logder[:, col]
+        log_ratio = self.Log_ratio[:, col]
+        scale = np.maximum(log_ratio, 0)
+        w0 = np.exp(-scale)
+        w1 = 1j * self.Ratio_sign[:, col] * np.exp(log_ratio - scale)
+        return w0 / (w0 + w1), dpsi, (w0 * dpsi + w1 * dchi) / (w0 + w1)
+
+    def log_psi(self, col) -> np.ndarray:
+        """
+        Комплексный логарифм psi_n(k) = ln|psi_n| + i*pi*[psi_n < 0] без антипереполнения
+
+        Там, где psi_n уже неотличимо от нуля в float64 (n >> k), логарифм
+        продолжается через psi_{n-1}/psi_n = D_n + n/k.
+
+        :param col: Столбец (или массив столбцов) аргумента
+        :return: (Orders,) или (Orders, len(col))
+        """
+        psi = self.Psi[:, col]
+        args = self.Args[col]
+        tail = ~(np.abs(psi) > 1e-250)
+        with np.errstate(divide="ignore"):
+            result = np.log(psi.astype(complex))
+        for n in range(2, self.Orders + 1):
+            row = n - 1
+            if tail[row].any():
+                step = np.log((self.Psi_logder[row, col] + n / args).astype(complex))
+                result[row] = np.where(tail[row], result[row - 1] - step, result[row])
+        return result
+
+    @property
+    def Xi(self) -> np.ndarray:
+        """Значения xi_n(k) = psi_n(k) + i*chi_n(k), (Orders, M)"""
+        return self.Psi + 1j * self.Chi
+
+    @property
+    def Xi_der(self) -> np.ndarray:
+        """Производные xi_n(k), (Orders, M)"""
+        return self.Psi_der + 1j * self.Chi_der
+
+    def columns(self, args) -> np.ndarray:
+        """
+        Номера столбцов таблицы для заданных аргументов
+
+        :param args: Аргументы k, каждый из которых присутствует в таблице
+        """
+        return np.searchsorted(self.Args, np.asarray(args, dtype=float))
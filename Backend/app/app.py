@@ -1,20 +1,92 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from GreenTensor.Lens import Lens
-from GreenTensor.LensCalculator import LensCalculator
+from GreenTensor.AngularGrid import AngularGrid
+from GreenTensor.LensPattern import LensPattern
 from GreenTensor.LensPlotCreator import LensPlotCreator
-import matplotlib.pyplot as plt
-from io import BytesIO
+from GreenTensor.Constants import TETA_START, TETA_STOP, STEP_DEGREES
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import asyncio
+import base64
+import itertools
+import json
+import math
+import os
+import time
 import zipfile
+import numpy as np
+import compute_pool
+from compute_pool import PoolOverloaded, PoolTimeout
+import pipeline
+import pattern_format
+from pattern_format import finite_list
+import result_cache
+import instrumentation
+from instrumentation import Timings
+import jobs
+from jobs import JobProgress, JobRunner
+import single_flight
+from single_flight import SingleFlight
+
+
+# Прогрев пула при запуске; WARM_UP=0 - сервер готов сразу, прогрев - на первом запросе
+WARM_UP = os.getenv("WARM_UP", "1") != "0"
+readiness: dict = {"ready": not WARM_UP}
+
+
+async def warm_up() -> None:
+    """Запуск и прогрев воркеров пула, после которого сервер считается готовым"""
+    started = time.perf_counter()
+    try:
+        await compute_pool.pool.warm_up(pipeline.warm_up)
+    except Exception as e:
+        readiness["error"] = f"{type(e).__name__}: {e}"
+        return
+    readiness["warm_up_seconds"] = round(time.perf_counter() - started, 3)
+    readiness["ready"] = True
+
+
+recovery: Optional[asyncio.Task] = None
+
+
+async def recover() -> None:
+    """Пересоздание пулов полос, воркер которых аварийно завершился"""
+    try:
+        await compute_pool.pool.recover(pipeline.warm_up)
+    except Exception:
+        # Полоса остаётся сломанной, следующая проверка готовности повторит попытку
+        pass
+
+
+# Период опроса очереди фоновых задач, секунды
+JOB_POLL = float(os.getenv("JOB_POLL", "1"))
+job_runner: Optional[JobRunner] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global job_runner
+    task = asyncio.create_task(warm_up()) if WARM_UP else None
+    job_runner = JobRunner(jobs.queue, compute_pool.pool.job_workers, run_job, JOB_POLL)
+    job_runner.start()
+    yield
+    job_runner.stop()
+    for pending in (task, recovery):
+        if pending is not None:
+            pending.cancel()
+    compute_pool.pool.shutdown()
 
 app = FastAPI(
     title="Green Tensor Image Generator",
     docs_url="/api/docs",
     openapi_url="/api/openapi.json",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -22,8 +94,48 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"], 
+    expose_headers=["ETag", "Retry-After", "X-Pattern-Layout", "X-Field-Layout", "X-Series-Orders", "Server-Timing", "X-Profile-File"],
 )
 
+class AngleGridParameters(BaseModel):
+    """
+    Angular grid for the radiation pattern.
+
+    An explicit `angles` list takes precedence. Otherwise `start`/`stop`/`step`
+    define a uniform grid, refined around `lobe_center` when `lobe_half_width`
+    is given.
+
+    Attributes:
+        start: Начальный угол сетки, градусы
+        stop: Конечный угол сетки (не включается), градусы
+        step: Шаг сетки, градусы
+        angles: Явный список углов, градусы
+        lobe_center: Направление главного лепестка, градусы
+        lobe_half_width: Полуширина сгущенного сектора главного лепестка, градусы
+        lobe_step: Шаг внутри сектора главного лепестка, градусы
+    """
+    start: float = Field(TETA_START, ge=0, le=360, description="Начальный угол сетки, градусы")
+    stop: float = Field(TETA_STOP, ge=0, le=360, description="Конечный угол сетки (не включается), градусы")
+    step: float = Field(STEP_DEGREES, gt=0, description="Шаг сетки, градусы")
+    angles: Optional[List[float]] = Field(None, description="Явный список углов, градусы")
+    lobe_center: float = Field(180, ge=0, le=360, description="Направление главного лепестка, градусы")
+    lobe_half_width: Optional[float] = Field(None, gt=0, description="Полуширина сгущенного сектора главного лепестка, градусы")
+    lobe_step: Optional[float] = Field(None, gt=0, description="Шаг внутри сектора главного лепестка, градусы")
+
+    def to_grid(self) -> AngularGrid:
+        if self.angles is not None:
+            return AngularGrid(self.angles)
+        if self.lobe_half_width is not None:
+            return AngularGrid.main_lobe(
+                self.lobe_half_width,
+                self.lobe_step or self.step,
+                coarse_step=self.step,
+                center=self.lobe_center,
+                start=self.start,
+                stop=self.stop
+            )
+        return AngularGrid.uniform(self.start, self.stop, self.step)
+
 class LensParameters(BaseModel):
     """
     Parameters for lens generation and plotting.
@@ -35,6 +147,15 @@ class LensParameters(BaseModel):
         dielectric_constants: Диэлектрическая проницаемость материала слоев
         magnetic_permeabilities: Магнитная проницаемость материала слоев
         plot_type: Типы изображений для генерации - "line", "polar" или "both"
+        angle_grid: Сетка углов наблюдения (по умолчанию 0.01..360 градусов с шагом 1)
+        width: Ширина изображения, дюймы (по умолчанию 6.4 для line и 4 для polar)
+        height: Высота изображения, дюймы (по умолчанию 4.8 для line и 4 для polar)
+        dpi: Разрешение изображений, точек на дюйм
+        tolerance: Допуск адаптивного усечения ряда (по умолчанию все порядки Accuracy)
+        image_format: Формат изображений - "png", "webp" или "svg"
+        archive: Упаковывать изображения в zip; без архива выдаётся один график
+        max_points: Прореживание кривой до этого числа точек (для векторного вывода)
+        planes: Наложить диаграммы в плоскостях E и H и кроссполяризацию; для /api/pattern/ - добавить их массивы
     """
     radiusRatio: int = Field(..., gt=0, description="Радиус линзы (коэффициент умножения pi)")
     layers_count: int = Field(..., gt=0, description="Число слоев линзы (последний слой - воздух)")
@@ -43,46 +164,800 @@ class LensParameters(BaseModel):
     magnetic_permeabilities: List[float] = Field(..., description="Магнитная проницаемость материала слоев")
     plot_type: str = Field("both", description="Типы изображений для генерации - 'line', 'polar' или 'both'", 
                           pattern="^(line|polar|both)$")
+    angle_grid: Optional[AngleGridParameters] = Field(None, description="Сетка углов наблюдения")
+    width: Optional[float] = Field(None, gt=0, le=40, description="Ширина изображения, дюймы")
+    height: Optional[float] = Field(None, gt=0, le=40, description="Высота изображения, дюймы")
+    dpi: int = Field(LensPlotCreator.DPI, ge=10, le=600, description="Разрешение изображений, точек на дюйм")
+    tolerance: Optional[float] = Field(None, gt=0, lt=1, description="Допуск адаптивного усечения ряда")
+    image_format: str = Field("png", description="Формат изображений - 'png', 'webp' или 'svg'",
+                              pattern="^(png|webp|svg)$")
+    archive: bool = Field(True, description="Упаковывать изображения в zip; без архива выдаётся один график")
+    max_points: Optional[int] = Field(None, ge=16, le=100000,
+                                      description="Прореживание кривой до этого числа точек (для векторного вывода)")
+    planes: bool = Field(False, description="Наложить диаграммы в плоскостях E и H и кроссполяризацию")
+
+    def to_lens(self) -> Lens:
+        return Lens(self.radiusRatio, self.layers_count, self.norm_radii, self.dielectric_constants, self.magnetic_permeabilities)
+
+    def to_grid(self) -> AngularGrid:
+        return self.angle_grid.to_grid() if self.angle_grid is not None else AngularGrid.default()
+
+    def pattern_key(self, grid: AngularGrid) -> str:
+        """Канонический ключ физики: параметры линзы и фактическая сетка углов"""
+        return result_cache.canonical_hash({
+            "radiusRatio": self.radiusRatio,
+            "layers_count": self.layers_count,
+            "norm_radii": self.norm_radii,
+            "dielectric_constants": self.dielectric_constants,
+            "magnetic_permeabilities": self.magnetic_permeabilities,
+            "grid": result_cache.grid_hash(grid.Teta),
+            "tolerance": self.tolerance
+        })
+
+    def image_key(self, grid: AngularGrid) -> str:
+        """Канонический ключ архива с изображениями"""
+        return result_cache.canonical_hash({
+            "pattern": self.pattern_key(grid),
+            "plot_type": self.plot_type,
+            "size": self.figure_size(),
+            "dpi": self.dpi,
+            "image_format": self.image_format,
+            "max_points": self.max_points,
+            "planes": self.planes
+        })
+
+    def check_output(self) -> None:
+        """Проверка сочетания plot_type и archive"""
+        if not self.archive and self.plot_type == "both":
+            raise ValueError("Без архива можно получить только один график: plot_type line или polar")
+
+    def image_etag(self, key: str) -> str:
+        """ETag ответа /api/generate-images/ с ключом архива key"""
+        return f'"{key}"' if self.archive else f'"{key}-{self.plot_type}"'
+
+    def render_options(self) -> tuple:
+        """Аргументы pipeline.render_images после plot_type"""
+        return self.figure_size(), self.dpi, self.image_format, self.max_points, self.planes
+
+    def figure_size(self) -> Optional[tuple[float, float]]:
+        if self.width is None and self.height is None:
+            return None
+        return (self.width or self.height, self.height or self.width)
+
+
+def http_error(e: Exception) -> HTTPException:
+    """Преобразование исключения расчёта в HTTP-ответ"""
+    detail = {
+        "error": str(e),
+        "type": type(e).__name__,
+        "message": getattr(e, "message", str(e))
+    }
+    if isinstance(e, PoolOverloaded):
+        return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, PoolTimeout):
+        return HTTPException(status_code=504, detail=detail)
+    if isinstance(e, BrokenProcessPool):
+        return HTTPException(status_code=503, detail=detail)
+    return HTTPException(status_code=400, detail=detail)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def profile_requested(x_profile: Optional[str]) -> bool:
+    """Профиль cProfile пишется по заголовку X-Profile: 1, если задан PROFILE_DIR"""
+    return x_profile == "1" and instrumentation.PROFILE_DIR is not None
+
+
+async def run_compute(timings: Timings, profile: bool, cost: int, fn, *args):
+    """
+    Выполнение fn(*args) в пуле с замером этапов
+
+    Время сверх этапов, замеренных в процессе пула (ожидание в очереди и
+    передача данных), записывается этапом queue.
+    """
+    started = time.perf_counter()
+    result, child = await compute_pool.pool.run(cost, instrumentation.timed_call, profile, fn, *args)
+    timings.merge(child)
+    timings.add("queue", max(0.0, time.perf_counter() - started - child.total))
+    return result
+
+
+async def coalesced(flight: SingleFlight, key: str, timings: Timings, fn):
+    """
+    Результат fn() через single-flight
+
+    Этапы расчёта записываются в timings запроса, который его запустил;
+    у присоединившихся запросов ожидание - этап coalesced.
+    """
+    if key in flight:
+        with timings.stage("coalesced"):
+            return await flight.run(key, fn)
+    return await flight.run(key, fn)
+
+
+@app.get("/api/ready")
+async def ready():
+    """
+    Readiness probe: 200 once the compute workers are started and warmed up
+    (matplotlib, font cache, figure templates), 503 before that. Also 503
+    while a lane's process pool is broken (a worker died); the probe then
+    starts rebuilding it.
+    """
+    global recovery
+    broken = compute_pool.pool.broken
+    if broken and (recovery is None or recovery.done()):
+        recovery = asyncio.create_task(recover())
+    state = {**readiness, "ready": False, "broken_lanes": broken} if broken else readiness
+    return Response(
+        json.dumps(state),
+        status_code=200 if readiness["ready"] and not broken else 503,
+        media_type="application/json"
+    )
+
 
 @app.post("/api/generate-images/")
-async def generate_images(params: LensParameters):
+async def generate_images(
+    params: LensParameters,
+    if_none_match: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None)
+):
+    """
+    Plots of the lens pattern as a zip archive of `image_format` images, or,
+    with `archive=false`, the single requested plot (`plot_type` line or polar)
+    as the response body.
+    """
+    timings = Timings()
     try:
-        lens = Lens(params.radiusRatio, params.layers_count, params.norm_radii, params.dielectric_constants, params.magnetic_permeabilities)
-        lensCalc = LensCalculator(lens)
-        fig_line, fig_polar = LensPlotCreator.create_plots(lensCalc)
-
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            if params.plot_type in ["line", "both"]:
-                line_buffer = BytesIO()
-                fig_line.savefig(line_buffer, format='png', bbox_inches='tight')
-                plt.close(fig_line)
-                line_buffer.seek(0)
-                zip_file.writestr("lens_line.png", line_buffer.getvalue())
-
-            if params.plot_type in ["polar", "both"]:
-                polar_buffer = BytesIO()
-                fig_polar.savefig(polar_buffer, format='png', bbox_inches='tight')
-                plt.close(fig_polar)
-                polar_buffer.seek(0)
-                zip_file.writestr("lens_polar.png", polar_buffer.getvalue())
-        zip_buffer.seek(0)
-
-        return StreamingResponse(
-            zip_buffer,
+        params.check_output()
+        lens = params.to_lens()
+        grid = params.to_grid()
+        key = params.image_key(grid)
+        etag = params.image_etag(key)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        with timings.stage("cache"):
+            content = await result_cache.images.get(key)
+        if content is None:
+            # Одинаковые одновременные запросы ждут один расчёт
+            profile = profile_requested(x_profile)
+            content = await coalesced(
+                single_flight.images, key, timings,
+                lambda: calculate_images(params, lens, grid, key, timings, profile))
+
+        instrumentation.observe("generate-images", timings, lens.Accuracy, len(grid))
+        body, media_type, disposition = image_body(params, content)
+        return Response(
+            body,
+            media_type=media_type,
+            headers={"Content-Disposition": disposition, "ETag": etag, **timings.headers()}
+        )
+
+    except Exception as e:
+        raise http_error(e)
+
+
+async def calculate_images(
+    params: LensParameters,
+    lens: Lens,
+    grid: AngularGrid,
+    key: str,
+    timings: Timings,
+    profile: bool
+) -> bytes:
+    """Архив изображений с расчётом в пуле процессов; результат сохраняется в кэшах"""
+    pattern_key = params.pattern_key(grid)
+    with timings.stage("cache"):
+        pattern = await result_cache.patterns.get(pattern_key)
+    cost = 0 if pattern is not None else lens.Accuracy * len(grid)
+    pattern, content = await run_compute(
+        timings, profile,
+        cost, pipeline.calculate_and_render, lens, grid, params.plot_type, pattern,
+        params.figure_size(), params.dpi, params.tolerance, params.image_format, params.max_points, params.planes)
+    await result_cache.patterns.put(pattern_key, pattern, pattern.nbytes)
+    await result_cache.images.put(key, content, len(content))
+    return content
+
+
+def image_body(params: LensParameters, content: bytes) -> tuple[bytes, str, str]:
+    """
+    Тело ответа /api/generate-images/ по архиву изображений
+
+    :return: Архив или, без архива, один график; тип содержимого и Content-Disposition
+    """
+    if params.archive:
+        return content, "application/zip", "attachment; filename=images.zip"
+    extension, media_type = LensPlotCreator.FORMATS[params.image_format]
+    return (pipeline.unzip_images(content)[params.plot_type], media_type,
+            f"inline; filename=lens_{params.plot_type}.{extension}")
+
+
+async def run_job(job_id: str, fields: dict) -> tuple[bytes, dict]:
+    """
+    Выполнение фоновой задачи /api/jobs/: тот же результат, что у /api/generate-images/
+
+    Результат попадает и в кэши, так что повторный синхронный запрос
+    с теми же параметрами его не пересчитывает.
+    """
+    params = LensParameters(**fields)
+    lens = params.to_lens()
+    grid = params.to_grid()
+    key = params.image_key(grid)
+    content = await result_cache.images.get(key)
+    if content is None:
+        pattern_key = params.pattern_key(grid)
+        pattern = await result_cache.patterns.get(pattern_key)
+        pattern, content = await compute_pool.pool.run_job(
+            pipeline.calculate_and_render, lens, grid, params.plot_type, pattern,
+            params.figure_size(), params.dpi, params.tolerance, params.image_format, params.max_points,
+            params.planes, JobProgress(jobs.queue.path, job_id))
+        await result_cache.patterns.put(pattern_key, pattern, pattern.nbytes)
+        await result_cache.images.put(key, content, len(content))
+    body, media_type, disposition = image_body(params, content)
+    return body, {"media_type": media_type, "disposition": disposition, "etag": params.image_etag(key)}
+
+
+def job_view(job: dict) -> dict:
+    """Состояние задачи со ссылкой на результат"""
+    if job["status"] == jobs.DONE:
+        return {**job, "result": f"/api/jobs/{job['id']}/result"}
+    return job
+
+
+def job_not_found(job_id: str) -> HTTPException:
+    message = f"Задача {job_id} не найдена или срок её хранения истёк"
+    return HTTPException(status_code=404, detail={"error": message, "type": "JobNotFound", "message": message})
+
+
+@app.post("/api/jobs/", status_code=202)
+async def submit_job(params: LensParameters):
+    """
+    Submit a background calculation with the same body and result as
+    /api/generate-images/. Intended for large `radiusRatio` or fine grids
+    that would exceed proxy timeouts on the synchronous endpoint.
+
+    Returns 202 with the job state and a `Location` of the job; poll it with
+    GET /api/jobs/{id}, fetch GET /api/jobs/{id}/result once `status` is
+    `done`, cancel with DELETE /api/jobs/{id}. 503 with `Retry-After` when
+    `JOBS_MAX_QUEUED` jobs are already waiting.
+    """
+    try:
+        params.check_output()
+        lens = params.to_lens()
+        params.to_grid()
+        job = await asyncio.to_thread(jobs.queue.submit, params.model_dump(), lens.Accuracy)
+    except Exception as e:
+        raise http_error(e)
+    if job_runner is not None:
+        job_runner.wake()
+    return JSONResponse(job_view(job), status_code=202, headers={"Location": f"/api/jobs/{job['id']}"})
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    """
+    Job state: `status` (queued, running, done, failed, cancelled), `progress`
+    as series orders summed out of the lens `Accuracy` (fewer with `tolerance`;
+    the plots are rendered once all orders are summed), timestamps, `error`
+    for failed jobs and `expires`, after which a finished job and its result
+    are deleted (`JOB_TTL`).
+    """
+    job = await asyncio.to_thread(jobs.queue.get, job_id)
+    if job is None:
+        raise job_not_found(job_id)
+    return job_view(job)
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def job_result(job_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Result of a finished job, exactly as /api/generate-images/ would return
+    it. 409 while the job is not done.
+    """
+    job = await asyncio.to_thread(jobs.queue.get, job_id)
+    if job is None:
+        raise job_not_found(job_id)
+    result = await asyncio.to_thread(jobs.queue.result, job_id) if job["status"] == jobs.DONE else None
+    if result is None:
+        message = f"Задача {job_id} в статусе {job['status']}, результата нет"
+        raise HTTPException(status_code=409, detail={"error": message, "type": "JobNotDone", "message": message,
+                                                     "status": job["status"]})
+    body, meta = result
+    if etag_matches(if_none_match, meta["etag"]):
+        return Response(status_code=304, headers={"ETag": meta["etag"]})
+    return Response(body, media_type=meta["media_type"],
+                    headers={"Content-Disposition": meta["disposition"], "ETag": meta["etag"]})
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel a job. A queued job is cancelled at once; a running one stops at
+    its next progress report (`cancel_requested` is set until then). A
+    finished job is deleted together with its result.
+    """
+    job = await asyncio.to_thread(jobs.queue.cancel, job_id)
+    if job is None:
+        raise job_not_found(job_id)
+    return job_view(job)
+
+
+# Предел числа углов прореженной сетки предпросмотра в /api/generate-images/stream
+PREVIEW_ANGLES = int(os.getenv("PREVIEW_ANGLES", "90"))
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    """Событие Server-Sent Events с данными в JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def pattern_event(pattern: LensPattern, planes: bool = False) -> dict:
+    return {
+        **pattern_format.to_json(pattern_format.pattern_arrays(pattern, planes=planes)),
+        "orders": pattern.Orders,
+        "angles": pattern.Teta.size
+    }
+
+
+def image_event(params: LensParameters, kind: str, image: bytes) -> bytes:
+    return sse_event("image", {
+        "kind": kind,
+        "media_type": LensPlotCreator.FORMATS[params.image_format][1],
+        "data": base64.b64encode(image).decode()
+    })
+
+
+async def progressive_events(params: LensParameters, lens: Lens, grid: AngularGrid, profile: bool):
+    """
+    События потока /api/generate-images/stream по мере готовности результатов
+
+    Ошибка после начала потока передаётся событием error с тем же
+    описанием, что и в ответе с кодом ошибки.
+    """
+    timings = Timings()
+    key = params.image_key(grid)
+    try:
+        pattern_key = params.pattern_key(grid)
+        with timings.stage("cache"):
+            pattern = await result_cache.patterns.get(pattern_key)
+        if pattern is None:
+            coarse = grid.thinned(PREVIEW_ANGLES)
+            if len(coarse) < len(grid):
+                preview, lensCalc = await run_compute(
+                    timings, profile, lens.Accuracy * len(coarse), pipeline.preview, lens, coarse, params.tolerance)
+                yield sse_event("preview", pattern_event(preview, params.planes))
+                pattern = await run_compute(
+                    timings, profile, lens.Accuracy * len(grid), pipeline.refine, lensCalc, grid)
+            else:
+                pattern = await run_compute(
+                    timings, profile, lens.Accuracy * len(grid), pipeline.calculate, lens, grid, params.tolerance)
+            await result_cache.patterns.put(pattern_key, pattern, pattern.nbytes)
+        yield sse_event("pattern", pattern_event(pattern, params.planes))
+
+        with timings.stage("cache"):
+            content = await result_cache.images.get(key)
+        if content is not None:
+            for kind, image in pipeline.unzip_images(content).items():
+                yield image_event(params, kind, image)
+        else:
+            images = {}
+            kinds = ["line", "polar"] if params.plot_type == "both" else [params.plot_type]
+            # Графики строятся отдельными задачами и отправляются по готовности
+            for rendered in asyncio.as_completed([
+                run_compute(timings, profile, len(grid), pipeline.render_images, pattern, kind, *params.render_options())
+                for kind in kinds
+            ]):
+                for kind, image in (await rendered).items():
+                    images[kind] = image
+                    yield image_event(params, kind, image)
+            images = {kind: images[kind] for kind in kinds}
+            with timings.stage("zip"):
+                content = pipeline.zip_images(images, params.image_format)
+            await result_cache.images.put(key, content, len(content))
+
+        instrumentation.observe("generate-images-stream", timings, lens.Accuracy, len(grid))
+        yield sse_event("done", {"etag": f'"{key}"', "timings": timings.stages})
+
+    except Exception as e:
+        error = http_error(e)
+        yield sse_event("error", {"status": error.status_code, **error.detail})
+
+
+@app.post("/api/generate-images/stream")
+async def generate_images_stream(params: LensParameters, x_profile: Optional[str] = Header(None)):
+    """
+    Progressive variant of /api/generate-images/ as Server-Sent Events.
+
+    Events, in order:
+    - `preview`: arrays on a grid thinned to `PREVIEW_ANGLES` angles (only
+      for larger grids that are not cached yet);
+    - `pattern`: the final Teta, Tetay and DN_NORM arrays (with `planes`, also
+      DN_NORM_H and DN_NORM_CROSS), sent before the images even when they
+      are cached;
+    - `image`: one per plot kind as soon as it is rendered, `{kind,
+      media_type, data}` with the base64 image in `image_format`;
+    - `done`: the ETag of the equivalent /api/generate-images/ archive, which
+      is now cached, and stage timings;
+    - `error`: instead of the remaining events if the calculation fails.
+
+    The request is a POST with the same body as /api/generate-images/, so the
+    client reads the stream with fetch() rather than EventSource.
+    """
+    try:
+        lens = params.to_lens()
+        grid = params.to_grid()
+    except Exception as e:
+        raise http_error(e)
+    return StreamingResponse(
+        progressive_events(params, lens, grid, profile_requested(x_profile)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def get_pattern(
+    params: LensParameters,
+    lens: Lens,
+    grid: AngularGrid,
+    timings: Timings,
+    profile: bool = False
+) -> LensPattern:
+    """Диаграмма из кэша, при промахе - с расчётом в пуле процессов, общим для одинаковых запросов"""
+    key = params.pattern_key(grid)
+    with timings.stage("cache"):
+        pattern = await result_cache.patterns.get(key)
+    if pattern is None:
+        async def calculate() -> LensPattern:
+            result = await run_compute(
+                timings, profile, lens.Accuracy * len(grid), pipeline.calculate, lens, grid, params.tolerance)
+            await result_cache.patterns.put(key, result, result.nbytes)
+            return result
+        pattern = await coalesced(single_flight.patterns, key, timings, calculate)
+    return pattern
+
+
+@app.post("/api/pattern/")
+async def pattern_data(
+    params: LensParameters,
+    coefficients: bool = False,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None)
+):
+    """
+    Raw pattern arrays: Teta, Tetay, DN_NORM and optionally the Mn/Nn coefficients.
+    With `planes` the H-plane and cross-polarization patterns DN_NORM_H and
+    DN_NORM_CROSS are added; they come from the same series summation as
+    DN_NORM and are normalized to its maximum.
+
+    JSON by default. With `Accept: application/octet-stream` the arrays are
+    packed back to back as little-endian float32/complex64, and the
+    `X-Pattern-Layout` header describes them, e.g.
+    `teta=float32[359];tetay=float32[359];dn_norm=float32[359]`.
+
+    `X-Series-Orders` is the number of series orders summed: `Accuracy`, or
+    fewer when `tolerance` is set.
+    """
+    timings = Timings()
+    try:
+        lens = params.to_lens()
+        grid = params.to_grid()
+        binary = accept is not None and pattern_format.BINARY_MEDIA_TYPE in accept
+        etag = '"{}"'.format(result_cache.canonical_hash({
+            "pattern": params.pattern_key(grid),
+            "binary": binary,
+            "coefficients": coefficients,
+            "planes": params.planes
+        }))
+        headers = {"ETag": etag, "Vary": "Accept"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        pattern = await get_pattern(params, lens, grid, timings, profile_requested(x_profile))
+        headers["X-Series-Orders"] = str(pattern.Orders)
+        arrays = pattern_format.pattern_arrays(pattern, coefficients, params.planes)
+        with timings.stage("pack"):
+            if binary:
+                content, layout = pattern_format.pack_binary(arrays)
+                headers["X-Pattern-Layout"] = layout
+                media_type = pattern_format.BINARY_MEDIA_TYPE
+            else:
+                content = json.dumps(pattern_format.to_json(arrays), separators=(",", ":")).encode()
+                media_type = "application/json"
+        instrumentation.observe("pattern", timings, lens.Accuracy, len(grid))
+        headers.update(timings.headers())
+        return Response(content, media_type=media_type, headers=headers)
+
+    except Exception as e:
+        raise http_error(e)
+
+
+SWEEP_MAX_VARIANTS = int(os.getenv("SWEEP_MAX_VARIANTS", "1000"))
+
+
+class SweepAxis(BaseModel):
+    """
+    One swept parameter of a sweep.
+
+    Attributes:
+        parameter: Изменяемый параметр линзы
+        layer: Номер слоя для послойных параметров (с нуля)
+        values: Значения параметра
+    """
+    parameter: str = Field(..., description="Изменяемый параметр линзы",
+                           pattern="^(radiusRatio|norm_radii|dielectric_constants|magnetic_permeabilities)$")
+    layer: Optional[int] = Field(None, ge=0, description="Номер слоя для послойных параметров (с нуля)")
+    values: List[float] = Field(..., min_length=1, description="Значения параметра")
+
+
+class SweepParameters(BaseModel):
+    """
+    Parameter sweep over a base lens.
+
+    Variants are the cartesian product of all axes, the first axis varies slowest.
+
+    Attributes:
+        base: Базовые параметры линзы (plot_type не используется)
+        axes: Изменяемые параметры
+        format: Формат результата - "json" или "npz"
+        plot: Добавить PNG с наложением диаграмм (ответ - zip-архив)
+    """
+    base: LensParameters
+    axes: List[SweepAxis] = Field(..., min_length=1, description="Изменяемые параметры")
+    format: str = Field("json", description="Формат результата - 'json' или 'npz'", pattern="^(json|npz)$")
+    plot: bool = Field(False, description="Добавить PNG с наложением диаграмм (ответ - zip-архив)")
+
+    def variants(self) -> list[tuple[float, ...]]:
+        count = math.prod(len(axis.values) for axis in self.axes)
+        if count > SWEEP_MAX_VARIANTS:
+            raise ValueError(f"Число вариантов {count} превышает допустимое {SWEEP_MAX_VARIANTS}")
+        return list(itertools.product(*(axis.values for axis in self.axes)))
+
+    def to_lens(self, values: tuple[float, ...]) -> Lens:
+        lens = self.base.model_dump()
+        for axis, value in zip(self.axes, values):
+            if axis.parameter == "radiusRatio":
+                lens["radiusRatio"] = int(value) if float(value).is_integer() else value
+                continue
+            if axis.layer is None or axis.layer >= self.base.layers_count:
+                raise ValueError(f"Для параметра {axis.parameter} нужен номер слоя от 0 до {self.base.layers_count - 1}")
+            lens[axis.parameter] = list(lens[axis.parameter])
+            lens[axis.parameter][axis.layer] = value
+        return Lens(lens["radiusRatio"], lens["layers_count"], lens["norm_radii"],
+                    lens["dielectric_constants"], lens["magnetic_permeabilities"])
+
+
+def pack_sweep(
+    params: SweepParameters,
+    variants: list[tuple[float, ...]],
+    grid: AngularGrid,
+    tetay: np.ndarray,
+    dn_norm: np.ndarray,
+    metrics: list[dict]
+) -> tuple[bytes, str, str]:
+    """Результат параметрического расчёта в формате params.format: тело, тип и имя файла"""
+    summary = {name: [m[name] for m in metrics] for name in metrics[0]}
+    if params.format == "npz":
+        buffer = BytesIO()
+        np.savez(
+            buffer,
+            variants=np.asarray(variants, dtype=float),
+            teta=grid.Teta,
+            tetay=tetay,
+            dn_norm=dn_norm.astype(np.float32),
+            **{name: np.asarray(values, dtype=float) for name, values in summary.items()}
+        )
+        return buffer.getvalue(), "application/octet-stream", "sweep.npz"
+
+    content = json.dumps({
+        "axes": [axis.model_dump() for axis in params.axes],
+        "variants": [list(v) for v in variants],
+        "teta": grid.Teta.tolist(),
+        "tetay": tetay.tolist(),
+        "dn_norm": [finite_list(curve) for curve in dn_norm],
+        "metrics": {name: finite_list(values) for name, values in summary.items()}
+    }, separators=(",", ":")).encode()
+    return content, "application/json", "sweep.json"
+
+
+@app.post("/api/sweep/")
+async def sweep(params: SweepParameters, x_profile: Optional[str] = Header(None)):
+    """
+    Parameter sweep. Stage timings in `Server-Timing` are summed over the
+    chunks computed in parallel.
+    """
+    timings = Timings()
+    profile = profile_requested(x_profile)
+    try:
+        grid = params.base.to_grid()
+        variants = params.variants()
+        lenses = [params.to_lens(values) for values in variants]
+
+        # Варианты делятся на части по числу воркеров пула
+        chunks = np.array_split(np.arange(len(lenses)), min(compute_pool.pool.parallelism, len(lenses)))
+        results = await asyncio.gather(*(
+            run_compute(
+                timings, profile, sum(lenses[i].Accuracy for i in chunk) * len(grid),
+                pipeline.calculate_sweep, [lenses[i] for i in chunk], grid, params.base.tolerance)
+            for chunk in chunks
+        ))
+        tetay = results[0][0]
+        dn_norm = np.concatenate([r[1] for r in results])
+        metrics = [m for r in results for m in r[2]]
+
+        with timings.stage("pack"):
+            content, media_type, filename = pack_sweep(params, variants, grid, tetay, dn_norm, metrics)
+
+        accuracy = max(lens.Accuracy for lens in lenses)
+        if not params.plot:
+            instrumentation.observe("sweep", timings, accuracy, len(grid))
+            return Response(content, media_type=media_type, headers=timings.headers())
+
+        labels = [", ".join(f"{axis.parameter}={value:g}" for axis, value in zip(params.axes, v)) for v in variants]
+        png = await run_compute(timings, profile, dn_norm.size, pipeline.render_sweep_png, tetay, dn_norm, labels)
+        with timings.stage("zip"):
+            zip_buffer = BytesIO()
+            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_STORED) as zip_file:
+                zip_file.writestr(filename, content, compress_type=zipfile.ZIP_DEFLATED)
+                zip_file.writestr("sweep_line.png", png)
+        instrumentation.observe("sweep", timings, accuracy, len(grid))
+        return Response(
+            zip_buffer.getvalue(),
             media_type="application/zip",
-            headers={
-                "Content-Disposition": "attachment; filename=images.zip",
-                "Content-Length": str(zip_buffer.getbuffer().nbytes)
-            }
+            headers={"Content-Disposition": "attachment; filename=sweep.zip", **timings.headers()}
         )
 
     except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": str(e),
-                "type": type(e).__name__,
-                "message": getattr(e, "message", str(e))
-            }
+        raise http_error(e)
+
+
+# Наибольшее число точек сетки ближнего поля по одной оси
+NEAR_FIELD_MAX_SIZE = int(os.getenv("NEAR_FIELD_MAX_SIZE", "1001"))
+
+
+class NearFieldParameters(BaseModel):
+    """
+    Near-field map of a lens in the E-plane.
+
+    Attributes:
+        lens: Параметры линзы (используются также dpi и image_format для изображения)
+        grid: Вид сетки - "cartesian" (x, z) или "polar" (r, teta)
+        extent: Размер области в радиусах линзы: |x|, |z| или r не больше extent
+        size: Число точек сетки по каждой оси
+        format: Формат результата - "image" (тепловая карта) или "binary" (float32)
+    """
+    lens: LensParameters
+    grid: str = Field("cartesian", description="Вид сетки - 'cartesian' (x, z) или 'polar' (r, teta)",
+                      pattern="^(cartesian|polar)$")
+    extent: float = Field(2, gt=0, le=20, description="Размер области в радиусах линзы")
+    size: int = Field(201, ge=2, description="Число точек сетки по каждой оси")
+    format: str = Field("image", description="Формат результата - 'image' или 'binary'", pattern="^(image|binary)$")
+
+    def check_size(self) -> None:
+        if self.size > NEAR_FIELD_MAX_SIZE:
+            raise ValueError(f"Размер сетки {self.size} превышает допустимый {NEAR_FIELD_MAX_SIZE}")
+
+
+async def near_field_rows(field, params: NearFieldParameters, timings: Timings, profile: bool):
+    """
+    Части сетки ближнего поля по порядку строк
+
+    Части считаются в пуле, одновременно - до pool.parallelism частей;
+    каждая отдаётся, как только посчитаны все предыдущие.
+    """
+    rows = field.rows_per_tile(params.size)
+    tiles = iter(range(0, params.size, rows))
+    cost = field.Orders * rows * params.size
+
+    def submit(start: int) -> asyncio.Future:
+        stop = min(start + rows, params.size)
+        return asyncio.ensure_future(run_compute(
+            timings, profile, cost, pipeline.near_field_tile,
+            field, params.grid, params.extent, params.size, start, stop))
+
+    pending = [submit(start) for start in itertools.islice(tiles, compute_pool.pool.parallelism)]
+    try:
+        while pending:
+            tile = await pending.pop(0)
+            start = next(tiles, None)
+            if start is not None:
+                pending.append(submit(start))
+            yield tile
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+@app.post("/api/near-field/")
+async def near_field(params: NearFieldParameters, x_profile: Optional[str] = Header(None)):
+    """
+    Near-field map |E| in the E-plane inside and around the lens, normalized
+    to the incident wave.
+
+    The grid is split into row tiles of bounded memory, computed in parallel
+    in the worker pool. `format=binary` streams the map as little-endian
+    float32 rows in grid order as soon as they are ready; `X-Field-Layout`
+    describes it, e.g. `field=float32[201,201];grid=cartesian;extent=2`.
+    Cartesian rows are z and columns x from `-extent` to `extent`; polar rows
+    are r from 0 to `extent` and columns teta from 0 to 180 degrees, teta
+    measured from the direction of incidence. `format=image` returns a
+    heatmap in `lens.image_format` with the layer boundaries drawn.
+    """
+    timings = Timings()
+    profile = profile_requested(x_profile)
+    try:
+        params.check_size()
+        lens = params.lens.to_lens()
+        field = await run_compute(timings, profile, lens.Accuracy, pipeline.near_field, lens)
+        points = params.size * params.size
+
+        if params.format == "binary":
+            layout = f"field=float32[{params.size},{params.size}];grid={params.grid};extent={params.extent:g}"
+
+            async def body():
+                async for tile in near_field_rows(field, params, timings, profile):
+                    yield tile.astype("<f4").tobytes()
+                instrumentation.observe("near_field", timings, lens.Accuracy, points)
+
+            return StreamingResponse(
+                body(), media_type=pattern_format.BINARY_MEDIA_TYPE, headers={"X-Field-Layout": layout})
+
+        tiles = [tile async for tile in near_field_rows(field, params, timings, profile)]
+        extension, media_type = LensPlotCreator.FORMATS[params.lens.image_format]
+        image = await run_compute(
+            timings, profile, points, pipeline.render_field,
+            np.concatenate(tiles), params.grid, params.extent, field.Bounds, params.lens.dpi, params.lens.image_format)
+        instrumentation.observe("near_field", timings, lens.Accuracy, points)
+        return Response(
+            image,
+            media_type=media_type,
+            headers={"Content-Disposition": f"inline; filename=lens_near_field.{extension}", **timings.headers()}
+        )
+
+    except Exception as e:
+        raise http_error(e)
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Metrics in the Prometheus text format: stage and request time histograms
+    (stages labelled by Accuracy and angle-count buckets), cache gauges,
+    single-flight counters (`greentensor_singleflight_coalesced_total` is the
+    number of computations saved by coalescing identical concurrent requests) and
+    background job counts by status.
+    """
+    caches = {"images": result_cache.images.stats(), "patterns": result_cache.patterns.stats()}
+    if result_cache.store is not None:
+        caches["store"] = await asyncio.to_thread(result_cache.store.stats)
+    gauges = {
+        f"greentensor_cache_{field}": (
+            f"Кэш результатов: {field}",
+            {(("cache", name),): stats[field] for name, stats in caches.items()}
         )
+        for field in ("entries", "bytes", "hits", "misses")
+    }
+    flights = {"images": single_flight.images.stats(), "patterns": single_flight.patterns.stats()}
+    gauges["greentensor_singleflight_in_flight"] = (
+        "Выполняющиеся расчёты", {(("flight", name),): stats["in_flight"] for name, stats in flights.items()})
+    counters = {
+        f"greentensor_singleflight_{field}_total": (
+            help, {(("flight", name),): stats[field] for name, stats in flights.items()})
+        for field, help in (("started", "Запущенные расчёты"),
+                            ("coalesced", "Запросы, дождавшиеся чужого расчёта (сэкономленные расчёты)"))
+    }
+    job_counts = await asyncio.to_thread(jobs.queue.stats)
+    gauges["greentensor_jobs"] = (
+        "Фоновые задачи по статусам",
+        {(("status", status),): count for status, count in job_counts.items()}
+    )
+    return PlainTextResponse(
+        instrumentation.render_metrics(gauges, counters),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,57 @@
+"""
+Сравнение пакетного расчёта набора линз с расчётом по одной линзе
+
+Запуск из каталога Backend/app:
+    python -m benchmarks.batch [--lenses 1000] [--radius 1 10] [--layers 3]
+
+Набор - случайные линзы с одинаковым числом слоев и радиусом из --radius.
+Для каждого радиуса выводится время на линзу у LensBatchCalculator и у
+LensCalculator (по --single первым линзам) и наибольшее расхождение DN_NORM.
+"""
+import argparse
+import time
+import numpy as np
+from GreenTensor.LensBatch import LensBatch
+from GreenTensor.LensBatchCalculator import LensBatchCalculator
+from GreenTensor.LensCalculator import LensCalculator
+
+
+def random_batch(rng: np.random.Generator, lenses: int, radius: int, layers: int) -> LensBatch:
+    norm_radii = np.sort(rng.uniform(0.2, 0.95, (lenses, layers)), axis=1)
+    norm_radii[:, -1] = 1
+    dielectric_constants = rng.uniform(1.0, 3.0, (lenses, layers))
+    dielectric_constants[:, -1] = 1
+    return LensBatch(np.full(lenses, radius), layers, norm_radii, dielectric_constants, np.ones((lenses, layers)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lenses", type=int, default=1000, help="Число линз в наборе")
+    parser.add_argument("--radius", type=int, nargs="+", default=[1, 10], help="Отношения радиуса линзы к длине волны")
+    parser.add_argument("--layers", type=int, default=3, help="Число слоев линз")
+    parser.add_argument("--single", type=int, default=50, help="Число линз для расчёта по одной")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'radius':>6} {'batch, us':>10} {'single, us':>11} {'speedup':>8} {'max |dDN|, dB':>14}")
+    for radius in args.radius:
+        batch = random_batch(rng, args.lenses, radius, args.layers)
+        started = time.perf_counter()
+        result = LensBatchCalculator(batch)
+        batch_time = (time.perf_counter() - started) / len(batch)
+
+        count = min(args.single, len(batch))
+        error = 0.0
+        started = time.perf_counter()
+        for i in range(count):
+            dn_norm = LensCalculator(batch.lens(i)).DN_NORM
+            finite = np.isfinite(dn_norm)
+            error = max(error, float(np.abs(dn_norm - result.DN_NORM[i])[finite].max()))
+        single_time = (time.perf_counter() - started) / count
+
+        print(f"{radius:>6} {batch_time * 1e6:>10.1f} {single_time * 1e6:>11.1f} "
+              f"{single_time / batch_time:>7.0f}x {error:>14.1e}")
+
+
+if __name__ == "__main__":
+    main()
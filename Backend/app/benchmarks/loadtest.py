@@ -0,0 +1,510 @@
+"""
+Нагрузочное тестирование HTTP API
+
+Запуск из каталога Backend/app:
+    python -m benchmarks.loadtest --concurrency 8 --duration 30
+    python -m benchmarks.loadtest --server uvicorn --web-workers 2 --compute-workers 2 \\
+        --mix small=8,large:line=1,medium:pattern=2 --unique --json results.json
+    python -m benchmarks.loadtest --url http://localhost:8080 --requests 500
+    python -m benchmarks.loadtest --compare before.json after.json
+
+Сервер запускается локально: --server uvicorn - отдельным процессом через
+main.py (как в контейнере, WEB_WORKERS и COMPUTE_WORKERS задаются ключами),
+--server inprocess - uvicorn в потоке этого же процесса. С --url нагрузка
+подаётся на уже запущенный сервер.
+
+Смесь запросов --mix - веса вида "линза[:вид]=вес": линзы из PRESETS,
+вид - line, polar, both (/api/generate-images/) или pattern (/api/pattern/).
+--workload задаёт смесь JSON-файлом: [{"name", "weight", "path", "body"}].
+С --unique проницаемость ядра линзы немного меняется в каждом запросе,
+чтобы запросы не попадали в кэши и считались заново.
+
+--concurrency клиентов отправляют запросы без пауз в течение --duration
+секунд или до --requests запросов. Для каждого вида запроса и для всех
+вместе выводятся задержки (p50/p90/p99/max), пропускная способность,
+доля ошибок и время ожидания в очереди пула (этап queue из
+Server-Timing). Нагрузка сервера - процессорное время и RSS процесса
+сервера вместе с дочерними (воркеры пула), по /proc; в режиме inprocess
+в них входит и сам клиент. Результаты с параметрами запуска
+сохраняются в JSON (--json) и сравниваются ключом --compare.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Линзы смеси: radiusRatio, нормированные радиусы и проницаемости слоев
+PRESETS = {
+    "small": (1, [0.5, 0.8, 1], [1.9, 1.5, 1.0]),
+    "medium": (10, [0.5, 0.8, 1], [1.9, 1.5, 1.0]),
+    "large": (40, [0.5, 0.8, 1], [1.9, 1.5, 1.0]),
+    "huge": (100, [0.2, 0.4, 0.6, 0.8, 1], [1.96, 1.84, 1.64, 1.36, 1.0]),
+}
+KINDS = ("line", "polar", "both", "pattern")
+
+# Границы корзин гистограммы задержек, мс
+HISTOGRAM_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+# Период замера нагрузки сервера, секунды
+SAMPLE_PERIOD = 0.5
+
+
+class Scenario:
+    """Вид запроса смеси: путь и тело, вес в смеси"""
+    def __init__(self, name: str, weight: float, path: str, body: dict, unique: bool = False):
+        self.name = name
+        self.weight = weight
+        self.path = path
+        self.body = body
+        self.unique = unique
+
+    @classmethod
+    def from_preset(cls, spec: str, weight: float, unique: bool) -> "Scenario":
+        """Вид запроса "линза[:вид]" из PRESETS"""
+        lens, _, kind = spec.partition(":")
+        kind = kind or "both"
+        if lens not in PRESETS:
+            raise ValueError(f"Неизвестная линза {lens}, есть: {', '.join(PRESETS)}")
+        if kind not in KINDS:
+            raise ValueError(f"Неизвестный вид запроса {kind}, есть: {', '.join(KINDS)}")
+        radius, norm_radii, dielectric_constants = PRESETS[lens]
+        body = {
+            "radiusRatio": radius,
+            "layers_count": len(norm_radii),
+            "norm_radii": norm_radii,
+            "dielectric_constants": dielectric_constants,
+            "magnetic_permeabilities": [1.0] * len(norm_radii),
+        }
+        if kind == "pattern":
+            return cls(f"{lens}:{kind}", weight, "/api/pattern/", body, unique)
+        return cls(f"{lens}:{kind}", weight, "/api/generate-images/", {**body, "plot_type": kind}, unique)
+
+    def payload(self, number: int) -> bytes:
+        body = self.body
+        if self.unique and "dielectric_constants" in body:
+            # Отличие в 1e-9 меняет ключ кэша, но не диаграмму
+            body = {**body, "dielectric_constants": list(body["dielectric_constants"])}
+            body["dielectric_constants"][0] += number * 1e-9
+        return json.dumps(body).encode()
+
+
+def parse_mix(mix: str, unique: bool) -> list[Scenario]:
+    scenarios = []
+    for item in mix.split(","):
+        spec, _, weight = item.partition("=")
+        scenarios.append(Scenario.from_preset(spec.strip(), float(weight or 1), unique))
+    return scenarios
+
+
+def load_workload(path: Path, unique: bool) -> list[Scenario]:
+    return [Scenario(item["name"], float(item.get("weight", 1)), item["path"], item["body"], unique)
+            for item in json.loads(path.read_text())]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(root: int) -> list[int]:
+    """Процесс root и все его потомки по /proc"""
+    parents: dict[int, list[int]] = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        parents.setdefault(ppid, []).append(int(entry.name))
+    tree = [root]
+    for pid in tree:
+        tree.extend(parents.get(pid, []))
+    return tree
+
+
+def cpu_rss(pids: list[int]) -> tuple[float, int]:
+    """Суммарное процессорное время (с) и RSS (байт) процессов"""
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    cpu = 0.0
+    rss = 0
+    for pid in pids:
+        try:
+            fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+            rss += int(Path(f"/proc/{pid}/statm").read_text().split()[1]) * page
+        except OSError:
+            continue
+        # utime и stime - поля 14 и 15 stat, после имени процесса - с 12-го
+        cpu += (int(fields[11]) + int(fields[12])) / ticks
+    return cpu, rss
+
+
+class ResourceSampler:
+    """Периодический замер процессорного времени и RSS дерева процессов сервера"""
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.samples: list[tuple[float, float, int, int]] = []
+        self.pids: set[int] = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self) -> None:
+        pids = process_tree(self.pid)
+        self.pids.update(pids)
+        cpu, rss = cpu_rss(pids)
+        self.samples.append((time.monotonic(), cpu, rss, len(pids)))
+
+    def _run(self) -> None:
+        while not self._stop.wait(SAMPLE_PERIOD):
+            self.sample()
+
+    def start(self) -> None:
+        self.sample()
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        (t0, cpu0, _, _), (t1, cpu1, _, _) = self.samples[0], self.samples[-1]
+        rss = [s[2] for s in self.samples]
+        return {
+            "cpu_seconds": round(cpu1 - cpu0, 3),
+            "cpu_cores": round((cpu1 - cpu0) / max(t1 - t0, 1e-9), 3),
+            "rss_mb_mean": round(float(np.mean(rss)) / 2**20, 1),
+            "rss_mb_max": round(max(rss) / 2**20, 1),
+            "processes_max": max(s[3] for s in self.samples),
+            "timeline": [{"t": round(t - t0, 2), "cpu": round(c - cpu0, 3), "rss_mb": round(r / 2**20, 1)}
+                         for t, c, r, _ in self.samples],
+        }
+
+
+class LocalServer:
+    """Сервер на свободном порту: процесс main.py или uvicorn в потоке"""
+    def __init__(self, mode: str, web_workers: int, compute_workers: int | None, port: int | None = None):
+        self.mode = mode
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {"PORT": str(self.port), "WEB_WORKERS": str(web_workers)}
+        if compute_workers is not None:
+            self.env["COMPUTE_WORKERS"] = str(compute_workers)
+        self.pid = os.getpid()
+        self._process: subprocess.Popen | None = None
+        self._server = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self.mode == "uvicorn":
+            self._process = subprocess.Popen(
+                [sys.executable, "main.py"], cwd=APP_DIR, env={**os.environ, **self.env},
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            self.pid = self._process.pid
+            return
+
+        # Настройки пула читаются при импорте приложения
+        os.environ.update(self.env)
+        sys.path.insert(0, str(APP_DIR))
+        import uvicorn
+        from app import app
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+
+    def stop(self, pids: set[int]) -> None:
+        """Остановка сервера; оставшиеся процессы из pids завершаются принудительно"""
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=30)
+            return
+        if self._process is None:
+            return
+        self._process.send_signal(signal.SIGTERM)
+        try:
+            self._process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        for pid in pids - {os.getpid()}:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def failure(self) -> str | None:
+        """Сообщение упавшего при запуске процесса сервера"""
+        if self._process is not None and self._process.poll() is not None:
+            return self._process.stderr.read().decode(errors="replace")[-2000:]
+        return None
+
+
+def wait_ready(url: str, server: LocalServer | None, timeout: float) -> float:
+    """Ожидание готовности сервера (/api/ready), секунды"""
+    started = time.monotonic()
+    parts = urlsplit(url)
+    while time.monotonic() - started < timeout:
+        if server is not None and (error := server.failure()) is not None:
+            raise RuntimeError(f"Сервер завершился при запуске:\n{error}")
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=5)
+            connection.request("GET", "/api/ready")
+            if connection.getresponse().status == 200:
+                return time.monotonic() - started
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Сервер {url} не готов за {timeout:g} с")
+
+
+def queue_seconds(server_timing: str | None) -> float | None:
+    """Этап queue из заголовка Server-Timing, секунды"""
+    for metric in (server_timing or "").split(","):
+        name, *params = metric.strip().split(";")
+        if name == "queue":
+            for param in params:
+                if param.startswith("dur="):
+                    return float(param[4:]) / 1000
+    return None
+
+
+class LoadGenerator:
+    """Клиенты, отправляющие запросы смеси без пауз"""
+    def __init__(self, url: str, scenarios: list[Scenario], concurrency: int, duration: float | None,
+                 requests: int | None, timeout: float, seed: int):
+        self.parts = urlsplit(url)
+        self.scenarios = scenarios
+        self.weights = [s.weight for s in scenarios]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.requests = requests
+        self.timeout = timeout
+        self.seed = seed
+        self.records: list[dict] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _next(self) -> int | None:
+        number = next(self._counter)
+        if self.requests is not None and number >= self.requests:
+            return None
+        if self.duration is not None and time.monotonic() >= self._deadline:
+            return None
+        return number
+
+    def _connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.parts.hostname, self.parts.port, timeout=self.timeout)
+
+    def _client(self, index: int) -> None:
+        rng = random.Random(self.seed + index)
+        connection = self._connect()
+        records = []
+        while (number := self._next()) is not None:
+            scenario = rng.choices(self.scenarios, self.weights)[0]
+            record = {"scenario": scenario.name, "start": time.monotonic() - self._started}
+            sent = time.perf_counter()
+            try:
+                connection.request("POST", scenario.path, scenario.payload(number),
+                                   {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                record["status"] = response.status
+                record["queue"] = queue_seconds(response.getheader("Server-Timing"))
+            except (OSError, http.client.HTTPException) as e:
+                record["error"] = type(e).__name__
+                connection.close()
+                connection = self._connect()
+            record["latency"] = time.perf_counter() - sent
+            records.append(record)
+        connection.close()
+        with self._lock:
+            self.records.extend(records)
+
+    def run(self) -> float:
+        """Подача нагрузки; возвращает её длительность, секунды"""
+        self._started = time.monotonic()
+        self._deadline = self._started + (self.duration or 0)
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            for future in [executor.submit(self._client, i) for i in range(self.concurrency)]:
+                future.result()
+        return time.monotonic() - self._started
+
+
+def percentiles(values: list[float]) -> dict:
+    """p50/p90/p99/max и среднее, мс"""
+    if not values:
+        return {}
+    ms = np.asarray(values) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {"p50": round(p50, 2), "p90": round(p90, 2), "p99": round(p99, 2),
+            "max": round(float(ms.max()), 2), "mean": round(float(ms.mean()), 2)}
+
+
+def summarize(records: list[dict], elapsed: float) -> dict:
+    """Сводка по записям запросов: задержки, ошибки, очередь, гистограмма"""
+    latency = [r["latency"] for r in records]
+    errors: dict[str, int] = {}
+    for r in records:
+        if "error" in r or r["status"] >= 400:
+            key = r.get("error") or str(r["status"])
+            errors[key] = errors.get(key, 0) + 1
+    counts = np.bincount(np.searchsorted(HISTOGRAM_MS, np.asarray(latency) * 1000),
+                         minlength=len(HISTOGRAM_MS) + 1)
+    histogram = {f"le_{bound}": int(c) for bound, c in zip(HISTOGRAM_MS, counts)}
+    histogram["inf"] = int(counts[-1])
+    failed = sum(errors.values())
+    return {
+        "requests": len(records),
+        "throughput": round(len(records) / elapsed, 3) if elapsed > 0 else None,
+        "errors": errors,
+        "error_rate": round(failed / len(records), 4) if records else 0,
+        "latency_ms": percentiles(latency),
+        "queue_ms": percentiles([r["queue"] for r in records if r.get("queue") is not None]),
+        "histogram_ms": histogram,
+    }
+
+
+def report(records: list[dict], elapsed: float) -> dict:
+    names = sorted({r["scenario"] for r in records})
+    return {
+        "total": summarize(records, elapsed),
+        "scenarios": {name: summarize([r for r in records if r["scenario"] == name], elapsed) for name in names},
+    }
+
+
+def print_report(results: dict) -> None:
+    print(f"{'scenario':18} {'req':>6} {'rps':>7} {'err, %':>7} {'p50, ms':>9} {'p90, ms':>9} "
+          f"{'p99, ms':>9} {'max, ms':>9} {'queue p99':>10}")
+    rows = list(results["scenarios"].items()) + [("total", results["total"])]
+    for name, stats in rows:
+        latency = stats["latency_ms"]
+        queue = stats["queue_ms"].get("p99")
+        print(f"{name:18} {stats['requests']:6} {stats['throughput'] or 0:7.2f} {stats['error_rate'] * 100:7.2f} "
+              f"{latency.get('p50', 0):9.1f} {latency.get('p90', 0):9.1f} {latency.get('p99', 0):9.1f} "
+              f"{latency.get('max', 0):9.1f} {'-' if queue is None else f'{queue:.1f}':>10}")
+    if results["total"]["errors"]:
+        print("Ошибки:", ", ".join(f"{k}: {v}" for k, v in results["total"]["errors"].items()))
+    resources = results.get("server")
+    if resources:
+        print(f"Сервер: CPU {resources['cpu_seconds']:.1f} с ({resources['cpu_cores']:.2f} ядра), "
+              f"RSS в среднем {resources['rss_mb_mean']:.0f} МБ, максимум {resources['rss_mb_max']:.0f} МБ, "
+              f"процессов до {resources['processes_max']}")
+
+
+def compare(before: Path, after: Path) -> None:
+    """Сравнение двух сохранённых результатов по видам запросов"""
+    old, new = json.loads(before.read_text()), json.loads(after.read_text())
+    print(f"{'scenario':18} {'rps':>17} {'p50, ms':>19} {'p99, ms':>19} {'err, %':>15}")
+    names = sorted(set(old["scenarios"]) & set(new["scenarios"])) + ["total"]
+    for name in names:
+        a = old["total"] if name == "total" else old["scenarios"][name]
+        b = new["total"] if name == "total" else new["scenarios"][name]
+        print(f"{name:18} {a['throughput'] or 0:8.2f}->{b['throughput'] or 0:<8.2f} "
+              f"{a['latency_ms'].get('p50', 0):9.1f}->{b['latency_ms'].get('p50', 0):<9.1f} "
+              f"{a['latency_ms'].get('p99', 0):9.1f}->{b['latency_ms'].get('p99', 0):<9.1f} "
+              f"{a['error_rate'] * 100:6.2f}->{b['error_rate'] * 100:<6.2f}")
+    for label, data in (("до", old), ("после", new)):
+        server = data.get("server")
+        if server:
+            print(f"Сервер {label}: {server['cpu_cores']:.2f} ядра, RSS до {server['rss_mb_max']:.0f} МБ")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=("uvicorn", "inprocess"), default="uvicorn",
+                        help="Как запускать сервер: процесс main.py или uvicorn в этом процессе")
+    parser.add_argument("--url", help="Адрес уже запущенного сервера, без запуска своего")
+    parser.add_argument("--server-pid", type=int, help="PID сервера по --url для замера CPU/RSS")
+    parser.add_argument("--port", type=int, help="Порт локального сервера, по умолчанию свободный")
+    parser.add_argument("--web-workers", type=int, default=1, help="WEB_WORKERS локального сервера")
+    parser.add_argument("--compute-workers", type=int, help="COMPUTE_WORKERS локального сервера")
+    parser.add_argument("--mix", default="small=4,medium=2,large=1",
+                        help='Смесь запросов "линза[:вид]=вес,..."')
+    parser.add_argument("--workload", type=Path, help="Смесь запросов из JSON-файла вместо --mix")
+    parser.add_argument("--unique", action="store_true", help="Обходить кэши: каждый запрос - новая линза")
+    parser.add_argument("--concurrency", type=int, default=4, help="Число одновременных клиентов")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность нагрузки, секунды")
+    parser.add_argument("--requests", type=int, help="Число запросов вместо --duration")
+    parser.add_argument("--timeout", type=float, default=120, help="Таймаут запроса, секунды")
+    parser.add_argument("--startup-timeout", type=float, default=120, help="Ожидание готовности сервера, секунды")
+    parser.add_argument("--seed", type=int, default=0, help="Начальное значение выбора запросов смеси")
+    parser.add_argument("--label", help="Метка запуска в JSON (например, название стенда)")
+    parser.add_argument("--json", type=Path, help="Сохранить результаты в JSON")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Сравнить два сохранённых результата")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    scenarios = load_workload(args.workload, args.unique) if args.workload else parse_mix(args.mix, args.unique)
+    server = None if args.url else LocalServer(args.server, args.web_workers, args.compute_workers, args.port)
+    url = args.url or server.url
+    pid = server.pid if server is not None else args.server_pid
+    sampler = None
+    try:
+        if server is not None:
+            server.start()
+            pid = server.pid
+        startup = wait_ready(url, server, args.startup_timeout)
+        print(f"Сервер {url} готов за {startup:.1f} с")
+
+        generator = LoadGenerator(url, scenarios, args.concurrency, None if args.requests else args.duration,
+                                  args.requests, args.timeout, args.seed)
+        if pid is not None and Path("/proc").is_dir():
+            sampler = ResourceSampler(pid)
+            sampler.start()
+        elapsed = generator.run()
+        results = report(generator.records, elapsed)
+        if sampler is not None:
+            results["server"] = sampler.stop()
+    finally:
+        if server is not None:
+            server.stop(sampler.pids if sampler is not None else set())
+
+    results = {
+        "label": args.label,
+        "config": {
+            "url": args.url,
+            "server": None if args.url else args.server,
+            "web_workers": None if args.url else args.web_workers,
+            "compute_workers": args.compute_workers,
+            "concurrency": args.concurrency,
+            "duration": None if args.requests else args.duration,
+            "requests": args.requests,
+            "unique": args.unique,
+            "scenarios": [{"name": s.name, "weight": s.weight, "path": s.path} for s in scenarios],
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "startup_seconds": round(startup, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        **results,
+    }
+    print_report(results)
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=1))
+    return 1 if results["total"]["requests"] == 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
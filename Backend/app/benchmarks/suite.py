@@ -0,0 +1,218 @@
+"""
+Бенчмарк и проверка численной регрессии пакета GreenTensor
+
+Запуск из каталога Backend/app:
+    python -m benchmarks.suite                  # полная матрица
+    python -m benchmarks.suite --quick          # только малые линзы
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --update-golden  # после намеренного изменения физики
+
+Матрица: radiusRatio x layers_count x размер сетки углов. Для каждого
+случая записывается время стадий LensCalculator (с холодным кэшем углового
+базиса, лучший из --repeat запусков), время рендеринга обоих графиков,
+пиковая память numpy (tracemalloc), число рассчитанных таблиц
+Риккати-Бесселя и вычисленных в них значений (порядки x новые столбцы
+аргументов).
+
+DN_NORM сравнивается с эталоном benchmarks/golden.npz по амплитуде
+10^(DN/20): глубокие нули диаграммы в дБ плохо обусловлены. Сравнение с
+базовой линией падает, если время выросло больше чем на --slowdown (и
+больше чем на 2 мс), память - больше чем на 10 % и 1 МБ, или выросло
+число вычисленных значений функций Риккати-Бесселя. Код возврата 1 - есть регрессия.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import matplotlib
+from GreenTensor.AngularBasis import AngularBasis
+from GreenTensor.AngularGrid import AngularGrid
+from GreenTensor.Constants import TETA_START, TETA_STOP
+from GreenTensor.Lens import Lens
+from GreenTensor.LensCalculator import LensCalculator
+from GreenTensor.LensPattern import LensPattern
+from GreenTensor.LensPlotCreator import LensPlotCreator
+from GreenTensor.RiccatiBessel import RiccatiBesselTable
+
+GOLDEN_PATH = Path(__file__).with_name("golden.npz")
+# Эталоны хранятся только для сеток до GOLDEN_MAX_ANGLES углов
+GOLDEN_MAX_ANGLES = 4000
+GOLDEN_TOLERANCE = 1e-7
+
+RADII = (1, 10, 30, 100)
+QUICK_RADII = (1, 10)
+# Шаг сетки в градусах: 359, 3599 и 35999 углов
+STEPS = (1, 0.1, 0.01)
+QUICK_STEPS = (1,)
+LAYERS = {
+    1: ([1], [2.0], [1.0]),
+    3: ([0.5, 0.8, 1], [1.9, 1.5, 1.0], [1.0, 1.0, 1.0]),
+    5: ([0.2, 0.4, 0.6, 0.8, 1], [1.96, 1.84, 1.64, 1.36, 1.0], [1.0] * 5),
+}
+
+
+def case_name(radius: int, layers: int, grid: AngularGrid) -> str:
+    return f"r{radius}_l{layers}_a{len(grid)}"
+
+
+def cases(quick: bool) -> list[tuple[str, Lens, AngularGrid]]:
+    result = []
+    for radius, layers, step in itertools.product(
+            QUICK_RADII if quick else RADII, LAYERS, QUICK_STEPS if quick else STEPS):
+        grid = AngularGrid.uniform(TETA_START, TETA_STOP, step)
+        lens = Lens(radius, layers, *LAYERS[layers])
+        result.append((case_name(radius, layers, grid), lens, grid))
+    return result
+
+
+@contextmanager
+def count_riccati_values():
+    """Подсчёт расчётов столбцов RiccatiBesselTable и числа вычисленных значений"""
+    counts = {"calls": 0, "evaluations": 0}
+    original = RiccatiBesselTable._RiccatiBesselTable__compute
+
+    def counting(table: RiccatiBesselTable, mask: np.ndarray) -> None:
+        counts["calls"] += 1
+        # Рекурсии идут по порядкам 0..Orders+1
+        counts["evaluations"] += (table.Orders + 2) * int(np.count_nonzero(mask))
+        original(table, mask)
+
+    RiccatiBesselTable._RiccatiBesselTable__compute = counting
+    try:
+        yield counts
+    finally:
+        RiccatiBesselTable._RiccatiBesselTable__compute = original
+
+
+def run_case(lens: Lens, grid: AngularGrid, repeat: int) -> tuple[dict, np.ndarray]:
+    """Замеры одного случая и его DN_NORM"""
+    best = None
+    for _ in range(repeat):
+        AngularBasis.cache_clear()
+        calc = LensCalculator(lens, grid)
+        started = time.perf_counter()
+        calc.DN_NORM
+        total = time.perf_counter() - started
+        if best is None or total < best[0]:
+            best = (total, calc.stage_timings(), calc)
+    total, stages, calc = best
+
+    pattern = LensPattern.from_calculator(calc)
+    started = time.perf_counter()
+    LensPlotCreator.render(pattern, "both", image_format="png")
+    render = time.perf_counter() - started
+
+    AngularBasis.cache_clear()
+    with count_riccati_values() as riccati:
+        tracemalloc.start()
+        LensCalculator(lens, grid).DN_NORM
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = {
+        "accuracy": lens.Accuracy,
+        "angles": len(grid),
+        "total": total,
+        "stages": stages,
+        "render": render,
+        "peak_mb": peak / 2**20,
+        "riccati_calls": riccati["calls"],
+        "riccati_evaluations": riccati["evaluations"],
+    }
+    return result, calc.DN_NORM
+
+
+def golden_error(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Наибольшее расхождение нормированных амплитуд 10^(DN/20)"""
+    if expected.shape != actual.shape:
+        return float("inf")
+    with np.errstate(over="ignore", invalid="ignore"):
+        diff = np.abs(10 ** (expected / 20) - 10 ** (actual / 20))
+    return float(np.max(np.where(np.isfinite(diff), diff, np.inf)))
+
+
+def compare_baseline(results: dict, baseline: dict, slowdown: float) -> list[str]:
+    """Регрессии относительно сохранённой базовой линии"""
+    regressions = []
+    for name, case in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if case["total"] > base["total"] * (1 + slowdown) and case["total"] - base["total"] > 0.002:
+            regressions.append(f"{name}: время {base['total'] * 1000:.1f} -> {case['total'] * 1000:.1f} мс")
+        if case["peak_mb"] > base["peak_mb"] * 1.1 + 1:
+            regressions.append(f"{name}: память {base['peak_mb']:.1f} -> {case['peak_mb']:.1f} МБ")
+        if case["riccati_evaluations"] > base.get("riccati_evaluations", case["riccati_evaluations"]):
+            regressions.append(
+                f"{name}: значений Риккати-Бесселя {base['riccati_evaluations']} -> {case['riccati_evaluations']}")
+    return regressions
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Только малые линзы и сетка по умолчанию")
+    parser.add_argument("--repeat", type=int, default=3, help="Число запусков для замера времени")
+    parser.add_argument("--json", type=Path, help="Сохранить результаты в JSON")
+    parser.add_argument("--baseline", type=Path, help="Сравнить с базовой линией")
+    parser.add_argument("--save-baseline", type=Path, help="Сохранить результаты как базовую линию")
+    parser.add_argument("--slowdown", type=float, default=0.25, help="Допустимое относительное замедление")
+    parser.add_argument("--update-golden", action="store_true", help="Перезаписать эталонные DN_NORM")
+    args = parser.parse_args()
+
+    golden = dict(np.load(GOLDEN_PATH)) if GOLDEN_PATH.exists() and not args.update_golden else {}
+    new_golden = {}
+    results = {}
+    failures = []
+
+    print(f"{'case':20} {'acc':>5} {'total, ms':>10} {'render, ms':>11} {'peak, MB':>9} "
+          f"{'riccati':>9} {'golden':>8}  slowest stages")
+    for name, lens, grid in cases(args.quick):
+        case, dn_norm = run_case(lens, grid, args.repeat)
+        if len(grid) <= GOLDEN_MAX_ANGLES:
+            new_golden[name] = dn_norm
+            if name in golden:
+                case["golden_error"] = golden_error(golden[name], dn_norm)
+                if case["golden_error"] > GOLDEN_TOLERANCE:
+                    failures.append(f"{name}: DN_NORM отличается от эталона на {case['golden_error']:.2e}")
+        results[name] = case
+
+        slowest = sorted(case["stages"].items(), key=lambda item: -item[1])[:3]
+        stages = ", ".join(f"{stage} {seconds * 1000:.1f}" for stage, seconds in slowest)
+        error = f"{case['golden_error']:.0e}" if "golden_error" in case else "-"
+        print(f"{name:20} {case['accuracy']:5} {case['total'] * 1000:10.1f} {case['render'] * 1000:11.1f} "
+              f"{case['peak_mb']:9.1f} {case['riccati_evaluations']:9} {error:>8}  {stages}")
+
+    report = {"environment": environment(), "cases": results}
+    for path in (args.json, args.save_baseline):
+        if path is not None:
+            path.write_text(json.dumps(report, indent=1))
+    if args.update_golden:
+        np.savez_compressed(GOLDEN_PATH, **new_golden)
+        print(f"Эталоны записаны в {GOLDEN_PATH}")
+
+    if args.baseline is not None:
+        failures += compare_baseline(results, json.loads(args.baseline.read_text())["cases"], args.slowdown)
+
+    for failure in failures:
+        print("РЕГРЕССИЯ:", failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
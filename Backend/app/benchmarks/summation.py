@@ -0,0 +1,67 @@
+"""
+Сравнение способов суммирования диаграммы по порядкам
+
+Запуск из каталога Backend/app:
+    python -m benchmarks.summation [--step 0.01] [--radius 30]
+
+Для каждого способа выводится время и пиковый объём памяти numpy
+(tracemalloc) при расчёте P_teta по готовым коэффициентам Mn/Nn:
+    full    - матрица вкладов E_teta (Accuracy, angles), как раньше;
+    cached  - сумма в один вектор по кэшированному базису;
+    chunked - сумма в один вектор по блокам базиса без его хранения.
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from GreenTensor import Constants
+from GreenTensor import LensCalculator as calculator_module
+from GreenTensor.AngularBasis import AngularBasis
+from GreenTensor.AngularGrid import AngularGrid
+from GreenTensor.Lens import Lens
+from GreenTensor.LensCalculator import LensCalculator
+
+
+def measure(lens: Lens, grid: AngularGrid, mode: str) -> tuple[float, float, np.ndarray]:
+    """Время (с), пиковая память (МБ) и P_teta для способа mode"""
+    AngularBasis.cache_clear()
+    # Коэффициенты Mn/Nn считаются заранее и в замер не входят
+    base = LensCalculator(lens, grid)
+    base.Mn
+    calc = base.derive()
+    calculator_module.BASIS_MAX_ELEMENTS = 0 if mode == "chunked" else np.iinfo(np.int64).max
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    if mode == "full":
+        p_teta = np.abs(calc.E_teta.sum(axis=0))
+    else:
+        p_teta = calc.P_teta
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    calculator_module.BASIS_MAX_ELEMENTS = Constants.BASIS_MAX_ELEMENTS
+    return elapsed, peak, p_teta
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--step", type=float, default=0.01, help="Шаг сетки углов в градусах")
+    parser.add_argument("--radius", type=int, default=30, help="Отношение радиуса линзы к длине волны")
+    args = parser.parse_args()
+
+    lens = Lens(args.radius, 5, [0.2, 0.4, 0.6, 0.8, 1.0], [2, 1.8, 1.6, 1.4, 1.2], [1] * 5)
+    grid = AngularGrid.uniform(Constants.TETA_START, Constants.TETA_STOP, args.step)
+    print(f"Accuracy={lens.Accuracy} angles={len(grid)}")
+
+    reference = None
+    for mode in ("full", "cached", "chunked"):
+        elapsed, peak, p_teta = measure(lens, grid, mode)
+        if reference is None:
+            reference = p_teta
+        error = np.abs(p_teta - reference).max() / reference.max()
+        print(f"{mode:8} {elapsed * 1000:9.1f} ms {peak:9.1f} MB  rel.err {error:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+
+def _initialize_worker() -> None:
+    """Прогрев воркера; при запуске через forkserver модуль уже загружен в сервере"""
+    import worker_preload  # noqa: F401
+
+
+class PoolOverloaded(Exception):
+    """Очередь пула заполнена, запрос нужно повторить через retry_after секунд"""
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"Очередь расчётов '{lane}' заполнена")
+        self.retry_after = retry_after
+
+
+class PoolTimeout(Exception):
+    """Расчёт не уложился в отведённое время"""
+
+
+class ComputeLane:
+    """
+    Пул процессов с ограниченной очередью
+
+    Число принятых, но не завершённых задач не превышает workers + queue_size,
+    лишние отклоняются сразу, без ожидания. Задача считается незавершённой,
+    пока её выполняет воркер: после таймаута или отключения клиента
+    запущенный расчёт продолжает занимать воркер, и полоса это учитывает.
+
+    Таймаут timeout отсчитывается от постановки задачи в очередь, то есть
+    включает ожидание свободного воркера.
+
+    Если воркер аварийно завершился (BrokenProcessPool), пул закрывается и
+    следующий вызов создаёт новый. Полоса считается сломанной, пока задача
+    в новом пуле не выполнится.
+    """
+    def __init__(self, name: str, workers: int, queue_size: int, timeout: float):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight = 0
+        # Счётчик меняется и в потоке пула, завершающем задачи
+        self._lock = threading.Lock()
+        # Сглаженная длительность задачи для оценки Retry-After
+        self._avg_duration = 1.0
+        self._broken = False
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            method = os.getenv("COMPUTE_START_METHOD", "forkserver")
+            context = multiprocessing.get_context(method)
+            if method == "forkserver":
+                # Воркеры порождаются от сервера с уже загруженными и прогретыми модулями
+                context.set_forkserver_preload(["worker_preload"])
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context, initializer=_initialize_worker)
+        return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Закрытие сломанного пула; следующий вызов создаст новый"""
+        with self._lock:
+            self._broken = True
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def broken(self) -> bool:
+        """Воркер пула аварийно завершился, и новый пул ещё не выполнил ни одной задачи"""
+        return self._broken
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._avg_duration * (self._in_flight + 1) / self.workers))
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                raise PoolOverloaded(self.name, self.retry_after())
+            self._in_flight += 1
+
+        started = time.monotonic()
+        try:
+            executor = self._get_executor()
+            future = executor.submit(fn, *args)
+        except BaseException as e:
+            with self._lock:
+                self._in_flight -= 1
+            if isinstance(e, BrokenProcessPool):
+                self._discard(executor)
+            raise
+        future.add_done_callback(lambda f: self._finished(f, started))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+        except asyncio.TimeoutError:
+            # Задача из очереди снимается; уже запущенную остановить нельзя,
+            # её результат будет отброшен
+            future.cancel()
+            raise PoolTimeout(f"Расчёт не завершился за {self.timeout:g} с")
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def _finished(self, future: Future, started: float) -> None:
+        """Задача снята из очереди или выполнена воркером"""
+        with self._lock:
+            self._in_flight -= 1
+            if not future.cancelled():
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
+                if not isinstance(future.exception(), BrokenProcessPool):
+                    self._broken = False
+
+    async def warm_up(self, fn: Callable[[], Any]) -> None:
+        """Запуск всех воркеров полосы с вызовом fn() в каждом"""
+        executor = self._get_executor()
+        try:
+            await asyncio.gather(*(asyncio.wrap_future(executor.submit(fn)) for _ in range(self.workers)))
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+        self._broken = False
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class ComputePool:
+    """
+    Выполнение расчётов вне цикла событий
+
+    Лёгкие задачи (стоимость Accuracy * число углов не больше small_cost)
+    идут в отдельную полосу, чтобы тяжёлые задачи не задерживали их.
+    Фоновые задачи (см. jobs) выполняются в своей полосе с отдельным
+    таймаутом и не занимают воркеры синхронных запросов.
+    При workers = 0 расчёт выполняется прямо в цикле событий, а фоновые
+    задачи - в отдельном потоке.
+    """
+    def __init__(
+        self,
+        workers: int,
+        fast_workers: int,
+        queue_size: int,
+        timeout: float,
+        small_cost: int,
+        job_workers: int = 1,
+        job_timeout: float = 3600
+    ):
+        self.small_cost = small_cost
+        self.heavy = ComputeLane("heavy", workers, queue_size, timeout) if workers > 0 else None
+        self.fast = ComputeLane("fast", fast_workers, queue_size, timeout) if workers > 0 and fast_workers > 0 else None
+        self.job_workers = job_workers
+        self.jobs = ComputeLane("jobs", job_workers, 0, job_timeout) if workers > 0 else None
+
+    @classmethod
+    def from_env(cls) -> "ComputePool":
+        return cls(
+            workers=int(os.getenv("COMPUTE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1)))),
+            fast_workers=int(os.getenv("COMPUTE_FAST_WORKERS", "1")),
+            queue_size=int(os.getenv("COMPUTE_QUEUE_SIZE", "16")),
+            timeout=float(os.getenv("COMPUTE_TIMEOUT", "60")),
+            small_cost=int(os.getenv("COMPUTE_SMALL_COST", str(64 * 360))),
+            job_workers=int(os.getenv("JOB_WORKERS", "1")),
+            job_timeout=float(os.getenv("JOB_TIMEOUT", "3600"))
+        )
+
+    @property
+    def parallelism(self) -> int:
+        """Число задач, которые имеет смысл выполнять одновременно"""
+        return self.heavy.workers if self.heavy is not None else 1
+
+    async def run(self, cost: int, fn: Callable[..., Any], *args) -> Any:
+        """
+        Выполнение fn(*args) в подходящей полосе
+
+        :param cost: Оценка стоимости задачи
+        :raises PoolOverloaded: Очередь полосы заполнена
+        :raises PoolTimeout: Задача не уложилась в таймаут
+        """
+        if self.heavy is None:
+            return fn(*args)
+        lane = self.fast if self.fast is not None and cost <= self.small_cost else self.heavy
+        return await lane.run(fn, *args)
+
+    async def run_job(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Выполнение фоновой задачи fn(*args) в полосе jobs
+
+        Вызывающий не запускает больше job_workers задач одновременно.
+
+        :raises PoolTimeout: Задача не уложилась в таймаут JOB_TIMEOUT
+        """
+        if self.jobs is None:
+            return await asyncio.to_thread(fn, *args)
+        return await self.jobs.run(fn, *args)
+
+    async def warm_up(self, fn: Callable[[], Any]) -> None:
+        """
+        Запуск воркеров всех полос заранее, до первого запроса
+
+        :param fn: Функция прогрева; без пула выполняется в отдельном потоке
+        """
+        if self.heavy is None:
+            await asyncio.to_thread(fn)
+            return
+        await asyncio.gather(*(lane.warm_up(fn) for lane in (self.fast, self.heavy, self.jobs) if lane is not None))
+
+    @property
+    def broken(self) -> list[str]:
+        """Имена полос, пул которых сломан, см. ComputeLane.broken"""
+        return [lane.name for lane in (self.fast, self.heavy, self.jobs) if lane is not None and lane.broken]
+
+    async def recover(self, fn: Callable[[], Any]) -> None:
+        """
+        Пересоздание и прогрев пулов сломанных полос
+
+        :param fn: Функция прогрева, см. warm_up
+        """
+        await asyncio.gather(*(lane.warm_up(fn) for lane in (self.fast, self.heavy, self.jobs)
+                               if lane is not None and lane.broken))
+
+    def shutdown(self) -> None:
+        for lane in (self.fast, self.heavy, self.jobs):
+            if lane is not None:
+                lane.shutdown()
+
+
+pool = ComputePool.from_env()
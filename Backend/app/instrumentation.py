@@ -0,0 +1,213 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Optional, Sequence
+import bisect
+import cProfile
+import os
+import re
+import threading
+import time
+import uuid
+
+
+# Сбор времени этапов можно отключить целиком, METRICS_ENABLED=0
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Каталог для профилей cProfile отдельных запросов; без него профилирование запрещено
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ACCURACY_BUCKETS = (16, 64, 256, 1024)
+ANGLES_BUCKETS = (512, 4096, 32768)
+
+
+class Timings:
+    """
+    Время этапов одного запроса в порядке их завершения, секунды
+
+    Передаётся из процесса пула обратно вместе с результатом расчёта.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.profile: Optional[str] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        if ENABLED:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def update(self, stages: dict[str, float]) -> None:
+        for name, seconds in stages.items():
+            self.add(name, seconds)
+
+    def merge(self, other: "Timings") -> None:
+        self.update(other.stages)
+        self.profile = self.profile or other.profile
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    @property
+    def total(self) -> float:
+        """Сумма времени этапов"""
+        return sum(self.stages.values())
+
+    def elapsed(self) -> float:
+        """Время с создания"""
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing с этапами и полным временем, в миллисекундах"""
+        items = []
+        for name, seconds in [*self.stages.items(), ("total", self.elapsed())]:
+            token = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+            desc = f';desc="{name}"' if token != name else ""
+            items.append(f"{token}{desc};dur={seconds * 1000:.2f}")
+        return ", ".join(items)
+
+    def headers(self) -> dict[str, str]:
+        """Заголовки ответа: Server-Timing и имя файла профиля, если он записан"""
+        if not ENABLED:
+            return {}
+        headers = {"Server-Timing": self.server_timing()}
+        if self.profile is not None:
+            headers["X-Profile-File"] = self.profile
+        return headers
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+
+
+def record_all(stages: dict[str, float]) -> None:
+    """Добавление времени этапов к текущему запросу, если он замеряется"""
+    timings = _current.get()
+    if timings is not None:
+        timings.update(stages)
+
+
+@contextmanager
+def stage(name: str):
+    """Замер этапа текущего запроса"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.stage(name):
+        yield
+
+
+def timed_call(profile: bool, fn: Callable[..., Any], *args) -> tuple[Any, Timings]:
+    """
+    Вызов fn(*args) с замером этапов, выполняется в процессе пула
+
+    :param profile: Записать профиль cProfile в PROFILE_DIR
+    :return: Результат fn и время его этапов
+    """
+    timings = Timings()
+    token = _current.set(timings)
+    profiler = cProfile.Profile() if profile and PROFILE_DIR else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        result = fn(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{fn.__name__}-{uuid.uuid4().hex[:8]}.prof"
+            profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+            timings.profile = name
+        _current.reset(token)
+    return result, timings
+
+
+def size_bucket(value: int, bounds: Sequence[int]) -> str:
+    """Верхняя граница интервала размера для метки метрики"""
+    index = bisect.bisect_left(bounds, value)
+    return str(bounds[index]) if index < len(bounds) else "+Inf"
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus с произвольными метками"""
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float] = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Sequence[str], value: float) -> None:
+        key = tuple(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(key, (list(counts), total, count)) for key, (counts, total, count) in series]
+        for key, (counts, total, count) in series:
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket{{{labels},le="{bound:g}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{labels},le="+Inf"}} {count}'
+            yield f"{self.name}_sum{{{labels}}} {total:.6f}"
+            yield f"{self.name}_count{{{labels}}} {count}"
+
+
+stage_seconds = Histogram(
+    "greentensor_stage_seconds",
+    "Время этапов расчёта и рендеринга",
+    ("stage", "accuracy", "angles"))
+
+request_seconds = Histogram(
+    "greentensor_request_seconds",
+    "Полное время обработки запроса",
+    ("endpoint",))
+
+
+def observe(endpoint: str, timings: Timings, accuracy: int, angles: int) -> None:
+    """Запись времени этапов и запроса в гистограммы"""
+    if not ENABLED:
+        return
+    accuracy_label = size_bucket(accuracy, ACCURACY_BUCKETS)
+    angles_label = size_bucket(angles, ANGLES_BUCKETS)
+    for name, seconds in timings.stages.items():
+        stage_seconds.observe((name, accuracy_label, angles_label), seconds)
+    request_seconds.observe((endpoint,), timings.elapsed())
+
+
+def render_metrics(
+    gauges: dict[str, tuple[str, dict[tuple[tuple[str, str], ...], float]]],
+    counters: Optional[dict[str, tuple[str, dict[tuple[tuple[str, str], ...], float]]]] = None
+) -> str:
+    """
+    Текст метрик для /api/metrics
+
+    :param gauges: Имя -> (описание, значения по наборам меток)
+    :param counters: То же для монотонно растущих счётчиков; имена с суффиксом _total
+    """
+    lines = [*stage_seconds.render(), *request_seconds.render()]
+    metrics = [(name, "gauge", metric) for name, metric in gauges.items()]
+    metrics += [(name, "counter", metric) for name, metric in (counters or {}).items()]
+    for name, kind, (help, values) in metrics:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in values.items():
+            text = ",".join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f"{name}{{{text}}} {value:g}" if text else f"{name} {value:g}")
+    return "\n".join(lines) + "\n"
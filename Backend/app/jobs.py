@@ -0,0 +1,438 @@
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from compute_pool import PoolOverloaded
+
+# Статусы задачи; DONE, FAILED и CANCELLED - конечные
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+STATUSES = (QUEUED, RUNNING, DONE, FAILED, CANCELLED)
+
+# Retry-After при заполненной очереди, секунды
+QUEUE_RETRY_AFTER = 10
+
+
+class JobCancelled(Exception):
+    """Задача отменена во время выполнения"""
+
+
+def _process_id(pid: int) -> Optional[str]:
+    """
+    Идентификатор выполняющегося процесса pid
+
+    В Linux к pid добавляется время запуска процесса из /proc, так что
+    процесс, получивший номер завершившегося, не считается им.
+
+    :return: None, если процесса нет
+    """
+    if os.path.exists("/proc/self/stat"):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                return f"{pid}:{f.read().rsplit(')', 1)[1].split()[19]}"
+        except FileNotFoundError:
+            return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass
+    return str(pid)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(path, exist_ok=True)
+    connection = sqlite3.connect(
+        os.path.join(path, "jobs.sqlite"), timeout=10, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class JobQueue:
+    """
+    Очередь фоновых расчётов в SQLite, общая для процессов сервера и перезапусков
+
+    Задача проходит статусы queued -> running -> done | failed | cancelled.
+    Параметры хранятся в JSON, результат - в отдельном файле рядом с
+    индексом. Процессы сервера забирают задачи из очереди атомарно
+    (см. claim), записывая себя владельцем, и раз в несколько секунд
+    отмечают свои выполняющиеся задачи. Задача, отметка которой устарела
+    больше чем на stale_after секунд, возвращается в очередь, только если
+    процесса-владельца больше нет (упал или перезапущен): процесс, цикл
+    событий которого надолго занят, ещё выполняет задачу, и второй раз
+    она не запускается. Очередь общая для процессов одной машины - SQLite
+    в режиме WAL не работает через сетевые файловые системы.
+
+    Ход выполнения - число просуммированных порядков ряда из Accuracy -
+    записывает сам воркер пула (см. JobProgress), он же прерывает задачу,
+    если запрошена отмена. Отмена срабатывает между стадиями расчёта,
+    между блоками суммирования ряда и перед рендерингом; начатая стадия
+    (например, таблица Риккати-Бесселя большой линзы) досчитывается.
+    Завершённые задачи и их результаты хранятся ttl секунд.
+    """
+    def __init__(self, path: str, ttl: float, max_queued: int, stale_after: float = 30):
+        """
+        :param path: Каталог очереди, создаётся при первом обращении
+        :param ttl: Время хранения завершённых задач, секунды
+        :param max_queued: Наибольшее число задач в очереди
+        :param stale_after: Время без отметки, после которого проверяется, жив ли владелец задачи, секунды
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_queued = max_queued
+        self.stale_after = stale_after
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._owner: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        return cls(
+            path=os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "greentensor-jobs")),
+            ttl=float(os.getenv("JOB_TTL", "3600")),
+            max_queued=int(os.getenv("JOBS_MAX_QUEUED", "100"))
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        # Соединение SQLite нельзя использовать после fork, поэтому каждый
+        # процесс открывает своё
+        if self._connection is None or self._pid != os.getpid():
+            connection = _connect(self.path)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+                "created REAL NOT NULL, started REAL, finished REAL, expires REAL, heartbeat REAL, "
+                "orders_done INTEGER NOT NULL DEFAULT 0, orders_total INTEGER NOT NULL, "
+                "cancel INTEGER NOT NULL DEFAULT 0, error TEXT, result TEXT, file TEXT, owner TEXT)")
+            if "owner" not in [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]:
+                # Очередь, созданная до появления владельца задач
+                connection.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            connection.row_factory = sqlite3.Row
+            self._connection = connection
+            self._pid = os.getpid()
+            self._owner = _process_id(self._pid)
+        return self._connection
+
+    def __transaction(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    @staticmethod
+    def __describe(row: sqlite3.Row) -> dict[str, Any]:
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "created": row["created"],
+            "started": row["started"],
+            "finished": row["finished"],
+            "expires": row["expires"],
+            "progress": {"orders_done": row["orders_done"], "orders_total": row["orders_total"]},
+            "cancel_requested": bool(row["cancel"]) and row["status"] == RUNNING,
+            "error": json.loads(row["error"]) if row["error"] else None
+        }
+
+    def __row(self, job_id: str) -> Optional[sqlite3.Row]:
+        return self._db().execute("SELECT * FROM jobs WHERE id = ? AND (expires IS NULL OR expires > ?)",
+                                  (job_id, time.time())).fetchone()
+
+    def submit(self, params: dict[str, Any], orders_total: int) -> dict[str, Any]:
+        """
+        Постановка задачи в очередь
+
+        :param params: Параметры расчёта, сериализуемые в JSON
+        :param orders_total: Ожидаемое число порядков ряда
+        :raises PoolOverloaded: В очереди уже max_queued задач
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            def insert(db: sqlite3.Connection) -> None:
+                queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if queued >= self.max_queued:
+                    raise PoolOverloaded("jobs", QUEUE_RETRY_AFTER)
+                db.execute("INSERT INTO jobs (id, status, params, created, orders_total) VALUES (?, ?, ?, ?, ?)",
+                           (job_id, QUEUED, json.dumps(params), time.time(), orders_total))
+            self.__transaction(insert)
+            return self.__describe(self.__row(job_id))
+
+    def get(self, job_id: str) -> Optional[dict[str, Any]]:
+        """Состояние задачи; None, если её нет или срок хранения истёк"""
+        with self._lock:
+            row = self.__row(job_id)
+            return self.__describe(row) if row is not None else None
+
+    def claim(self) -> Optional[tuple[str, dict[str, Any]]]:
+        """
+        Взять самую старую задачу из очереди на выполнение
+
+        :return: Идентификатор и параметры задачи или None, если очередь пуста
+        """
+        with self._lock:
+            def take(db: sqlite3.Connection) -> Optional[tuple[str, dict[str, Any]]]:
+                row = db.execute("SELECT id, params FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                                 (QUEUED,)).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                db.execute("UPDATE jobs SET status = ?, started = ?, heartbeat = ?, owner = ? WHERE id = ?",
+                           (RUNNING, now, now, self._owner, row[0]))
+                return row[0], json.loads(row[1])
+            return self.__transaction(take)
+
+    def heartbeat(self, job_ids: list[str]) -> None:
+        """
+        Отметка выполняющихся в этом процессе задач и возврат в очередь брошенных
+
+        Брошенная задача - с устаревшей отметкой, владелец которой завершился
+        или которая принадлежит этому процессу, но не входит в job_ids.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.executemany("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = ?",
+                           [(now, job_id, RUNNING) for job_id in job_ids])
+            stale = db.execute("SELECT id, owner, cancel FROM jobs WHERE status = ? AND heartbeat < ?",
+                               (RUNNING, now - self.stale_after)).fetchall()
+            for job_id, owner, cancel in stale:
+                if owner is not None and owner != self._owner and _process_id(int(owner.split(":")[0])) == owner:
+                    continue
+                if cancel:
+                    db.execute("UPDATE jobs SET status = ?, finished = ?, expires = ? WHERE id = ? AND status = ?",
+                               (CANCELLED, now, now + self.ttl, job_id, RUNNING))
+                else:
+                    db.execute("UPDATE jobs SET status = ?, started = NULL, orders_done = 0, owner = NULL "
+                               "WHERE id = ? AND status = ?", (QUEUED, job_id, RUNNING))
+
+    def finish(self, job_id: str, content: bytes, result: dict[str, Any]) -> None:
+        """
+        Сохранение результата выполненной задачи
+
+        :param content: Тело результата
+        :param result: Метаданные результата, сериализуемые в JSON
+        """
+        file = f"{job_id}.bin"
+        path = os.path.join(self.path, file)
+        with open(path + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+        now = time.time()
+        with self._lock:
+            updated = self._db().execute(
+                "UPDATE jobs SET status = ?, finished = ?, expires = ?, result = ?, file = ?, "
+                "orders_done = orders_total WHERE id = ? AND status = ?",
+                (DONE, now, now + self.ttl, json.dumps(result), file, job_id, RUNNING)).rowcount
+        if not updated:
+            # Задача удалена или отменена, пока считалась
+            os.unlink(path)
+
+    def fail(self, job_id: str, error: dict[str, Any]) -> None:
+        """Завершение задачи с ошибкой"""
+        self.__close(job_id, FAILED, error)
+
+    def cancelled(self, job_id: str) -> None:
+        """Завершение задачи, прерванной по запросу отмены"""
+        self.__close(job_id, CANCELLED)
+
+    def __close(self, job_id: str, status: str, error: Optional[dict[str, Any]] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, finished = ?, expires = ?, error = ? WHERE id = ? AND status = ?",
+                (status, now, now + self.ttl, json.dumps(error) if error else None, job_id, RUNNING))
+
+    def cancel(self, job_id: str) -> Optional[dict[str, Any]]:
+        """
+        Отмена или удаление задачи
+
+        Задача в очереди отменяется сразу. Выполняющаяся получает запрос
+        отмены и прерывается воркером при следующем отчёте о ходе
+        выполнения. Завершённая задача удаляется вместе с результатом.
+
+        :return: Состояние задачи после отмены или None, если её нет
+        """
+        with self._lock:
+            row = self.__row(job_id)
+            if row is None:
+                return None
+            db = self._db()
+            now = time.time()
+            if row["status"] == QUEUED:
+                db.execute("UPDATE jobs SET status = ?, finished = ?, expires = ? WHERE id = ? AND status = ?",
+                           (CANCELLED, now, now + self.ttl, job_id, QUEUED))
+            elif row["status"] == RUNNING:
+                db.execute("UPDATE jobs SET cancel = 1 WHERE id = ?", (job_id,))
+            else:
+                db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                self.__unlink(row["file"])
+                return self.__describe(row)
+            return self.__describe(self.__row(job_id))
+
+    def result(self, job_id: str) -> Optional[tuple[bytes, dict[str, Any]]]:
+        """Тело и метаданные результата выполненной задачи"""
+        with self._lock:
+            row = self.__row(job_id)
+        if row is None or row["status"] != DONE:
+            return None
+        try:
+            with open(os.path.join(self.path, row["file"]), "rb") as f:
+                return f.read(), json.loads(row["result"])
+        except FileNotFoundError:
+            return None
+
+    def purge(self) -> None:
+        """Удаление задач с истёкшим сроком хранения и их результатов"""
+        with self._lock:
+            db = self._db()
+            now = time.time()
+            files = [row[0] for row in db.execute(
+                "SELECT file FROM jobs WHERE expires <= ? AND file IS NOT NULL", (now,))]
+            db.execute("DELETE FROM jobs WHERE expires <= ?", (now,))
+        for file in files:
+            self.__unlink(file)
+
+    def __unlink(self, file: Optional[str]) -> None:
+        if file is not None:
+            try:
+                os.unlink(os.path.join(self.path, file))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict[str, int]:
+        """Число задач по статусам"""
+        with self._lock:
+            counts = dict(tuple(row) for row in self._db().execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE expires IS NULL OR expires > ? GROUP BY status",
+                (time.time(),)))
+        return {status: counts.get(status, 0) for status in STATUSES}
+
+
+class JobProgress:
+    """
+    Обработчик хода выполнения задачи в воркере пула
+
+    Записывает число просуммированных порядков в очередь не чаще раза в
+    interval секунд и бросает JobCancelled, если запрошена отмена. Объект
+    передаётся в воркер целиком, соединение SQLite открывается уже там.
+    """
+    def __init__(self, path: str, job_id: str, interval: float = 0.25):
+        self.path = path
+        self.job_id = job_id
+        self.interval = interval
+        self._connection: Optional[sqlite3.Connection] = None
+        self._last = 0.0
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {**self.__dict__, "_connection": None}
+
+    def __call__(self, done: int, total: int) -> None:
+        now = time.monotonic()
+        if done < total and now - self._last < self.interval:
+            return
+        self._last = now
+        if self._connection is None:
+            self._connection = _connect(self.path)
+        try:
+            self._connection.execute("UPDATE jobs SET orders_done = ?, orders_total = ? WHERE id = ?",
+                                     (done, total, self.job_id))
+            row = self._connection.execute("SELECT cancel FROM jobs WHERE id = ?", (self.job_id,)).fetchone()
+        except sqlite3.Error:
+            # Ход выполнения не важнее самого расчёта
+            return
+        if row is None or row[0]:
+            raise JobCancelled(f"Задача {self.job_id} отменена")
+
+
+class JobRunner:
+    """
+    Выполнение задач очереди в процессе сервера
+
+    Берёт задачи из очереди, пока их выполняется меньше slots, раз в poll
+    секунд или сразу по wake(). Результат задачи - тело и его метаданные -
+    возвращает run(id, параметры). Обращения к очереди выполняются в
+    потоке, чтобы ожидание блокировки SQLite не останавливало цикл событий.
+    """
+    def __init__(
+        self,
+        queue: JobQueue,
+        slots: int,
+        run: Callable[[str, dict[str, Any]], Awaitable[tuple[bytes, dict[str, Any]]]],
+        poll: float = 1.0
+    ):
+        self.queue = queue
+        self.slots = slots
+        self.run = run
+        self.poll = poll
+        self._running: dict[str, asyncio.Task] = {}
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.__loop())
+
+    def wake(self) -> None:
+        self._event.set()
+
+    def stop(self) -> None:
+        """Остановка без ожидания; незавершённые задачи вернутся в очередь после завершения процесса"""
+        for task in [self._task, *self._running.values()]:
+            if task is not None:
+                task.cancel()
+
+    async def __loop(self) -> None:
+        while True:
+            self._event.clear()
+            try:
+                claimed = await asyncio.to_thread(self.__maintain, list(self._running),
+                                                  self.slots - len(self._running))
+            except (OSError, sqlite3.Error):
+                # Задачи, взятые до ошибки, вернутся в очередь при следующей отметке
+                claimed = []
+            for job_id, params in claimed:
+                self._running[job_id] = asyncio.create_task(self.__execute(job_id, params))
+            try:
+                await asyncio.wait_for(self._event.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+
+    def __maintain(self, running: list[str], free: int) -> list[tuple[str, dict[str, Any]]]:
+        """Отметка задач, очистка очереди и взятие до free новых задач"""
+        self.queue.heartbeat(running)
+        self.queue.purge()
+        claimed = []
+        while len(claimed) < free and (job := self.queue.claim()) is not None:
+            claimed.append(job)
+        return claimed
+
+    async def __execute(self, job_id: str, params: dict[str, Any]) -> None:
+        try:
+            content, result = await self.run(job_id, params)
+        except JobCancelled:
+            await asyncio.to_thread(self.queue.cancelled, job_id)
+        except Exception as e:
+            await asyncio.to_thread(self.queue.fail, job_id, {"error": str(e), "type": type(e).__name__})
+        else:
+            await asyncio.to_thread(self.queue.finish, job_id, content, result)
+        finally:
+            self._running.pop(job_id, None)
+            self.wake()
+
+
+queue = JobQueue.from_env()
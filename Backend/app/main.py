@@ -1,8 +1,74 @@
 import os
+import signal
 
 import uvicorn
 
-from app import app
+# Число процессов веб-сервера; при WEB_WORKERS > 1 процессы порождаются fork
+# от общего родителя после импорта приложения и делят его страницы памяти
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+
+
+def serve_forked(config: uvicorn.Config, workers: int) -> None:
+    """
+    Запуск workers процессов uvicorn на общем сокете
+
+    Процессы порождаются fork уже после импорта приложения.
+    Упавший процесс перезапускается, SIGTERM и SIGINT передаются всем процессам.
+    """
+    sock = config.bind_socket()
+    children: set[int] = set()
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            uvicorn.Server(config).run(sockets=[sock])
+            os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            spawn()
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8080")), log_config=None)
\ No newline at end of file
+    if WEB_WORKERS > 1:
+        # Пул расчётов у каждого процесса свой: ядра делятся между ними
+        os.environ.setdefault("COMPUTE_WORKERS", str(max(1, ((os.cpu_count() or 2) - 1) // WEB_WORKERS)))
+
+    from app import app
+    import compute_pool
+    import pipeline
+
+    if WEB_WORKERS > 1 and compute_pool.pool.heavy is None:
+        # Без пула процессы сервера считают сами: прогрев до fork даёт им
+        # общие страницы памяти. Воркеры пулов порождаются forkserver, а не
+        # fork от процессов сервера, в которых уже работают потоки
+        # (asyncio.to_thread, запись хранилища результатов): fork процесса с
+        # потоками может зависнуть на захваченных ими блокировках
+        pipeline.warm_up()
+
+    config = uvicorn.Config(app, host="0.0.0.0", port=int(os.getenv("PORT", "8080")), log_config=None)
+    if WEB_WORKERS > 1:
+        serve_forked(config, WEB_WORKERS)
+    else:
+        uvicorn.Server(config).run()
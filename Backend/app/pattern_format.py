@@ -0,0 +1,69 @@
+from GreenTensor.LensPattern import LensPattern
+import numpy as np
+
+# Типы массивов в двоичном формате (little-endian)
+BINARY_DTYPES = {"f": np.dtype("<f4"), "c": np.dtype("<c8")}
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+
+def pattern_arrays(pattern: LensPattern, coefficients: bool = False, planes: bool = False) -> dict[str, np.ndarray]:
+    """Массивы диаграммы для выдачи клиенту в фиксированном порядке"""
+    arrays = {"teta": pattern.Teta, "tetay": pattern.Tetay, "dn_norm": pattern.DN_NORM}
+    if planes:
+        arrays["dn_norm_h"] = pattern.DN_NORM_H
+        arrays["dn_norm_cross"] = pattern.DN_NORM_CROSS
+    if coefficients:
+        arrays["mn"] = pattern.Mn
+        arrays["nn"] = pattern.Nn
+    return arrays
+
+
+def pack_binary(arrays: dict[str, np.ndarray]) -> tuple[bytes, str]:
+    """
+    Упаковка массивов подряд как float32 / complex64
+
+    Каждый массив приводится к типу целиком, без поэлементного
+    преобразования. Смещения кратны 4 байтам, поэтому клиент может читать
+    массивы напрямую через Float32Array.
+
+    :return: Тело ответа и описание раскладки вида
+        "teta=float32[359];mn=complex64[63]" для заголовка X-Pattern-Layout
+    """
+    parts = []
+    layout = []
+    for name, values in arrays.items():
+        dtype = BINARY_DTYPES["c" if np.iscomplexobj(values) else "f"]
+        packed = np.ascontiguousarray(values, dtype=dtype)
+        parts.append(packed.tobytes())
+        layout.append(f"{name}={dtype.name}[{packed.size}]")
+    return b"".join(parts), ";".join(layout)
+
+
+def unpack_binary(content: bytes, layout: str) -> dict[str, np.ndarray]:
+    """Обратное преобразование для клиентов на Python"""
+    arrays = {}
+    offset = 0
+    for item in layout.split(";"):
+        name, spec = item.split("=")
+        dtype_name, size = spec.rstrip("]").split("[")
+        dtype = np.dtype(dtype_name).newbyteorder("<")
+        arrays[name] = np.frombuffer(content, dtype=dtype, count=int(size), offset=offset)
+        offset += dtype.itemsize * int(size)
+    return arrays
+
+
+def finite_list(values: np.ndarray) -> list:
+    """Список для JSON: NaN и бесконечности заменяются на null"""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def to_json(arrays: dict[str, np.ndarray]) -> dict:
+    """JSON-представление массивов; комплексные - парой real/imag"""
+    result = {}
+    for name, values in arrays.items():
+        if np.iscomplexobj(values):
+            result[name] = {"real": finite_list(values.real), "imag": finite_list(values.imag)}
+        else:
+            result[name] = finite_list(values)
+    return result
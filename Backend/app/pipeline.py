@@ -0,0 +1,252 @@
+from GreenTensor.Lens import Lens
+from GreenTensor.LensCalculator import LensCalculator
+from GreenTensor.LensPattern import LensPattern
+from GreenTensor.LensPlotCreator import LensPlotCreator
+from GreenTensor.AngularGrid import AngularGrid
+from GreenTensor.NearField import NearField
+from io import BytesIO
+from typing import Callable, Optional, Sequence
+import numpy as np
+import zipfile
+import instrumentation
+
+
+def calculate(
+    lens: Lens,
+    grid: AngularGrid,
+    tolerance: Optional[float] = None,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> LensPattern:
+    """
+    Расчёт диаграммы направленности линзы на заданной сетке
+
+    :param tolerance: Допуск адаптивного усечения ряда, None - все порядки
+    :param progress: Обработчик хода суммирования ряда, см. LensCalculator
+    """
+    lensCalc = LensCalculator(lens, grid, tolerance, progress)
+    pattern = LensPattern.from_calculator(lensCalc)
+    instrumentation.record_all(lensCalc.stage_timings())
+    return pattern
+
+
+def preview(
+    lens: Lens,
+    grid: AngularGrid,
+    tolerance: Optional[float] = None
+) -> tuple[LensPattern, LensCalculator]:
+    """
+    Грубый предпросмотр диаграммы на прореженной сетке
+
+    Коэффициенты ряда считаются полностью, поэтому значения в углах
+    прореженной сетки точные; нормировка - по максимуму на ней.
+
+    :param grid: Прореженная сетка, см. AngularGrid.thinned()
+    :param tolerance: Допуск адаптивного усечения ряда, None - все порядки
+    :return: Диаграмма и калькулятор для уточнения через refine()
+    """
+    lensCalc = LensCalculator(lens, grid, tolerance)
+    pattern = LensPattern.from_calculator(lensCalc)
+    instrumentation.record_all(lensCalc.stage_timings())
+    return pattern, lensCalc
+
+
+def refine(lensCalc: LensCalculator, grid: AngularGrid) -> LensPattern:
+    """
+    Диаграмма на полной сетке по калькулятору предпросмотра
+
+    Стадии, не зависящие от сетки (функции Риккати-Бесселя, Z/Y, Mn/Nn),
+    берутся у калькулятора предпросмотра, заново считается только сумма
+    ряда по углам.
+    """
+    derived = lensCalc.derive(grid=grid)
+    pattern = LensPattern.from_calculator(derived)
+    instrumentation.record_all(derived.stage_timings())
+    return pattern
+
+
+def render_images(
+    pattern: LensPattern,
+    plot_type: str,
+    size: Optional[tuple[float, float]] = None,
+    dpi: Optional[int] = None,
+    image_format: str = "png",
+    max_points: Optional[int] = None,
+    planes: bool = False
+) -> dict[str, bytes]:
+    """
+    Построение запрошенных графиков по видам ("line", "polar")
+
+    :param image_format: Формат из LensPlotCreator.FORMATS
+    :param max_points: Прореживание кривой до этого числа точек, None - все точки
+    :param planes: Наложить диаграммы в плоскостях E, H и кроссполяризацию
+    """
+    images = {}
+    for kind in ("line", "polar"):
+        if plot_type in (kind, "both"):
+            with instrumentation.stage(f"render_{kind}"):
+                images.update(LensPlotCreator.render(pattern, kind, size, dpi, image_format, max_points, planes))
+    return images
+
+
+def zip_images(images: dict[str, bytes], image_format: str = "png") -> bytes:
+    """
+    Упаковка изображений в zip-архив
+
+    PNG и WebP уже сжаты, поэтому сохраняются в архиве без повторного
+    сжатия; SVG - текст и сжимается.
+    """
+    extension = LensPlotCreator.FORMATS[image_format][0]
+    compression = zipfile.ZIP_DEFLATED if image_format == "svg" else zipfile.ZIP_STORED
+    with instrumentation.stage("zip"):
+        zip_buffer = BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', compression) as zip_file:
+            for kind, image in images.items():
+                zip_file.writestr(f"lens_{kind}.{extension}", image)
+        return zip_buffer.getvalue()
+
+
+def unzip_images(content: bytes) -> dict[str, bytes]:
+    """Изображения из архива zip_images() по видам графиков"""
+    with zipfile.ZipFile(BytesIO(content)) as zip_file:
+        return {
+            name.removeprefix("lens_").rsplit(".", 1)[0]: zip_file.read(name)
+            for name in zip_file.namelist()
+        }
+
+
+def render_zip(
+    pattern: LensPattern,
+    plot_type: str,
+    size: Optional[tuple[float, float]] = None,
+    dpi: Optional[int] = None,
+    image_format: str = "png",
+    max_points: Optional[int] = None,
+    planes: bool = False
+) -> bytes:
+    """Построение запрошенных графиков и упаковка их в zip-архив"""
+    return zip_images(render_images(pattern, plot_type, size, dpi, image_format, max_points, planes), image_format)
+
+
+def calculate_and_render(
+    lens: Lens,
+    grid: AngularGrid,
+    plot_type: str,
+    pattern: Optional[LensPattern] = None,
+    size: Optional[tuple[float, float]] = None,
+    dpi: Optional[int] = None,
+    tolerance: Optional[float] = None,
+    image_format: str = "png",
+    max_points: Optional[int] = None,
+    planes: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> tuple[LensPattern, bytes]:
+    """
+    Полный шаг расчёта и рендеринга, выполняемый в пуле процессов
+
+    :param pattern: Уже рассчитанная диаграмма, если она есть в кэше
+    :param tolerance: Допуск адаптивного усечения ряда, None - все порядки
+    :param planes: Наложить диаграммы в плоскостях E, H и кроссполяризацию
+    :param progress: Обработчик хода суммирования ряда; вызывается и перед
+        рендерингом, так что его исключение прерывает задачу и на этом шаге
+    """
+    if pattern is None:
+        pattern = calculate(lens, grid, tolerance, progress)
+    if progress is not None:
+        progress(pattern.Orders, pattern.Orders)
+    return pattern, render_zip(pattern, plot_type, size, dpi, image_format, max_points, planes)
+
+
+_warmed_up = False
+
+
+def warm_up() -> None:
+    """
+    Прогрев процесса расчёта на типичной линзе
+
+    Загружает matplotlib, строит кэш шрифтов и заготовки фигур, которые
+    иначе пришлись бы на первый запрос. Выполняется в сервере forkserver до порождения
+    воркеров (см. worker_preload), так что воркеры получают всё готовым и
+    делят эти страницы памяти; при нескольких процессах сервера без пула -
+    в их общем родителе до fork (см. main.py). Повторный вызов в том же процессе
+    ничего не делает.
+    """
+    global _warmed_up
+    if _warmed_up:
+        return
+    lens = Lens(10, 3, [0.5, 0.8, 1], [1.9, 1.5, 1], [1, 1, 1])
+    render_images(calculate(lens, AngularGrid.default()), "both")
+    _warmed_up = True
+
+
+def calculate_sweep(
+    lenses: Sequence[Lens],
+    grid: AngularGrid,
+    tolerance: Optional[float] = None
+) -> tuple[np.ndarray, np.ndarray, list[dict]]:
+    """
+    Расчёт вариантов параметрического исследования на общей сетке
+
+    Каждый вариант считается производным калькулятором от предыдущего,
+    поэтому стадии, не затронутые изменённым параметром, не пересчитываются.
+
+    :param tolerance: Допуск адаптивного усечения ряда, None - все порядки
+    :return: Tetay, диаграммы (variants, angles) и характеристики вариантов
+        вместе с числом использованных порядков ряда
+    """
+    tetay = None
+    dn_norm = np.empty((len(lenses), len(grid)))
+    metrics = []
+    lensCalc = None
+    for i, lens in enumerate(lenses):
+        lensCalc = lensCalc.derive(lens) if lensCalc is not None else LensCalculator(lens, grid, tolerance)
+        pattern = LensPattern.from_calculator(lensCalc)
+        instrumentation.record_all(lensCalc.stage_timings())
+        tetay = pattern.Tetay
+        dn_norm[i] = pattern.DN_NORM
+        metrics.append({**pattern.metrics().to_dict(), "orders": pattern.Orders})
+    return tetay, dn_norm, metrics
+
+
+def render_sweep_png(tetay: np.ndarray, dn_norm: np.ndarray, labels: Sequence[str]) -> bytes:
+    """Рендеринг наложенных диаграмм вариантов в PNG"""
+    with instrumentation.stage("render_sweep"):
+        fig = LensPlotCreator.create_sweep_plot(tetay, dn_norm, labels)
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        return buffer.getvalue()
+
+
+def near_field(lens: Lens) -> NearField:
+    """Коэффициенты ближнего поля линзы, см. NearField"""
+    lensCalc = LensCalculator(lens)
+    with instrumentation.stage("near_field_setup"):
+        field = NearField(lensCalc)
+    instrumentation.record_all(lensCalc.stage_timings())
+    return field
+
+
+def near_field_tile(field: NearField, kind: str, extent: float, size: int, start: int, stop: int) -> np.ndarray:
+    """
+    Строки start..stop сетки ближнего поля
+
+    Точки сетки строятся в воркере, поэтому в пул передаются только
+    коэффициенты поля и номера строк.
+
+    :return: |E|, float32 (stop - start, size)
+    """
+    with instrumentation.stage("near_field"):
+        rho, teta = NearField.grid(kind, extent, size, start, stop)
+        return field.evaluate(rho, teta).astype(np.float32)
+
+
+def render_field(
+    field: np.ndarray,
+    kind: str,
+    extent: float,
+    bounds: Sequence[float],
+    dpi: Optional[int] = None,
+    image_format: str = "png"
+) -> bytes:
+    """Рендеринг тепловой карты ближнего поля, см. LensPlotCreator.render_field"""
+    with instrumentation.stage("render_field"):
+        return LensPlotCreator.render_field(field, kind, extent, bounds, dpi, image_format)
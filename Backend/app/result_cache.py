@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+from importlib.metadata import version
+import asyncio
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from GreenTensor.LensPattern import LensPattern
+from result_store import ResultStore
+
+
+# Версия входит в ключ: при обновлении расчёта или рендеринга старые ETag
+# перестают совпадать. Версия matplotlib берётся из метаданных пакета, без импорта
+CACHE_VERSION = "|".join(("2", np.__version__, version("matplotlib")))
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов с ограничением по числу записей и по объёму
+
+    Потокобезопасен. Размер записи передаётся явно при сохранении. Если
+    задано хранилище на диске, промах в памяти ищется в нём, а новые
+    записи сохраняются и туда; найденные на диске значения в память не
+    переносятся, их массивы отображены из файлов хранилища. Методы get и
+    put асинхронные: чтение с диска идёт в потоке, запись - в фоновом
+    потоке хранилища, так что цикл событий не ждёт SQLite и файлов.
+    """
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        store: Optional[ResultStore] = None,
+        codec: Optional[tuple[Callable, Callable]] = None
+    ):
+        """
+        :param max_entries: Максимальное число записей
+        :param max_bytes: Максимальный суммарный размер записей в байтах
+        :param store: Общее хранилище на диске
+        :param codec: Преобразования значения в массивы и метаданные для
+            хранилища и обратно
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store = store
+        self.codec = codec
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Значение по ключу; обращение к хранилищу на диске выполняется в потоке"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        if self.store is None:
+            return None
+        return await asyncio.to_thread(self._load, key)
+
+    def _load(self, key: str) -> Optional[Any]:
+        stored = self.store.get(key)
+        return self.codec[1](*stored) if stored is not None else None
+
+    async def put(self, key: str, value: Any, size: int) -> None:
+        """Сохранение значения; запись в хранилище на диске выполняется в фоне"""
+        if self.store is not None:
+            self.store.put_later(key, *self.codec[0](value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def canonical_hash(payload: dict) -> str:
+    """SHA-256 канонического JSON-представления (сортированные ключи, без пробелов)"""
+    data = json.dumps({"version": CACHE_VERSION, **payload}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def grid_hash(teta: np.ndarray) -> str:
+    """Хэш сетки углов: разные описания одной сетки дают один ключ"""
+    return hashlib.sha256(np.ascontiguousarray(teta, dtype=float).tobytes()).hexdigest()
+
+
+def pattern_to_arrays(pattern: LensPattern) -> tuple[dict[str, np.ndarray], dict[str, Any]]:
+    arrays = {"teta": pattern.Teta, "tetay": pattern.Tetay, "dn_norm": pattern.DN_NORM, "dn_norm_h": pattern.DN_NORM_H,
+              "dn_norm_cross": pattern.DN_NORM_CROSS, "mn": pattern.Mn, "nn": pattern.Nn}
+    return arrays, {"p_teta_max": pattern.P_teta_max, "orders": pattern.Orders}
+
+
+def pattern_from_arrays(arrays: dict[str, np.ndarray], meta: dict[str, Any]) -> LensPattern:
+    return LensPattern(arrays["teta"], arrays["tetay"], arrays["dn_norm"], arrays["dn_norm_h"], arrays["dn_norm_cross"],
+                       arrays["mn"], arrays["nn"], meta["p_teta_max"], meta["orders"], copy=False)
+
+
+def bytes_to_arrays(content: bytes) -> tuple[dict[str, np.ndarray], dict[str, Any]]:
+    return {"content": np.frombuffer(content, dtype=np.uint8)}, {}
+
+
+def bytes_from_arrays(arrays: dict[str, np.ndarray], meta: dict[str, Any]) -> memoryview:
+    return memoryview(arrays["content"])
+
+
+# Общее хранилище на диске для всех процессов сервера; без RESULT_STORE_DIR
+# результаты хранятся только в памяти процесса
+store = ResultStore(
+    os.environ["RESULT_STORE_DIR"],
+    max_bytes=int(os.getenv("RESULT_STORE_BYTES", str(1024 * 1024 * 1024)))
+) if os.getenv("RESULT_STORE_DIR") else None
+
+# Готовые zip-архивы по ключу параметров линзы и типа графика
+images = ResultCache(
+    max_entries=int(os.getenv("IMAGE_CACHE_ENTRIES", "256")),
+    max_bytes=int(os.getenv("IMAGE_CACHE_BYTES", str(64 * 1024 * 1024))),
+    store=store,
+    codec=(bytes_to_arrays, bytes_from_arrays)
+)
+
+# Рассчитанные диаграммы (LensPattern) по ключу параметров линзы
+patterns = ResultCache(
+    max_entries=int(os.getenv("PATTERN_CACHE_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("PATTERN_CACHE_BYTES", str(64 * 1024 * 1024))),
+    store=store,
+    codec=(pattern_to_arrays, pattern_from_arrays)
+)
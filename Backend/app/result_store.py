@@ -0,0 +1,212 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import numpy as np
+
+# Смещения массивов в файле записи кратны ALIGNMENT байтам
+ALIGNMENT = 64
+# Время обращения к записи обновляется не чаще раза в ACCESS_INTERVAL секунд
+ACCESS_INTERVAL = 60
+# Больше MAX_PENDING_WRITES ожидающих фоновых записей новые не принимаются
+MAX_PENDING_WRITES = 64
+
+
+class ResultStore:
+    """
+    Хранилище результатов на диске, общее для процессов сервера и перезапусков
+
+    Запись - именованные массивы numpy и метаданные в JSON. Массивы лежат
+    подряд в отдельном файле, индекс (размер, время последнего обращения,
+    раскладка массивов и имя файла) - в SQLite в режиме WAL.
+
+    Параллельная запись из нескольких процессов безопасна: файл каждой
+    записи получает уникальное имя и полностью записывается до того, как
+    строка индекса появится в транзакции, поэтому другие процессы видят
+    только целые записи. Ключи - хэши содержимого, так что повторная
+    запись того же ключа не нужна и пропускается.
+
+    При чтении массивы отображаются в память только для чтения, без
+    копирования: повторные обращения из любого процесса обслуживает кэш
+    страниц ОС. Вытесненный файл удаляется, но уже отображённые массивы
+    остаются доступны до их освобождения.
+
+    Суммарный размер файлов ограничен max_bytes: при превышении удаляются
+    записи с самым давним обращением. Время обращения обновляется при
+    чтении не чаще раза в ACCESS_INTERVAL секунд, так что частые попадания
+    не открывают транзакцию записи на каждое чтение.
+
+    Методы блокирующие (SQLite ждёт блокировку до 10 с), из цикла событий
+    их вызывают в потоке. put_later сохраняет запись в фоновом потоке
+    хранилища; если записей ждёт больше MAX_PENDING_WRITES, новая
+    пропускается. Ошибки диска и блокировки SQLite не
+    прерывают запрос: чтение считается промахом, запись пропускается.
+    """
+    def __init__(self, path: str, max_bytes: int):
+        """
+        :param path: Каталог хранилища, создаётся при первом обращении
+        :param max_bytes: Максимальный суммарный размер записей в байтах
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._writer_pid: Optional[int] = None
+        self._pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Соединение SQLite нельзя использовать после fork, поэтому каждый
+        # процесс открывает своё
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(self.path, exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self.path, "index.sqlite"), timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, file TEXT NOT NULL, size INTEGER NOT NULL, "
+                "accessed REAL NOT NULL, layout TEXT NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key: str) -> Optional[tuple[dict[str, np.ndarray], dict[str, Any]]]:
+        """
+        Массивы записи, отображённые в память, и её метаданные
+
+        :return: None, если записи нет
+        """
+        with self._lock:
+            try:
+                db = self._db()
+                row = db.execute("SELECT file, layout, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    layout = json.loads(row[1])
+                    try:
+                        arrays = self.__map(row[0], layout["arrays"])
+                    except FileNotFoundError:
+                        # Файл удалён при вытеснении записи с тем же ключом в другом процессе
+                        db.execute("DELETE FROM entries WHERE key = ? AND file = ?", (key, row[0]))
+                        row = None
+                    else:
+                        now = time.time()
+                        if now - row[2] > ACCESS_INTERVAL:
+                            db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            except (OSError, ValueError, sqlite3.Error):
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return arrays, layout["meta"]
+
+    def __map(self, file: str, entries: list) -> dict[str, np.ndarray]:
+        with open(os.path.join(self.path, file), "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return {
+            name: np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=offset)
+            for name, dtype, count, offset in entries
+        }
+
+    def put(self, key: str, arrays: dict[str, np.ndarray], meta: dict[str, Any]) -> None:
+        """
+        Сохранение записи, если её ещё нет
+
+        :param arrays: Непустые массивы записи
+        :param meta: Метаданные, сериализуемые в JSON
+        """
+        arrays = {name: np.ascontiguousarray(values) for name, values in arrays.items()}
+        entries = []
+        size = 0
+        for name, values in arrays.items():
+            offset = -(-size // ALIGNMENT) * ALIGNMENT
+            entries.append((name, values.dtype.str, values.size, offset))
+            size = offset + values.nbytes
+        if size == 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            try:
+                db = self._db()
+                if db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None:
+                    return
+                file = f"{key}.{uuid.uuid4().hex}.bin"
+                path = os.path.join(self.path, file)
+                with open(path, "wb") as f:
+                    for (_, _, _, offset), values in zip(entries, arrays.values()):
+                        f.seek(offset)
+                        f.write(values.tobytes())
+                try:
+                    removed = self.__insert(db, key, file, size, json.dumps({"arrays": entries, "meta": meta}))
+                except sqlite3.Error:
+                    os.unlink(path)
+                    raise
+            except (OSError, sqlite3.Error):
+                return
+            for file in removed:
+                try:
+                    os.unlink(os.path.join(self.path, file))
+                except FileNotFoundError:
+                    pass
+
+    def put_later(self, key: str, arrays: dict[str, np.ndarray], meta: dict[str, Any]) -> None:
+        """Сохранение записи в фоновом потоке, см. put"""
+        with self._lock:
+            if self._pending >= MAX_PENDING_WRITES:
+                return
+            # Потоки не переживают fork, поэтому у каждого процесса свой
+            if self._writer is None or self._writer_pid != os.getpid():
+                self._writer = ThreadPoolExecutor(1, thread_name_prefix="result-store")
+                self._writer_pid = os.getpid()
+                self._pending = 0
+            self._pending += 1
+            self._writer.submit(self.__write, key, arrays, meta)
+
+    def __write(self, key: str, arrays: dict[str, np.ndarray], meta: dict[str, Any]) -> None:
+        try:
+            self.put(key, arrays, meta)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def __insert(self, db: sqlite3.Connection, key: str, file: str, size: int, layout: str) -> list[str]:
+        """Добавление строки индекса и вытеснение; возвращает файлы для удаления"""
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            removed = [row[0] for row in db.execute("SELECT file FROM entries WHERE key = ?", (key,))]
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key, file, size, time.time(), layout))
+            excess = db.execute("SELECT SUM(size) FROM entries").fetchone()[0] - self.max_bytes
+            if excess > 0:
+                evicted = []
+                for old_key, old_file, old_size in db.execute(
+                        "SELECT key, file, size FROM entries ORDER BY accessed").fetchall():
+                    if excess <= 0:
+                        break
+                    evicted.append(old_key)
+                    removed.append(old_file)
+                    excess -= old_size
+                db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in evicted])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return removed
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            try:
+                entries, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            except sqlite3.Error:
+                entries, size = 0, 0
+            return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,57 @@
+from typing import Any, Awaitable, Callable
+import asyncio
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных расчётов
+
+    Пока расчёт с ключом key выполняется, следующие запросы с тем же
+    ключом не запускают свой, а ждут его результата (или исключения).
+    Расчёт идёт отдельной задачей asyncio, поэтому отключение клиента,
+    который его начал, не прерывает его для остальных. Объединение
+    действует внутри процесса сервера; между процессами одинаковые
+    результаты делятся через кэш и хранилище результатов.
+
+    Счётчики: started - запущенные расчёты, coalesced - запросы,
+    получившие чужой результат, то есть сэкономленные расчёты.
+    """
+    def __init__(self):
+        self._flights: dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Результат fn() для ключа key, общий для одновременных вызовов
+
+        :param fn: Расчёт; вызывается, только если расчёта с этим ключом ещё нет
+        """
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done: self.__finished(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def __finished(self, key: str, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Исключение уже получили ожидающие; если их не осталось, оно не
+            # должно попасть в журнал как необработанное
+            task.exception()
+
+    def stats(self) -> dict[str, int]:
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self._flights)}
+
+
+# Архивы изображений по ключу image_key и диаграммы по ключу pattern_key
+images = SingleFlight()
+patterns = SingleFlight()
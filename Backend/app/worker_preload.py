@@ -0,0 +1,9 @@
+"""
+Модуль предзагрузки сервера forkserver пула расчётов
+
+Импортирует pipeline и прогревает его, поэтому воркеры пула порождаются
+уже с загруженным matplotlib и готовыми заготовками фигур.
+"""
+import pipeline
+
+pipeline.warm_up()